@@ -3,6 +3,9 @@ from django.db.models import F
 from forum.models.action import ActionProxy, DummyActionProxy
 from forum.models import Vote, Flag
 from forum import settings
+from forum.utils.viewcount import view_counter
+from forum.utils import rankings
+from forum.utils import counters
 
 class VoteAction(ActionProxy):
     def update_node_score(self, inc):
@@ -19,6 +22,10 @@ class VoteAction(ActionProxy):
         self.update_node_score(-vote.value)
         vote.delete()
 
+        # Hooks only run for new actions
+        if self.node.node_type == "question":
+            rankings.question_voted(self.node)
+
     @classmethod
     def get_for(cls, user, node):
         try:
@@ -143,6 +150,7 @@ class AcceptAnswerAction(ActionProxy):
         self.node.nstate.accepted = None
         self.node.save()
         self.node.question.reset_accepted_count_cache()
+        rankings.accept_canceled(self.node)
 
     def describe(self, viewer=None):
         answer = self.node
@@ -168,6 +176,9 @@ class FavoriteAction(ActionProxy):
     def cancel_action(self):
         self.process_action()
 
+        # Hooks only run for new actions
+        counters.favorites.add(self.node_id, -1)
+
     def describe(self, viewer=None):
         return _("%(user)s marked %(post_desc)s as favorite") % {
             'user': self.hyperlink(self.user.get_profile_url(), self.friendly_username(viewer, self.user)),
@@ -187,6 +198,8 @@ class DeleteAction(ActionProxy):
 
         if self.node.node_type == "answer":
             self.node.question.reset_answer_count_cache()
+        elif self.node.node_type == "comment":
+            counters.comments.add(self.node.author_id)
 
     def describe(self, viewer=None):
         return _("%(user)s deleted %(post_desc)s") % {
@@ -211,5 +224,15 @@ class QuestionViewAction(DummyActionProxy):
         super(QuestionViewAction, self).__init__(ip)
 
     def process_action(self):
-        self.node.extra_count = F('extra_count') + 1
-        self.node.save()
+        view_counter.record(self.node.id)
+
+class QuestionViewCountAction(DummyActionProxy):
+    """
+    Fired when buffered views of a question are written to the database, with the view count before
+    and after the write.
+    """
+    def __init__(self, node, previous_count, view_count):
+        self.node = node
+        self.previous_count = previous_count
+        self.view_count = view_count
+        super(QuestionViewCountAction, self).__init__()
@@ -1,6 +1,7 @@
 from django.utils.translation import ungettext, ugettext as _
 from django.core.urlresolvers import reverse
 from django.db.models import F
+from django.core.cache import cache
 from forum.models.action import ActionProxy
 from forum.models import Award, Badge, ValidationHash, User
 from forum import settings
@@ -153,6 +154,7 @@ class AwardAction(ActionProxy):
         award.save()
         award.badge.awarded_count = F('awarded_count') + 1
         award.badge.save()
+        AwardAction.forget_badges_of(self.user_id)
 
         if award.badge.type == Badge.GOLD:
             self.user.gold += 1
@@ -175,6 +177,23 @@ class AwardAction(ActionProxy):
         badge.awarded_count = F('awarded_count') - 1
         badge.save()
         award.delete()
+        AwardAction.forget_badges_of(self.user_id)
+
+    @classmethod
+    def badges_of(cls, user_id):
+        """The ids of the badges the user has been awarded, kept in the cache until the user gets or loses one."""
+        key = '%s.awarded_badges.%d' % (settings.APP_URL, user_id)
+        ids = cache.get(key)
+
+        if ids is None:
+            ids = set(Award.objects.filter(user__id=user_id).values_list('badge', flat=True))
+            cache.set(key, ids, 60 * 60)
+
+        return ids
+
+    @classmethod
+    def forget_badges_of(cls, user_id):
+        cache.delete('%s.awarded_badges.%d' % (settings.APP_URL, user_id))
 
     @classmethod
     def get_for(cls, user, badge, node=False):
@@ -1,4 +1,5 @@
 import re
+from copy import copy
 from string import lower
 
 from django.core.exceptions import MultipleObjectsReturned
@@ -26,15 +27,24 @@ class BadgesMeta(type):
                 ondb = installed[name]
 
             badge.ondb = ondb.id
+            badge.db_object = ondb
 
             inst = badge()
 
             def hook(action, new):
+                if badge.award_once:
+                    user_id = inst.recipient_id(action)
+
+                    if user_id and badge.ondb in AwardAction.badges_of(user_id):
+                        return
+
                 user = inst.award_to(action)
 
                 if user:
                     badge.award(user, action, badge.award_once)
 
+            hook.__name__ = '%s_badge' % name
+
             for action in badge.listen_to:
                 action.hook(hook)
 
@@ -49,6 +59,46 @@ class AbstractBadge(object):
     abstract = True
     award_once = False
 
+    # Who award_to gives the badge to, 'user' for the user of the action or 'author' for the author of its node, if
+    # it's always one of them. Then award_once badges the user already has aren't evaluated again.
+    recipient = None
+
+    def recipient_id(self, action):
+        if self.recipient == 'user':
+            return action.user_id
+        elif self.recipient == 'author' and action.node_id:
+            return action.node.author_id
+
+        return None
+
+    def candidates(self):
+        """
+        Yields a (user id, node id, trigger action id) tuple for every award the whole history calls for, with no node
+        for award_once badges and no trigger when there isn't a single action to blame. This replays the listen_to
+        actions through award_to, which judges them by the current state of their nodes. Badges that can tell with a
+        query override it.
+        """
+        types = [cls.get_type() for cls in self.listen_to]
+        last_id = 0
+
+        while types:
+            actions = list(Action.objects.filter(action_type__in=types, canceled=False, id__gt=last_id).order_by('id')[:500])
+
+            if not actions:
+                return
+
+            last_id = actions[-1].id
+
+            for action in actions:
+                try:
+                    user = self.award_to(action.leaf)
+                except Exception, e:
+                    logging.error("Error replaying action %s for the %s badge: %s" % (action.id, self.__class__.__name__, e))
+                    continue
+
+                if user:
+                    yield (user.id, (not self.award_once) and action.node_id or None, action.id)
+
     @property
     def name(self):
         raise NotImplementedError
@@ -59,11 +109,12 @@ class AbstractBadge(object):
 
     @classmethod
     def award(cls, user, action, once=False):
-        db_object = Badge.objects.get(id=cls.ondb)
+        # A copy of the badge loaded at startup, awarding it updates awarded_count
+        db_object = copy(cls.db_object)
         try:
             if once:
                 node = None
-                awarded = AwardAction.get_for(user, db_object)
+                awarded = db_object.id in AwardAction.badges_of(user.id)
             else:
                 node = action.node
                 awarded = AwardAction.get_for(user, db_object, node)
@@ -74,6 +125,6 @@ class AbstractBadge(object):
                 AwardAction(user=user, node=node).save(data=dict(badge=db_object, trigger=trigger))
         except MultipleObjectsReturned:
             if node:
-                logging.error('Found multiple %s badges awarded for user %s (%s)' % (self.name, user.username, user.id))
+                logging.error('Found multiple %s badges awarded for user %s (%s)' % (cls.name, user.username, user.id))
             else:
-                logging.error('Found multiple %s badges awarded for user %s (%s) and node %s' % (self.name, user.username, user.id, node.id))
\ No newline at end of file
+                logging.error('Found multiple %s badges awarded for user %s (%s) and node %s' % (cls.name, user.username, user.id, node.id))
\ No newline at end of file
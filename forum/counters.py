@@ -0,0 +1,20 @@
+from forum.actions import CommentAction, DeleteAction, FavoriteAction
+from forum.utils import counters
+
+def comment_posted(action, new):
+    counters.comments.add(action.node.author_id)
+
+CommentAction.hook(comment_posted)
+
+
+def node_deleted(action, new):
+    if action.node.node_type == "comment":
+        counters.comments.add(action.node.author_id, -1)
+
+DeleteAction.hook(node_deleted)
+
+
+def favorite_marked(action, new):
+    counters.favorites.add(action.node_id)
+
+FavoriteAction.hook(favorite_marked)
@@ -0,0 +1,169 @@
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction, models
+from django.db.models import F
+
+from forum.models import User, Badge, Award, Action
+from forum.actions import AwardAction
+from forum.utils.bulk import BulkInsert
+from forum.utils.progress import total_seconds
+
+BADGE_FIELDS = {Badge.GOLD: 'gold', Badge.SILVER: 'silver', Badge.BRONZE: 'bronze'}
+
+def _close_connection():
+    # Forked workers must not share the parent's database connection
+    connection.close()
+
+def _badges():
+    from forum.badges.base import BadgesMeta
+    return BadgesMeta.by_class
+
+def evaluate_badge(name):
+    """
+    Works out the awards of the badge called name that the whole history calls for and haven't been given. Returns
+    the name, how many candidates the badge yielded, the missing (user id, node id, trigger id) awards in user and
+    node order and the seconds it took.
+    """
+    started = datetime.now()
+    badge = _badges()[name]
+    wanted = {}
+    count = 0
+
+    for user_id, node_id, trigger_id in badge.candidates():
+        count += 1
+
+        if badge.award_once:
+            node_id = None
+
+        if user_id and not (user_id, node_id) in wanted:
+            wanted[(user_id, node_id)] = trigger_id
+
+    for user_id, node_id in Award.objects.filter(badge__id=badge.ondb).values_list('user', 'node'):
+        if badge.award_once:
+            node_id = None
+
+        wanted.pop((user_id, node_id), None)
+
+    missing = [(user_id, node_id, trigger_id) for (user_id, node_id), trigger_id in sorted(wanted.items())]
+    return name, count, missing, total_seconds(datetime.now() - started)
+
+def write_awards(name, missing, batch_size):
+    """
+    Gives the missing awards of the badge called name with an AwardAction and an Award for each, batch_size at a
+    time, and moves the badge's awarded_count and the users' badge counts with one UPDATE per batch of users that
+    got the same number of awards. The database gives out the ids, the site can keep saving actions and awards while
+    this runs. Users aren't messaged about them.
+    """
+    badge = _badges()[name]
+    fields = [f for f in Award._meta.local_fields if not f is Award._meta.pk]
+    now = datetime.now()
+
+    for start in range(0, len(missing), batch_size):
+        awards = BulkInsert(Award._meta.db_table, [f.column for f in fields], batch_size)
+
+        for user_id, node_id, trigger_id in missing[start:start + batch_size]:
+            action = Action(user_id=user_id, node_id=node_id, action_type=AwardAction.get_type(), ip='', action_date=now)
+
+            # Only the row, the hooks, reputation and row cache of Action.save are no use here
+            models.Model.save(action)
+
+            award = Award(user_id=user_id, badge_id=badge.ondb, node_id=node_id, trigger_id=trigger_id,
+                          action_id=action.id, awarded_at=now)
+            awards.add([f.get_db_prep_save(f.pre_save(award, True), connection=connection) for f in fields])
+
+        awards.flush()
+
+    Badge.objects.filter(id=badge.ondb).update(awarded_count=F('awarded_count') + len(missing))
+
+    per_user = {}
+
+    for user_id, node_id, trigger_id in missing:
+        per_user[user_id] = per_user.get(user_id, 0) + 1
+
+    by_count = {}
+
+    for user_id, count in per_user.items():
+        by_count.setdefault(count, []).append(user_id)
+
+    field = BADGE_FIELDS[badge.db_object.type]
+
+    for count, user_ids in by_count.items():
+        for start in range(0, len(user_ids), batch_size):
+            User.objects.filter(id__in=user_ids[start:start + batch_size]).update(**{field: F(field) + count})
+
+    cache.delete_many([User.infer_cache_key({'id': id}) for id in per_user] + [Badge.infer_cache_key({'id': badge.ondb})])
+
+    for user_id in per_user:
+        AwardAction.forget_badges_of(user_id)
+
+    Action._set_query_cache_invalidation_timestamp()
+    User._set_query_cache_invalidation_timestamp()
+    Badge._set_query_cache_invalidation_timestamp()
+
+class Command(NoArgsCommand):
+    help = ("Evaluates the badges against the whole history of the site and gives the awards it calls for that are "
+            "missing, like those of badges added or changed after the actions that earn them.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--processes', dest='processes', type='int', default=cpu_count(),
+                    help='Number of processes evaluating badges, 1 evaluates them in this process'),
+        make_option('--badge', action='append', dest='badges', default=[],
+                    help='Class name of a badge to evaluate, can be repeated, every badge by default'),
+        make_option('--batch-size', dest='batch_size', type='int', default=500, help='Rows per INSERT or UPDATE'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Only report the missing awards'),
+    )
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        # Loads the badges of the modules
+        import forum.badges
+
+        badges = _badges()
+        names = options['badges'] or sorted(badges.keys())
+        unknown = [name for name in names if not name in badges]
+
+        if unknown:
+            print "Unknown badges: %s" % ", ".join(unknown)
+            return
+
+        dry_run = options['dry_run']
+        processes = max(min(options['processes'], len(names)), 1)
+        batch_size = max(options['batch_size'], 1)
+
+        if processes > 1:
+            _close_connection()
+            pool = Pool(processes, _close_connection)
+            results = pool.imap_unordered(evaluate_badge, names)
+        else:
+            pool = None
+            results = (evaluate_badge(name) for name in names)
+
+        started = datetime.now()
+        candidate_total = missing_total = 0
+
+        try:
+            for name, count, missing, seconds in results:
+                if dry_run:
+                    for user_id, node_id, trigger_id in missing:
+                        print "%s missing for user %s%s" % (name, user_id, node_id and " on node %s" % node_id or "")
+                elif missing:
+                    write_awards(name, missing, batch_size)
+
+                candidate_total += count
+                missing_total += len(missing)
+
+                print "%-20s %d candidates, %d missing, %.1fs, %.0f candidates/s" % (
+                    name + ':', count, len(missing), seconds, count / max(seconds, 0.001))
+        finally:
+            if pool:
+                pool.terminate()
+
+        elapsed = total_seconds(datetime.now() - started)
+        print "%d badges, %d candidates, %d awards %s in %.1fs, %.0f candidates/s" % (
+            len(names), candidate_total, missing_total, dry_run and "missing" or "given", elapsed,
+            candidate_total / max(elapsed, 0.001))
@@ -0,0 +1,74 @@
+import random
+import string
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from forum.utils.autocomplete import PrefixIndex
+from forum.utils.progress import total_seconds
+
+def _names(size, separator):
+    """Names of one to three words, drawn from a vocabulary where a few words are far more common than the rest."""
+    vocabulary = [''.join([random.choice(string.ascii_lowercase) for i in range(random.randint(3, 9))])
+                  for i in range(max(size / 20, 50))]
+    word = lambda: vocabulary[min(int(random.paretovariate(0.8)) - 1, len(vocabulary) - 1)]
+
+    names = set()
+
+    while len(names) < size:
+        name = separator.join([word() for i in range(random.randint(1, 3))])
+
+        if name in names:
+            name += str(random.randint(1, 999))
+
+        names.add(name)
+
+    return [(i + 1, name, int(random.paretovariate(1))) for i, name in enumerate(names)]
+
+class Command(NoArgsCommand):
+    help = "Times loading, querying and updating the autocomplete prefix index over synthetic tags and usernames."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--size', dest='size', type='int', default=100000, help='Names in each index'),
+        make_option('--queries', dest='queries', type='int', default=10000, help='Prefix lookups to time'),
+        make_option('--limit', dest='limit', type='int', default=10, help='Results per lookup'),
+    )
+
+    def _time(self, function, count):
+        started = datetime.now()
+
+        for i in range(count):
+            function(i)
+
+        return total_seconds(datetime.now() - started) * 1000 / max(count, 1)
+
+    def handle_noargs(self, **options):
+        random.seed(0)
+        limit = options['limit']
+
+        for kind, separator in (('tags', '-'), ('users', ' ')):
+            rows = _names(options['size'], separator)
+            index = PrefixIndex('benchmark-%s' % kind, lambda: rows)
+
+            started = datetime.now()
+            index.load()
+            print "%s: %d names loaded in %.2fs" % (kind, len(rows), total_seconds(datetime.now() - started))
+
+            prefixes = [name[:random.randint(1, 5)] for id, name, weight in random.sample(rows, options['queries'])]
+
+            def uncached(i):
+                index.top = {}
+                index.search(prefixes[i], limit)
+
+            print "%s: %.3fms per lookup of a prefix not remembered" % (kind, self._time(uncached, len(prefixes)))
+            print "%s: %.3fms per lookup of a one letter prefix" % (
+                kind, self._time(lambda i: index.search(prefixes[i][0], limit), len(prefixes)))
+            print "%s: %.3fms per lookup of a remembered prefix" % (
+                kind, self._time(lambda i: index.search(prefixes[i], limit), len(prefixes)))
+
+            updates = random.sample(rows, min(1000, len(rows)))
+            print "%s: %.3fms per weight change" % (
+                kind, self._time(lambda i: index.update(updates[i][0], updates[i][1], updates[i][2] + 1), len(updates)))
+            print "%s: %.3fms per lookup after %d changes" % (
+                kind, self._time(lambda i: index.search(prefixes[i], limit), len(prefixes)), len(updates))
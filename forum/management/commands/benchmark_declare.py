@@ -0,0 +1,69 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.template import loader, Context
+
+from forum import settings
+from forum.models import User
+from forum.templatetags.extra_tags import DeclareNode, DECLARE_GLOBALS
+from forum.management.commands.benchmark_notifications import notification_contexts
+from forum.utils.progress import total_seconds
+
+def _eval_each_line(node, context):
+    # What DeclareNode.render did before its expressions were compiled once
+    source = node.block.render(context)
+
+    for line in source.splitlines():
+        m = node.dec_re.search(line)
+        if m:
+            clist = list(context)
+            clist.reverse()
+            d = dict(DECLARE_GLOBALS)
+            for c in clist:
+                d.update(c)
+            try:
+                context[m.group(1).strip()] = eval(m.group(3).strip(), d)
+            except Exception:
+                pass
+
+def _compiled(node, context):
+    node.render(context)
+
+class Command(NoArgsCommand):
+    help = ("Times the {% declare %} blocks of every notification template, evaluating the source of each line "
+            "against a copy of the context and evaluating the expressions compiled with the template.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--rounds', dest='rounds', type='int', default=1000, help='Times every declare block is rendered'),
+    )
+
+    def handle_noargs(self, **options):
+        rounds = max(options['rounds'], 1)
+        users = list(User.objects.order_by('id')[:1])
+
+        if not users:
+            print "There are no users to send to."
+            return
+
+        for name, values in notification_contexts(users):
+            if values is None:
+                print "%-15s skipped, nothing to notify about" % (name + ':')
+                continue
+
+            template = loader.get_template('notifications/%s.html' % name)
+            nodes = template.nodelist.get_nodes_by_type(DeclareNode)
+            rates = []
+
+            for render in (_eval_each_line, _compiled):
+                context = Context(dict(values, settings=settings, recipient=users[0], recipients=users))
+                started = datetime.datetime.now()
+
+                for i in range(rounds):
+                    for node in nodes:
+                        render(node, context)
+
+                rates.append(rounds / max(total_seconds(datetime.datetime.now() - started), 0.000001))
+
+            print "%-15s %d declare blocks, each line %.0f renders/s, compiled %.0f renders/s, %.1fx" % (
+                name + ':', len(nodes), rates[0], rates[1], rates[1] / max(rates[0], 0.000001))
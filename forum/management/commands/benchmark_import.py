@@ -0,0 +1,212 @@
+import os
+import random
+import ConfigParser
+import xml.etree.ElementTree
+from datetime import datetime, timedelta
+from optparse import make_option
+from xml.etree import ElementTree as ET
+
+from django.core.cache import cache
+from django.core.management.base import NoArgsCommand, CommandError
+
+from forum.models import User, Badge
+from forum.utils.progress import total_seconds
+
+class Command(NoArgsCommand):
+    help = ("Writes a generated backup to the exporter temp folder and times importing it. The rows are added to the "
+            "configured database, run it against a scratch copy.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--users', dest='users', type='int', default=10000, help='Users in the backup'),
+        make_option('--tags', dest='tags', type='int', default=1000, help='Tags in the backup'),
+        make_option('--nodes', dest='nodes', type='int', default=100000, help='Questions and answers in the backup'),
+        make_option('--actions', dest='actions', type='int', default=1000000, help='Actions in the backup'),
+        make_option('--batch-size', dest='batch_size', type='int', default=None,
+                    help='Rows written together, 0 saves them one at a time, IMPORT_BATCH_SIZE if not given'),
+        make_option('--reuse', dest='reuse', action='store_true', default=False,
+                    help='Import the backup generated by a previous run'),
+    )
+
+    def handle_noargs(self, **options):
+        from forum_modules.exporter import exporter, importer, settings as exporter_settings
+
+        users = User.objects.order_by('-is_superuser', 'id')[:1]
+
+        if not users:
+            raise CommandError("The import runs on behalf of an existing user, there is none.")
+
+        if not options['reuse']:
+            started = datetime.now()
+            counts = self.generate(exporter, options)
+            print "Generated %d rows in %.1fs" % (counts['overall'], total_seconds(datetime.now() - started))
+
+        if options['batch_size'] is not None:
+            exporter_settings.IMPORT_BATCH_SIZE.set_value(options['batch_size'])
+
+        started = datetime.now()
+        importer.start_import(None, {}, users[0])
+        elapsed = total_seconds(datetime.now() - started)
+
+        state = cache.get(exporter.CACHE_KEY)
+
+        if state['errors']:
+            raise CommandError(state['errors'])
+
+        for name, step in sorted(state['state'].items()):
+            print "%s: %d rows, %d rows/s" % (name, step['parsed'], step.get('rate', 0))
+
+        print "Imported in %.1fs with a batch size of %s" % (elapsed, exporter_settings.IMPORT_BATCH_SIZE)
+
+    def generate(self, exporter, options):
+        random.seed(0)
+        xml.etree.ElementTree._ElementInterface.add = exporter.ET_Element_add_tag
+
+        try:
+            run = datetime.now().strftime('%Y%m%d%H%M%S')
+            start = datetime.now() - timedelta(days=365)
+            date = lambda: exporter.make_date(start + timedelta(seconds=random.randint(0, 365 * 86400)))
+            counts = {}
+
+            def write(root_tag, el_tag, count, fill):
+                writer = exporter.XmlFileWriter(os.path.join(exporter.TMP_FOLDER, '%s.xml' % root_tag), root_tag)
+
+                for i in range(1, count + 1):
+                    el = ET.Element(el_tag)
+                    fill(i, el)
+                    writer.write(el)
+
+                writer.close()
+                counts[root_tag] = count
+
+            def user(i, el):
+                el.add('id', i)
+                el.add('username', 'benchmark %s %d' % (run, i))
+                el.add('password', '!')
+                el.add('email', 'benchmark-%s-%d@example.com' % (run, i), validated='true')
+                el.add('reputation', random.randint(1, 5000))
+                el.add('badges', bronze=random.randint(0, 9), silver=random.randint(0, 3), gold=0)
+                el.add('joindate', date())
+                el.add('active', 'true')
+                el.add('realname', 'Benchmark user %d' % i)
+                el.add('bio', 'Generated for an import benchmark')
+                el.add('location', '')
+                el.add('website', '')
+                el.add('birthdate', '')
+                el.add('roles')
+                key = el.add('authKeys').add('key')
+                key.add('provider', 'openidurl')
+                key.add('key', 'http://benchmark-%s-%d.example.com/' % (run, i))
+
+                notify = el.add('notifications', enabled='true')
+                notify.add('notify', member_joins='false', new_question='false', new_question_watched_tags='true',
+                           subscribed_questions='true')
+                notify.add('autoSubscribe', questions_asked='true', questions_answered='true')
+                notify.add('notifyOnSubscribed', answers='true', comments='false')
+                notify.add('digest', 'off')
+                el.add('watchedTags')
+                el.add('rejectedTags')
+
+            def tag(i, el):
+                el.add('name', 'benchmark-%s-%d' % (run, i))
+                el.add('author', random.randint(1, options['users']))
+                el.add('used', random.randint(1, 100))
+
+            questions = []
+
+            def node(i, el):
+                author = random.randint(1, options['users'])
+                is_question = not questions or random.random() < 0.3
+                parent = not is_question and random.choice(questions) or None
+                tags = ['benchmark-%s-%d' % (run, random.randint(1, options['tags'])) for t in range(3)]
+                added = date()
+
+                if is_question:
+                    questions.append(i)
+
+                el.add('id', i)
+                el.add('type', is_question and 'question' or 'answer')
+                el.add('author', author)
+                el.add('date', added)
+                el.add('parent', parent or '')
+                el.add('absparent', parent or '')
+                act = el.add('lastactivity')
+                act.add('by', author)
+                act.add('at', added)
+                el.add('title', is_question and 'Benchmark question %d' % i or '')
+                el.add('body', 'Body of node %d, ' % i * 20)
+                el.add('score', random.randint(-2, 20))
+
+                tag_list = el.add('tags')
+
+                for t in is_question and set(tags) or []:
+                    tag_list.add('tag', t)
+
+                revisions = el.add('revisions', active=2)
+
+                for number in (1, 2):
+                    rev = revisions.add('revision')
+                    rev.add('number', number)
+                    rev.add('summary', 'Revision %d' % number)
+                    rev.add('author', author)
+                    rev.add('date', added)
+                    rev.add('title', is_question and 'Benchmark question %d' % i or '')
+                    rev.add('body', 'Body of node %d, ' % i * 20)
+                    rev.add('tags', ", ".join(is_question and set(tags) or []))
+
+                el.add('marked', 'false')
+                el.add('wiki', 'false')
+                el.add('extraRef', '')
+                el.add('extraData')
+                el.add('extraCount', '')
+
+            def action(i, el):
+                user = random.randint(1, options['users'])
+                node = random.randint(1, options['nodes'])
+                kind = random.choice(('voteup', 'voteup', 'voteup', 'votedown', 'favorite', 'delete', 'acceptanswer'))
+
+                el.add('id', i)
+                el.add('type', kind)
+                el.add('date', date())
+                el.add('user', user)
+                el.add('realUser', '')
+                el.add('ip', '127.0.0.1')
+                el.add('node', node)
+                el.add('extraData')
+                el.add('canceled', state='false')
+
+                reputes = el.add('reputes')
+
+                if kind in ('voteup', 'votedown', 'acceptanswer'):
+                    repute = reputes.add('repute', byCanceled='false')
+                    repute.add('user', random.randint(1, options['users']))
+                    repute.add('value', kind == 'votedown' and -2 or 10)
+
+            badges = list(Badge.objects.values_list('cls', flat=True))
+
+            def award(i, el):
+                el.add('badge', random.choice(badges))
+                el.add('user', random.randint(1, options['users']))
+                el.add('node', random.randint(1, options['nodes']))
+                el.add('trigger', '')
+                el.add('action', i * 100)
+
+            write('users', 'user', options['users'], user)
+            write('tags', 'tag', options['tags'], tag)
+            write('nodes', 'node', options['nodes'], node)
+            write('actions', 'action', options['actions'], action)
+            write('awards', 'award', badges and options['actions'] / 100 or 0, award)
+
+            counts['overall'] = sum(counts.values())
+
+            inf = ConfigParser.SafeConfigParser()
+            inf.add_section(exporter.META_INF_SECTION)
+
+            for name, count in counts.items():
+                inf.set(exporter.META_INF_SECTION, name, str(count))
+
+            with open(os.path.join(exporter.TMP_FOLDER, 'backup.inf'), 'wb') as inffile:
+                inf.write(inffile)
+
+            return counts
+        finally:
+            del xml.etree.ElementTree._ElementInterface.add
@@ -0,0 +1,78 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.template import loader
+
+from forum.models import User, Question, Answer, Comment
+from forum.templatetags.email_tags import MultiUserMailMessage
+from forum.utils.mail import render_template_email
+from forum.management.commands.send_email_alerts import DigestQuestionsIndex
+from forum.utils.progress import total_seconds
+
+def _latest(queryset):
+    try:
+        return queryset.order_by('-id')[0]
+    except IndexError:
+        return None
+
+def notification_contexts(recipients):
+    """The context each notification template is sent with, built from the latest rows of the database."""
+    question = _latest(Question.objects.filter_state(deleted=False))
+    answer = _latest(Answer.objects.filter_state(deleted=False))
+    accepted = _latest(Answer.objects.filter_state(deleted=False, accepted=True))
+    comment = _latest(Comment.objects.filter_state(deleted=False))
+    member = _latest(User.objects.all())
+
+    from_date = datetime.datetime.now() - datetime.timedelta(days=1)
+    digest = DigestQuestionsIndex(from_date)
+    digest.prepare(recipients)
+
+    return (
+        ('newquestion', question and {'question': question}),
+        ('newanswer', answer and {'answer': answer}),
+        ('newcomment', comment and {'comment': comment}),
+        ('answeraccepted', accepted and {'answer': accepted}),
+        ('newmember', member and {'newmember': member}),
+        ('digest', {'digest': digest, 'new_members': User.objects.order_by('-id')[:5], 'new_member_count': 5,
+                    'show_all_users': False, 'flagged_count': 0}),
+    )
+
+class Command(NoArgsCommand):
+    help = ("Renders every notification template of the configured database for a number of recipients, rendering "
+            "the whole message for each of them and rendering it once with only the recipient slots filled per "
+            "message, and reports recipients/s. Nothing is sent.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--recipients', dest='recipients', type='int', default=1000, help='Messages rendered per template'),
+    )
+
+    def handle_noargs(self, **options):
+        users = list(User.objects.order_by('id')[:max(options['recipients'], 1)])
+
+        if not users:
+            print "There are no users to send to."
+            return
+
+        # Repeat the users up to the requested number of recipients
+        recipients = [users[i % len(users)] for i in range(max(options['recipients'], 1))]
+
+        for name, context in notification_contexts(users):
+            if context is None:
+                print "%-15s skipped, nothing to notify about" % (name + ':')
+                continue
+
+            template = loader.get_template('notifications/%s.html' % name)
+            node = template.nodelist.get_nodes_by_type(MultiUserMailMessage)[0]
+            rates, outputs = [], []
+
+            for render_once in (False, True):
+                node.render_once = render_once
+                started = datetime.datetime.now()
+                messages = render_template_email(recipients, template, dict(context))
+                rates.append(len(messages) / max(total_seconds(datetime.datetime.now() - started), 0.000001))
+                outputs.append([m[1:4] for m in messages])
+
+            print "%-15s each recipient %.0f recipients/s, render once %.0f recipients/s, %.1fx%s" % (
+                name + ':', rates[0], rates[1], rates[1] / max(rates[0], 0.000001),
+                outputs[0] != outputs[1] and ", MESSAGES DIFFER" or "")
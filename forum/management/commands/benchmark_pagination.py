@@ -0,0 +1,79 @@
+from datetime import datetime
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import NoArgsCommand, CommandError
+
+from forum.models import Question, Tag, User
+from forum.utils import pagination
+from forum.views.readers import QuestionListPaginatorContext, TagPaginatorContext
+from forum.views.users import UserListPaginatorContext
+from forum.utils.progress import total_seconds
+
+class Command(NoArgsCommand):
+    help = ("Times reading deep pages of the question, tag and user lists of the configured database, skipping the "
+            "rows before them with an offset and seeking past the last row of the previous page with a cursor.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--pages', dest='pages', default='1,10,100,1000', help='Comma separated page numbers to time'),
+        make_option('--pagesize', dest='pagesize', type='int', default=30, help='Rows per page'),
+        make_option('--repeat', dest='repeat', type='int', default=5, help='Times each page is read'),
+    )
+
+    def _time(self, function, repeat):
+        started = datetime.now()
+
+        for i in range(repeat):
+            rows = list(function())
+
+        return total_seconds(datetime.now() - started) * 1000 / repeat, rows
+
+    def handle_noargs(self, **options):
+        pagesize = options['pagesize']
+        repeat = max(options['repeat'], 1)
+
+        try:
+            pages = sorted([int(p) for p in options['pages'].split(',')])
+        except ValueError:
+            raise CommandError("--pages must be a list of page numbers.")
+
+        lists = (
+            ('questions', QuestionListPaginatorContext(), Question.objects.filter_state(deleted=False)),
+            ('tags', TagPaginatorContext(), Tag.active.all()),
+            ('users', UserListPaginatorContext(), User.objects.all()),
+        )
+
+        for name, context, objects in lists:
+            ms, count = self._time(lambda: [objects.count()], repeat)
+            print "%s: %d rows, counted in %.3fms" % (name, count[0], ms)
+
+            cache.clear()
+            pagination.approximate_count(objects)
+            ms, count = self._time(lambda: [pagination.approximate_count(objects)], repeat)
+            print "%s: cached count read in %.3fms" % (name, ms)
+
+            for sort, method in context.sort_methods.items():
+                if not method.seek_keys():
+                    continue
+
+                ordered = method.seek(objects)
+
+                for page in pages:
+                    start = (page - 1) * pagesize
+
+                    if page < 2 or start >= count[0]:
+                        continue
+
+                    previous = list(ordered[start - 1:start])
+                    offset_ms, offset_rows = self._time(lambda: ordered[start:start + pagesize], repeat)
+
+                    try:
+                        values = method.seek_values(previous[0])
+                    except (IndexError, ValueError):
+                        continue
+
+                    seek_ms, seek_rows = self._time(lambda: method.seek(objects, values)[:pagesize], repeat)
+
+                    print "%s by %s, page %d: offset %.3fms, seek %.3fms%s" % (
+                        name, sort, page, offset_ms, seek_ms,
+                        [r.id for r in offset_rows] != [r.id for r in seek_rows] and " (different rows!)" or "")
@@ -0,0 +1,75 @@
+import random
+from datetime import datetime
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db import connection, models
+from django.test.client import Client
+
+from forum.models import Question
+from forum.utils import related
+from forum.utils.progress import total_seconds
+
+def _aggregated(question, count=10):
+    """The related questions the way they were found before they were stored, kept to compare against."""
+    ids = Question.objects.filter_state(deleted=False).values('id').filter(tags__id__in=[t.id for t in question.tags.all()]
+            ).exclude(id=question.id).annotate(frequency=models.Count('id')).order_by('-frequency')[:count]
+    return [Question.objects.get(id=r['id']) for r in ids]
+
+class Command(NoArgsCommand):
+    help = ("Times finding the related questions of random questions of the configured database, and rendering their "
+            "pages, with the neighbours stored by rebuild_related_questions.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--questions', dest='questions', type='int', default=200, help='Questions to time'),
+        make_option('--rebuild', dest='rebuild', action='store_true', default=False,
+                    help='Compute every neighbour list first'),
+    )
+
+    def _time(self, function, questions, cold=True):
+        if not cold:
+            for question in questions:
+                function(question)
+
+        started = datetime.now()
+        queries = 0
+
+        for question in questions:
+            if cold:
+                cache.clear()
+
+            before = len(connection.queries)
+            function(question)
+            queries += len(connection.queries) - before
+
+        count = max(len(questions), 1)
+        return total_seconds(datetime.now() - started) * 1000 / count, float(queries) / count
+
+    def handle_noargs(self, **options):
+        from django.conf import settings
+        settings.DEBUG = True
+        random.seed(0)
+
+        ids = list(Question.objects.filter_state(deleted=False).values_list('id', flat=True))
+
+        if not ids:
+            raise CommandError("There are no questions to look at.")
+
+        if options['rebuild']:
+            started = datetime.now()
+            count = related.rebuild()
+            print "Rebuilt the neighbours of %d questions in %.1fs" % (count, total_seconds(datetime.now() - started))
+
+        questions = list(Question.objects.filter(id__in=random.sample(ids, min(options['questions'], len(ids)))))
+        client = Client()
+
+        for name, function in (('aggregated', _aggregated), ('stored', lambda q: q.get_related_questions())):
+            for cold in (True, False):
+                ms, queries = self._time(function, questions, cold)
+                print "%s, %s cache: %.3fms and %.1f queries per question" % (name, cold and 'cold' or 'warm', ms, queries)
+
+        for cold in (True, False):
+            # Queries made while serving a request aren't kept past it
+            ms, queries = self._time(lambda q: client.get(q.get_absolute_url()), questions, cold)
+            print "question page, %s cache: %.3fms per page" % (cold and 'cold' or 'warm', ms)
@@ -0,0 +1,51 @@
+from datetime import datetime
+from optparse import make_option
+
+import markdown
+from django.core.management.base import NoArgsCommand
+from html5lib import serializer
+
+from forum.models import Node
+from forum.utils.html import sanitize_html, _stream_sanitized, _parse_sanitized
+from forum.utils.progress import total_seconds
+
+def _dom_sanitize(html):
+    s = serializer.HTMLSerializer(omit_optional_tags=False, quote_attr_values=True)
+    return u''.join(s.serialize(_parse_sanitized(html)))
+
+class Command(NoArgsCommand):
+    help = "Times the streaming HTML sanitizer against the DOM round-trip over the rendered bodies of real posts."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--limit', dest='limit', type='int', default=1000, help='Number of posts to sanitize'),
+        make_option('--rounds', dest='rounds', type='int', default=3, help='Times each body is sanitized'),
+    )
+
+    def handle_noargs(self, **options):
+        limit, rounds = options['limit'], options['rounds']
+
+        bodies = [markdown.markdown(body) for body in
+                  Node.objects.order_by('-id').values_list('body', flat=True)[:limit]]
+
+        if not bodies:
+            print "There are no posts to sanitize."
+            return
+
+        streamed = len([html for html in bodies if _stream_sanitized(html) is not None])
+        different = len([html for html in bodies if sanitize_html(html) != _dom_sanitize(html)])
+
+        timings = []
+
+        for sanitize in (_dom_sanitize, sanitize_html):
+            started = datetime.now()
+
+            for i in range(rounds):
+                for html in bodies:
+                    sanitize(html)
+
+            timings.append(total_seconds(datetime.now() - started) / (rounds * len(bodies)))
+
+        print "Bodies:    %d (%d streamed, %d through the parser)" % (len(bodies), streamed, len(bodies) - streamed)
+        print "DOM:       %.3f ms per body" % (timings[0] * 1000)
+        print "Streaming: %.3f ms per body (%.1fx)" % (timings[1] * 1000, timings[0] / max(timings[1], 1e-9))
+        print "Different: %d" % different
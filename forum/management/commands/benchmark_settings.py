@@ -0,0 +1,51 @@
+from datetime import datetime
+from optparse import make_option
+
+from django.conf import settings as djsettings
+from django.core.management.base import NoArgsCommand
+from django.db import connection
+
+from forum.models import KeyValue
+from forum.settings.base import Setting, snapshot
+from forum.utils.progress import total_seconds
+
+def _per_key(setting):
+    # What BaseSetting.value did once its five second mini cache expired
+    try:
+        return KeyValue.objects.get(key=setting.name).value
+    except KeyValue.DoesNotExist:
+        return setting.default
+
+def _snapshot(setting):
+    return setting.value
+
+class Command(NoArgsCommand):
+    help = "Times reading every setting through per key lookups and through the settings snapshot."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--rounds', dest='rounds', type='int', default=100, help='Times every setting is read'),
+    )
+
+    def handle_noargs(self, **options):
+        rounds = options['rounds']
+        all_settings = [setting for set in Setting.sets.values() for setting in set]
+
+        debug, djsettings.DEBUG = djsettings.DEBUG, True
+        snapshot.get_values()
+
+        try:
+            for name, read in (('Per key', _per_key), ('Snapshot', _snapshot)):
+                connection.queries = []
+                started = datetime.now()
+
+                for i in range(rounds):
+                    for setting in all_settings:
+                        read(setting)
+
+                elapsed = total_seconds(datetime.now() - started)
+                reads = rounds * len(all_settings)
+
+                print "%-9s %d reads, %.0f reads/s, %d queries" % (
+                    name + ':', reads, reads / max(elapsed, 0.000001), len(connection.queries))
+        finally:
+            djsettings.DEBUG = debug
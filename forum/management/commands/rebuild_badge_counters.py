@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from forum.utils.counters import ActivityCounter
+from forum.utils.progress import total_seconds
+
+class Command(NoArgsCommand):
+    help = ("Counts every badge counter again from the actions and posts in the database. Run it after an import, "
+            "which doesn't move the counters.")
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        # The badges define some of the counters
+        import forum.badges
+
+        for name, counter in sorted(ActivityCounter.by_name.items()):
+            started = datetime.now()
+            count = counter.rebuild()
+            print "%-20s %d rows in %.1fs" % (name + ':', count, total_seconds(datetime.now() - started))
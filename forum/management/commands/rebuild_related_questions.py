@@ -0,0 +1,22 @@
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from forum.utils import related
+from forum.utils.progress import total_seconds
+
+class Command(NoArgsCommand):
+    help = ("Computes the related questions of every question again. Run it after an import, which doesn't keep them "
+            "up to date, or now and then to catch up with tags growing more or less common.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', dest='batch_size', type='int', default=1000, help='Rows written together'),
+    )
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        started = datetime.now()
+        count = related.rebuild(max(options['batch_size'], 1))
+        print "Related questions of %d questions computed in %.1fs" % (count, total_seconds(datetime.now() - started))
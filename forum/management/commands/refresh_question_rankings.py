@@ -0,0 +1,22 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from forum.utils import rankings
+
+class Command(NoArgsCommand):
+    help = ("Brings the hottest questions list up to date, for sites that would rather run it from cron than on the "
+            "first page view after QUESTION_RANKINGS_REFRESH_SECONDS.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--rebuild', dest='rebuild', action='store_true', default=False,
+                    help='Fill the hottest, unanswered and most voted lists from scratch, after a bulk import'),
+    )
+
+    @transaction.commit_on_success
+    def handle_noargs(self, **options):
+        if options['rebuild']:
+            rankings.rebuild()
+        else:
+            rankings.refresh_hot()
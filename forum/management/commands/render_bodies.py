@@ -1,19 +1,170 @@
 # coding: utf-8
 
-from django.core.management.base import BaseCommand
-from forum.models import Node
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+from django.utils.encoding import smart_str
+from forum.models import Node, KeyValue
+from forum.utils.progress import total_seconds
 
 import logging
 
-class Command(BaseCommand):
-
-    def handle(self,*args, **options):
-        # Re-render node bodies
-        nodes = Node.objects.all()
-        for node in nodes:
-            try:
-                node.body = node.rendered(node.body)
-                node.save()
-                print node.body
-            except Exception, e:
-                logging.error(e)
+CHECKPOINT_KEY = 'RENDER_BODIES_CHECKPOINT'
+
+# Keeps each UPDATE statement under MySQL's default max_allowed_packet of 1MB, whatever the length of the posts
+WRITE_BATCH_SIZE = 100
+WRITE_BATCH_BYTES = 256 * 1024
+
+def _close_connection():
+    # Forked workers must not share the parent's database connection
+    connection.close()
+
+def _render_chunk(ids):
+    """
+    Renders the active revision of each node in ids. Returns the ids, the (id, body) pairs that differ from the
+    stored body and the number of nodes that failed to render.
+    """
+    changed = []
+    errors = 0
+
+    sources = dict([(id, (body, source)) for id, body, source in
+                    Node.objects.filter(id__in=ids).values_list('id', 'body', 'active_revision__body')])
+
+    for node in Node.objects.filter(id__in=ids):
+        body, source = sources[node.id]
+
+        try:
+            rendered = node.rendered(source is not None and source or body)
+        except Exception, e:
+            logging.error("Unable to render the body of node %s: %s" % (node.id, str(e)))
+            errors += 1
+            continue
+
+        if rendered != body:
+            changed.append((node.id, rendered))
+
+    return ids, changed, errors
+
+def _batches(changed):
+    """Splits the (id, body) pairs in batches of at most WRITE_BATCH_SIZE rows and about WRITE_BATCH_BYTES of bodies."""
+    batch, size = [], 0
+
+    for id, body in changed:
+        length = len(smart_str(body))
+
+        if batch and (len(batch) >= WRITE_BATCH_SIZE or size + length > WRITE_BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+
+        batch.append((id, body))
+        size += length
+
+    if batch:
+        yield batch
+
+def _write_bodies(changed):
+    """Stores the rendered bodies with one UPDATE per batch, bypassing save() and the query cache invalidation."""
+    table = connection.ops.quote_name(Node._meta.db_table)
+    cursor = connection.cursor()
+
+    for batch in _batches(changed):
+        params = []
+
+        for id, body in batch:
+            params.extend([id, body])
+
+        params.extend([id for id, body in batch])
+
+        cursor.execute("UPDATE %s SET body = CASE id %s END WHERE id IN (%s)" % (
+            table, " ".join(["WHEN %s THEN %s"] * len(batch)), ", ".join(["%s"] * len(batch))), params)
+
+    transaction.commit_unless_managed()
+
+    # The row cache holds the old bodies, query caches only hold ids
+    cache.delete_many([Node.infer_cache_key({'id': id}) for id, body in changed])
+
+class Command(NoArgsCommand):
+    help = "Re-renders the body of every node from its active revision."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--processes', dest='processes', type='int', default=cpu_count(),
+                    help='Number of rendering processes, 1 renders in this process'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500, help='Nodes per chunk'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Only report the nodes whose rendered body changed'),
+        make_option('--restart', action='store_true', dest='restart', default=False,
+                    help='Ignore the checkpoint of a previous run and start from the first node'),
+    )
+
+    def _chunks(self, last_id, chunk_size):
+        while True:
+            ids = list(Node.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+
+            if not ids:
+                return
+
+            last_id = ids[-1]
+            yield ids
+
+    def handle_noargs(self, **options):
+        dry_run = options['dry_run']
+        processes = max(options['processes'], 1)
+        chunk_size = max(options['chunk_size'], 1)
+
+        try:
+            checkpoint = KeyValue.objects.get(key=CHECKPOINT_KEY)
+        except KeyValue.DoesNotExist:
+            checkpoint = KeyValue(key=CHECKPOINT_KEY, value=0)
+
+        if options['restart'] or dry_run:
+            last_id = 0
+        else:
+            last_id = checkpoint.value
+
+        total = Node.objects.filter(id__gt=last_id).count()
+
+        if last_id:
+            print "Resuming after node %d, %d nodes left" % (last_id, total)
+
+        if processes > 1:
+            _close_connection()
+            pool = Pool(processes, _close_connection)
+            results = pool.imap(_render_chunk, self._chunks(last_id, chunk_size))
+        else:
+            pool = None
+            results = (_render_chunk(ids) for ids in self._chunks(last_id, chunk_size))
+
+        started = datetime.now()
+        done = changed_count = error_count = 0
+
+        try:
+            for ids, changed, errors in results:
+                if dry_run:
+                    for id, body in changed:
+                        print "Node %d changed" % id
+                else:
+                    if changed:
+                        _write_bodies(changed)
+
+                    checkpoint.value = ids[-1]
+                    checkpoint.save()
+
+                done += len(ids)
+                changed_count += len(changed)
+                error_count += errors
+
+                elapsed = total_seconds(datetime.now() - started)
+                print "%d/%d nodes, %d changed, %d errors, %.1f nodes/s" % (
+                    done, total, changed_count, error_count, done / max(elapsed, 0.001))
+        finally:
+            if pool:
+                pool.terminate()
+
+        if not dry_run:
+            # The run is complete, the next one starts over
+            checkpoint.value = 0
+            checkpoint.save()
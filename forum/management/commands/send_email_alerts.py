@@ -1,11 +1,15 @@
 import datetime
+from optparse import make_option
 from forum.models import *
 from forum import settings
 from django.db import models
 from forum.utils.mail import send_template_email
+from forum.utils.progress import total_seconds
 from django.core.management.base import NoArgsCommand
 from forum.settings.email import EMAIL_DIGEST_FLAG
 from django.utils import translation
+from django.conf import settings as django_settings
+from django.db import connection
 import logging
 
 SHOW_N_MORE_ACTIVE_NEW_MEMBERS = 5
@@ -13,6 +17,10 @@ SUB_QUESTION_LIST_LENGTH = 5
 TRY_N_USER_TAGS = 5
 
 class DigestQuestionsIndex(object):
+    """
+    The new questions since from_date, in hotness order and bucketed by tag. Everything get_for_user needs about the
+    recipients is loaded for a whole chunk of them at once by prepare, so building a digest costs no queries.
+    """
     def __init__(self, from_date):
         self.from_date = from_date
 
@@ -29,34 +37,103 @@ class DigestQuestionsIndex(object):
         self.questions = sorted(new_questions, lambda q1, q2: q2.hotness - q1.hotness)
         self.count = len(self.questions)
 
-    def unseen_question(self, user, question):
-        try:
-            subscription = QuestionSubscription.objects.get(question=q, user=user)
-        except:
-            subscription = None
+        self.by_id = dict([(q.id, q) for q in self.questions])
+        self.by_tag = {}
 
-        return (not subscription) or subscription.last_view < q.last_activity_at
+        for position, q in enumerate(self.questions):
+            for name in set(q.tagname_list()):
+                self.by_tag.setdefault(name, []).append(position)
 
-    def get_for_user(self, user):
-        user_tags = list(user.marked_tags.filter(user_selections__reason='good'))
+        self.prepared = {}
+
+    def _user_tags(self, user_ids):
+        user_tags = dict([(id, []) for id in user_ids])
+
+        for user_id, name in MarkedTag.objects.filter(user__in=user_ids, reason='good').values_list('user', 'tag__name'):
+            user_tags[user_id].append(name)
+
+        # Users with few interesting tags get the tags they used the most
+        lacking = [id for id, names in user_tags.items() if len(names) < TRY_N_USER_TAGS]
+        usage = {}
+
+        if lacking:
+            tagged = Node.tags.through.objects
+
+            def count(user_id, name, n):
+                counts = usage.setdefault(user_id, {})
+                counts[name] = counts.get(name, 0) + n
+
+            # Tags of their own posts and of the posts they answered or commented
+            for row in tagged.filter(node__author__in=lacking).order_by().values('node__author', 'tag__name').\
+                    annotate(n=models.Count('id')):
+                count(row['node__author'], row['tag__name'], row['n'])
+
+            parents = Node.objects.filter(author__in=lacking, parent__isnull=False).order_by().\
+                values('author', 'parent').annotate(n=models.Count('id'))
+            parent_tags = {}
+
+            for node_id, name in tagged.filter(node__in=set([row['parent'] for row in parents])).values_list('node', 'tag__name'):
+                parent_tags.setdefault(node_id, []).append(name)
+
+            for row in parents:
+                for name in parent_tags.get(row['parent'], ()):
+                    count(row['author'], name, row['n'])
+
+        for user_id in lacking:
+            used = sorted(usage.get(user_id, {}).items(), key=lambda x: (-x[1], x[0]))
+            user_tags[user_id] += [name for name, count in used[:TRY_N_USER_TAGS - len(user_tags[user_id])]]
+
+        return user_tags
+
+    def _seen_questions(self, user_ids):
+        seen = dict([(id, set()) for id in user_ids])
+
+        for user_id, question_id, last_view in QuestionSubscription.objects.filter(
+                user__in=user_ids, question__added_at__gt=self.from_date).values_list('user', 'question', 'last_view'):
+            q = self.by_id.get(question_id, None)
+
+            if q and last_view >= q.last_activity_at:
+                seen[user_id].add(question_id)
 
-        if len(user_tags) < TRY_N_USER_TAGS:
-            user_tags += list(Tag.objects.filter(models.Q(nodes__author=user) | models.Q(nodes__children__author=user)) \
-                .annotate(user_tag_usage_count=models.Count('name')).order_by('-user_tag_usage_count')[:TRY_N_USER_TAGS - len(user_tags)])
+        return seen
 
-        user_tag_names = set([t.name for t in user_tags])
+    def _updated_subscriptions(self, user_ids):
+        subscriptions = dict([(id, []) for id in user_ids])
 
+        for user_id, question_id in QuestionSubscription.objects.filter(user__in=user_ids,
+                question__added_at__lt=self.from_date, question__last_activity_at__gt=models.F('last_view')
+                ).order_by('user', '-last_view').values_list('user', 'question'):
+            if len(subscriptions[user_id]) < SUB_QUESTION_LIST_LENGTH:
+                subscriptions[user_id].append(question_id)
 
-        subscriptions = user.subscriptions.filter(added_at__lt=self.from_date, last_activity_at__gt=models.F('questionsubscription__last_view')
-                                                  ).order_by('-questionsubscription__last_view')[:SUB_QUESTION_LIST_LENGTH]
+        question_ids = [id for ids in subscriptions.values() for id in ids]
+        questions = question_ids and dict([(q.id, q) for q in Question.objects.filter(id__in=question_ids)]) or {}
 
-        unseen_questions = [q for q in self.questions if self.unseen_question(user, q)]
+        return dict([(user_id, [questions[id] for id in ids if id in questions])
+                     for user_id, ids in subscriptions.items()])
 
-        interesting = []
+    def prepare(self, users):
+        """Loads the marked tags and subscriptions of a chunk of recipients, replacing the previous chunk."""
+        user_ids = [u.id for u in users]
 
-        for q in unseen_questions:
-            if len(set(q.tagname_list()) & user_tag_names): interesting.append(q)
+        user_tags = self._user_tags(user_ids)
+        seen = self._seen_questions(user_ids)
+        subscriptions = self._updated_subscriptions(user_ids)
 
+        self.prepared = dict([(id, (set(user_tags[id]), seen[id], subscriptions[id])) for id in user_ids])
+
+    def get_for_user(self, user):
+        if not user.id in self.prepared:
+            self.prepare([user])
+
+        user_tag_names, seen, subscriptions = self.prepared[user.id]
+
+        positions = set()
+
+        for name in user_tag_names:
+            positions.update(self.by_tag.get(name, ()))
+
+        interesting = [self.questions[p] for p in sorted(positions) if not self.questions[p].id in seen]
 
         may_help = []
         if len(interesting):
@@ -64,14 +141,31 @@ class DigestQuestionsIndex(object):
                 may_help = interesting[SUB_QUESTION_LIST_LENGTH:][-SUB_QUESTION_LIST_LENGTH:]
                 interesting = interesting[:SUB_QUESTION_LIST_LENGTH]
         else:
-            interesting = unseen_questions[:SUB_QUESTION_LIST_LENGTH]
+            interesting = [q for q in self.questions if not q.id in seen][:SUB_QUESTION_LIST_LENGTH]
 
         return {'interesting': interesting, 'may_help': may_help, 'subscriptions': subscriptions}
 
 
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=500,
+                    help='Number of recipients whose digests are built and sent together'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Build every digest without sending it or moving the digest date, and report the query rate'),
+    )
 
+    def _chunks(self, users, chunk_size):
+        last_id = 0
+
+        while True:
+            chunk = list(users.filter(id__gt=last_id).order_by('id')[:chunk_size])
+
+            if not chunk:
+                return
+
+            last_id = chunk[-1].id
+            yield chunk
 
-class Command(NoArgsCommand):
     def handle_noargs(self, **options):
         try:
             translation.activate(settings.LANGUAGE_CODE)
@@ -89,7 +183,8 @@ class Command(NoArgsCommand):
         from_date = digest_control['LAST_DAILY']
         digest_control['LAST_DAILY'] = datetime.datetime.now()
 
-        EMAIL_DIGEST_FLAG.set_value(digest_control)
+        if not options['dry_run']:
+            EMAIL_DIGEST_FLAG.set_value(digest_control)
 
         users = User.objects.filter(subscription_settings__enable_notifications=True,
                                     subscription_settings__send_digest=True)
@@ -120,6 +215,39 @@ class Command(NoArgsCommand):
         if (not new_member_count) and (not digest.count):
             return
 
-        send_template_email(users, "notifications/digest.html", locals())
+        dry_run, chunk_size = options['dry_run'], max(options['chunk_size'], 1)
+        context = locals()
+
+        # Count the queries of a dry run, which renders nothing
+        debug = django_settings.DEBUG
+        django_settings.DEBUG = debug or dry_run
+
+        started = datetime.datetime.now()
+        sent = queries = 0
+
+        try:
+            for chunk in self._chunks(users, chunk_size):
+                connection.queries = []
+                digest.prepare(chunk)
+
+                if dry_run:
+                    for user in chunk:
+                        digest.get_for_user(user)
+                else:
+                    send_template_email(chunk, "notifications/digest.html", dict(context))
+
+                sent += len(chunk)
+                queries += len(connection.queries)
+        finally:
+            django_settings.DEBUG = debug
+            connection.queries = []
+
+        elapsed = max(total_seconds(datetime.datetime.now() - started), 0.000001)
+
+        if django_settings.DEBUG or dry_run:
+            print "%d digests in %.1f s, %.1f users/s, %d queries, %.1f queries/s" % (
+                sent, elapsed, sent / elapsed, queries, queries / elapsed)
+        else:
+            print "%d digests in %.1f s, %.1f users/s" % (sent, elapsed, sent / elapsed)
 
 
@@ -0,0 +1,48 @@
+import time
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from forum import settings
+from forum.utils.mailqueue import mail_queue
+from forum.utils.progress import total_seconds
+
+class Command(NoArgsCommand):
+    help = "Delivers the emails waiting in the outgoing mail queue."
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--connections', dest='connections', type='int', default=None,
+                    help='Number of SMTP connections, defaults to the EMAIL_QUEUE_CONNECTIONS setting'),
+        make_option('--forever', action='store_true', dest='forever', default=False,
+                    help='Keep polling the queue instead of exiting once nothing is due'),
+        make_option('--interval', dest='interval', type='int', default=5,
+                    help='Seconds between polls with --forever'),
+    )
+
+    def handle_noargs(self, **options):
+        connections = options['connections'] or int(settings.EMAIL_QUEUE_CONNECTIONS)
+
+        recovered = mail_queue.recover()
+
+        if recovered:
+            print "%d interrupted messages put back in the queue" % recovered
+
+        while True:
+            mail_queue.reset_stats()
+            started = datetime.now()
+
+            mail_queue.start(connections, wait=True)
+
+            if mail_queue.sent or mail_queue.retried or mail_queue.failed:
+                elapsed = total_seconds(datetime.now() - started)
+                print "%d sent, %d retried, %d failed, %.1f messages/s over %d connections" % (
+                    mail_queue.sent, mail_queue.retried, mail_queue.failed,
+                    mail_queue.sent / max(elapsed, 0.001), connections)
+
+            if not options['forever']:
+                counts = mail_queue.counts()
+                print "%(queued)d queued, %(failed)d failed" % counts
+                return
+
+            time.sleep(options['interval'])
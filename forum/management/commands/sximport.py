@@ -0,0 +1,26 @@
+import os
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    args = '<dump folder>'
+    help = ("Imports the xml files of a StackExchange dump extracted to a folder. An import that stopped half way is "
+            "resumed by running it again on the same folder.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--owner', dest='owneruid', default=None, help='Your user id in the dump'),
+        make_option('--workers', dest='workers', type='int', default=None,
+                    help='Processes reading the dump, 0 reads it in this one, one per CPU if not given'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=None,
+                    help='Rows written and committed together'),
+    )
+
+    def handle(self, dump=None, **options):
+        from forum_modules.sximporter import importer
+
+        if not dump or not os.path.isdir(dump):
+            raise CommandError("Give the folder the dump was extracted to.")
+
+        importer.sximport(dump, dict(owneruid=options['owneruid'], workers=options['workers'],
+                                     chunk_size=options['chunk_size'] or importer.CHUNK_SIZE))
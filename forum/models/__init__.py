@@ -1,12 +1,12 @@
 import forum.utils.djangofix
-from question import Question ,QuestionRevision, QuestionSubscription
+from question import Question ,QuestionRevision, QuestionSubscription, RelatedQuestion, RankedQuestion
 from answer import Answer, AnswerRevision
 from tag import Tag, MarkedTag
 from user import User, ValidationHash, AuthKeyUserAssociation, SubscriptionSettings
 from node import Node, NodeRevision, NodeState, NodeMetaClass
 from comment import Comment
 from action import Action, ActionRepute
-from meta import Vote, Flag, Badge, Award
+from meta import Vote, Flag, Badge, Award, ActivityCount
 from utils import KeyValue
 from page import Page
 
@@ -20,9 +20,9 @@ from base import *
 
 __all__ = [
         'Node', 'NodeRevision', 'NodeState',  
-        'Question', 'QuestionSubscription', 'QuestionRevision',
+        'Question', 'QuestionSubscription', 'QuestionRevision', 'RelatedQuestion', 'RankedQuestion',
         'Answer', 'AnswerRevision',
-        'Tag', 'Comment', 'MarkedTag', 'Badge', 'Award',
+        'Tag', 'Comment', 'MarkedTag', 'Badge', 'Award', 'ActivityCount',
         'ValidationHash', 'AuthKeyUserAssociation', 'SubscriptionSettings', 'KeyValue', 'User',
         'Action', 'ActionRepute', 'Vote', 'Flag', 'Page'
         ]
@@ -2,7 +2,6 @@ from django.utils.translation import ugettext as _
 from django.utils.encoding import smart_unicode
 
 from utils import PickledObjectField
-from threading import Thread
 from forum.utils import html
 from base import *
 import re
@@ -57,9 +56,12 @@ class Action(BaseModel):
     canceled_ip = models.CharField(max_length=39)
 
     hooks = {}
+    coalesced_hooks = set()
 
     objects = ActionManager()
 
+    query_cache_dimensions = ('node', 'user', 'action_type')
+
     @property
     def at(self):
         return self.action_date
@@ -170,17 +172,26 @@ class Action(BaseModel):
             return None
 
     @classmethod
-    def hook(cls, fn):
+    def hook(cls, fn, coalesce=False):
+        """
+        Registers fn to be called with every new action of this class. Hooks that only look at the current state of
+        the action's node can pass coalesce=True, then a burst of actions on the same node calls them once.
+        """
         if not Action.hooks.get(cls, None):
             Action.hooks[cls] = []
 
         Action.hooks[cls].append(fn)
 
+        if coalesce:
+            Action.coalesced_hooks.add(fn)
+
     def trigger_hooks(self, threaded, new=True):
         if threaded:
-            thread = Thread(target=trigger_hooks, args=[self, Action.hooks, new])
-            thread.setDaemon(True)
-            thread.start()
+            from forum.utils.hooks import hook_dispatcher
+            hooks = [hook for cls, hooklist in Action.hooks.items() if isinstance(self, cls) for hook in hooklist]
+
+            if hooks:
+                hook_dispatcher.submit(self, hooks, Action.coalesced_hooks, new)
         else:
             trigger_hooks(self, Action.hooks, new)
 
@@ -249,14 +260,13 @@ class ActionProxy(Action):
 class DummyActionProxyMetaClass(type):
     def __new__(cls, *args, **kwargs):
         new_cls = super(DummyActionProxyMetaClass, cls).__new__(cls, *args, **kwargs)
+        new_cls.hooks = []
         ActionProxyMetaClass.types[new_cls.get_type()] = new_cls
         return new_cls
 
 class DummyActionProxy(object):
     __metaclass__ = DummyActionProxyMetaClass
 
-    hooks = []
-
     def __init__(self, ip=None):
         self.ip = ip
 
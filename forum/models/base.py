@@ -6,6 +6,7 @@ except:
     from md5 import new as md5
 from urllib import quote_plus, urlencode
 from django.db import models, IntegrityError, connection, transaction
+from django.db.models.fields import FieldDoesNotExist
 from django.utils.http import urlquote  as django_urlquote
 from django.utils.html import strip_tags
 from django.conf import settings as django_settings
@@ -19,6 +20,8 @@ from django.utils.translation import ugettext as _
 from django.utils.safestring import mark_safe
 from django.utils.encoding import force_unicode
 from django.contrib.sitemaps import ping_google
+from django.utils import tree
+from django.utils.encoding import smart_str
 import django.dispatch
 from forum import settings
 import logging
@@ -46,7 +49,67 @@ class LazyQueryList(object):
 class ToFetch(unicode):
     pass
 
+class QueryCacheStats(object):
+    """
+    Per process hit/miss counters for the query cache, grouped by model and query kind.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = {}
+        self.misses = {}
+        self.invalidations = 0
+
+    def _incr(self, counter, name):
+        counter[name] = counter.get(name, 0) + 1
+
+    def hit(self, name):
+        self._incr(self.hits, name)
+
+    def miss(self, name):
+        self._incr(self.misses, name)
+
+    def invalidated(self, count=1):
+        self.invalidations += count
+
+    def hit_rate(self, name=None):
+        if name is None:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        else:
+            hits, misses = self.hits.get(name, 0), self.misses.get(name, 0)
+
+        if not (hits + misses):
+            return 0.0
+
+        return float(hits) / (hits + misses)
+
+    def __str__(self):
+        names = sorted(set(self.hits.keys() + self.misses.keys()))
+        lines = ["%s: %d hits, %d misses (%.1f%%)" % (
+            name, self.hits.get(name, 0), self.misses.get(name, 0), self.hit_rate(name) * 100) for name in names]
+        lines.append("total: %.1f%% hit rate, %d invalidations" % (self.hit_rate() * 100, self.invalidations))
+        return "\n".join(lines)
+
+query_cache_stats = QueryCacheStats()
+
+def _shares_query_cache(model, other):
+    return isinstance(other, type) and issubclass(other, BaseModel) and (
+        model._generate_cache_key('') == other._generate_cache_key(''))
+
+PK_LOOKUPS = ('', 'exact', 'in', 'isnull', 'pk', 'id', 'pk__exact', 'id__exact', 'pk__in', 'id__in')
+
 class CachedQuerySet(models.query.QuerySet):
+    # (dimension, value) pairs pinned by the filters applied so far, and whether some filter,
+    # aggregate or ordering makes the results depend on rows other than the ones returned.
+    _query_cache_deps = ()
+    _query_cache_wide = False
+
+    # Denormalized counters filled in bulk for every page of results, see prefetch_denormalized
+    _prefetch_denormalized = ()
+
+    # User foreign keys loaded in bulk for every page of results, see hydrate_users
+    _hydrate_users = None
 
     def lazy(self):
         if not len(self.query.aggregates):
@@ -72,6 +135,131 @@ class CachedQuerySet(models.query.QuerySet):
     def _base_clone(self):
         return self._clone(klass=models.query.QuerySet)
 
+    def _clone(self, *args, **kwargs):
+        c = super(CachedQuerySet, self)._clone(*args, **kwargs)
+        c._query_cache_deps = self._query_cache_deps
+        c._query_cache_wide = self._query_cache_wide
+        c._prefetch_denormalized = self._prefetch_denormalized
+        c._hydrate_users = self._hydrate_users
+        return c
+
+    def prefetch_denormalized(self, *names):
+        clone = self._clone()
+        clone._prefetch_denormalized = names
+        return clone
+
+    def hydrate_users(self, *fields):
+        clone = self._clone()
+        clone._hydrate_users = fields
+        return clone
+
+    def in_bulk(self, id_list):
+        """
+        Like QuerySet.in_bulk, but reads the rows from the row cache and only queries for the ones not cached. As with
+        get, cached rows aren't checked against the filters of this queryset.
+        """
+        if not id_list:
+            return {}
+
+        keys = dict([(self.model.infer_cache_key({'id': id}), id) for id in id_list])
+        cached = cache.get_many(keys.keys())
+
+        objects = dict([(keys[key], self.obj_from_datadict(data)) for key, data in cached.items()])
+        missing = [id for key, id in keys.items() if not key in cached]
+
+        if missing:
+            fetched = self._base_clone().in_bulk(missing)
+            cache.set_many(dict([(self.model.infer_cache_key({'id': id}), obj._as_dict()) for id, obj in fetched.items()]),
+                          60 * 60)
+            objects.update(fetched)
+
+        for id, obj in objects.items():
+            if hasattr(obj, 'leaf'):
+                objects[id] = obj = obj.leaf
+
+            obj.reset_original_state()
+
+        return objects
+
+    def _filter_or_exclude(self, negate, *args, **kwargs):
+        clone = super(CachedQuerySet, self)._filter_or_exclude(negate, *args, **kwargs)
+
+        lookups = [(not negate, k, v) for k, v in kwargs.items()]
+        to_visit = [(not negate, q) for q in args if isinstance(q, tree.Node)]
+
+        while to_visit:
+            narrowing, q = to_visit.pop()
+            narrowing = narrowing and not q.negated and (q.connector == models.Q.AND or len(q.children) == 1)
+
+            for child in q.children:
+                if isinstance(child, tree.Node):
+                    to_visit.append((narrowing, child))
+                else:
+                    lookups.append((narrowing, child[0], child[1]))
+
+        deps = []
+
+        for narrowing, lookup, value in lookups:
+            if self._is_wide_lookup(lookup, value):
+                clone._query_cache_wide = True
+            elif narrowing:
+                dep = self._lookup_dependency(lookup, value)
+
+                if dep is not None:
+                    deps.append(dep)
+
+        clone._query_cache_deps = self._query_cache_deps + tuple(deps)
+        return clone
+
+    def _is_wide_lookup(self, lookup, value):
+        if isinstance(value, models.query.QuerySet) and _shares_query_cache(self.model, value.model):
+            return True
+
+        parts = lookup.split('__')
+
+        try:
+            field, model, direct, m2m = self.model._meta.get_field_by_name(parts[0])
+        except FieldDoesNotExist:
+            return False
+
+        if direct:
+            related = field.rel and field.rel.to or None
+        else:
+            related = field.model
+
+        if not _shares_query_cache(self.model, related):
+            return False
+
+        return (not direct) or ('__'.join(parts[1:]) not in PK_LOOKUPS)
+
+    def _lookup_dependency(self, lookup, value):
+        parts = lookup.split('__')
+
+        if not parts[0] in self.model.query_cache_dimensions:
+            return None
+
+        value = self.model._query_cache_dimension_lookup(parts[0], '__'.join(parts[1:]), value)
+
+        if value is None:
+            return None
+
+        return (parts[0], value)
+
+    def _get_query_cache_dependency(self):
+        if self._query_cache_wide or len(self.query.aggregates) or len(self.query.extra):
+            return None
+
+        for ordering in self.query.order_by:
+            if self._is_wide_lookup(ordering.lstrip('-'), None):
+                return None
+
+        for dimension in self.model.query_cache_dimensions:
+            for dep in self._query_cache_deps:
+                if dep[0] == dimension:
+                    return dep
+
+        return None
+
     def get(self, *args, **kwargs):
         key = self.model.infer_cache_key(kwargs)
 
@@ -90,28 +278,33 @@ class CachedQuerySet(models.query.QuerySet):
 
         return self._base_clone().get(*args, **kwargs)
 
-    def _fetch_from_query_cache(self, key):
-        invalidation_key = self.model._get_cache_query_invalidation_key()
+    def _fetch_from_query_cache(self, key, kind):
+        invalidation_key = self.model._get_cache_query_invalidation_key(self._get_query_cache_dependency())
         cached_result = cache.get_many([invalidation_key, key])
+        stat_name = "%s.%s" % (self.model.__name__, kind)
 
         if not invalidation_key in cached_result:
-            self.model._set_query_cache_invalidation_timestamp()
+            cache.set(invalidation_key, datetime.datetime.now(), 60 * 60 * 24)
+            query_cache_stats.miss(stat_name)
             return None
 
         if (key in cached_result) and(cached_result[invalidation_key] < cached_result[key][0]):
+            query_cache_stats.hit(stat_name)
             return cached_result[key][1]
 
+        query_cache_stats.miss(stat_name)
         return None
 
     def count(self):
         cache_key = self.model._generate_cache_key("CNT:%s" % self._get_query_hash())
-        result = self._fetch_from_query_cache(cache_key)
+        result = self._fetch_from_query_cache(cache_key, "CNT")
 
         if result is not None:
             return result
 
+        started = datetime.datetime.now()
         result = super(CachedQuerySet, self).count()
-        cache.set(cache_key, (datetime.datetime.now(), result), 60 * 60)
+        cache.set(cache_key, (started, result), 60 * 60)
         return result
 
     def iterator(self):
@@ -122,9 +315,11 @@ class CachedQuerySet(models.query.QuerySet):
         to_cache = {}
 
         with_aggregates = len(self.query.aggregates) > 0
-        key_list = self._fetch_from_query_cache(cache_key)
+        key_list = self._fetch_from_query_cache(cache_key, "QUERY")
 
         if key_list is None:
+            started = datetime.datetime.now()
+
             if not with_aggregates:
                 values_list = [on_cache_query_attr]
 
@@ -132,10 +327,10 @@ class CachedQuerySet(models.query.QuerySet):
                     values_list += self.query.extra.keys()
 
                 key_list = [v[0] for v in self.values_list(*values_list)]
-                to_cache[cache_key] = (datetime.datetime.now(), key_list)
+                to_cache[cache_key] = (started, key_list)
             else:
                 to_return = list(super(CachedQuerySet, self).iterator())
-                to_cache[cache_key] = (datetime.datetime.now(), [
+                to_cache[cache_key] = (started, [
                     (row.__dict__[on_cache_query_attr], dict([(k, row.__dict__[k]) for k in self.query.aggregates.keys()]))
                     for row in to_return])
         elif with_aggregates:
@@ -170,10 +365,15 @@ class CachedQuerySet(models.query.QuerySet):
             cache.set_many(to_cache, 60 * 60)
 
         if to_return:
-            for row in to_return:
-                if hasattr(row, 'leaf'):
-                    row = row.leaf
+            to_return = [hasattr(row, 'leaf') and row.leaf or row for row in to_return]
+
+            if self._prefetch_denormalized:
+                prefetch_denormalized(to_return, *self._prefetch_denormalized)
+
+            if self._hydrate_users is not None:
+                hydrate_users(to_return, *self._hydrate_users)
 
+            for row in to_return:
                 row.reset_original_state()
                 yield row
 
@@ -208,6 +408,11 @@ class DenormalizedField(object):
     def setup_class(self, cls, name):
         dict_name = '_%s_dencache_' % name
 
+        if not '_denormalized_fields' in cls.__dict__:
+            cls._denormalized_fields = {}
+
+        cls._denormalized_fields[name] = self
+
         def getter(inst):
             val = inst.__dict__.get(dict_name, None)
 
@@ -225,6 +430,42 @@ class DenormalizedField(object):
         cls.add_to_class(name, property(getter))
         cls.add_to_class("reset_%s_cache" % name, reset_cache)
 
+    def grouped_count(self, cls, ids):
+        """Returns a dict with the count of each of the instances of cls in ids that have any."""
+        related = getattr(cls, self.manager).related
+        key = related.field.name
+
+        return dict([(row[key], row['count']) for row in
+                     related.model._default_manager.filter(**{'%s__in' % key: ids}).filter(
+                             *self.filter[0], **self.filter[1]).order_by().values(key).annotate(count=models.Count('id'))])
+
+
+def prefetch_denormalized(objects, *names):
+    """
+    Fills the denormalized counters in names for all the objects with one grouped count per counter, instead of one
+    count per object and counter, and caches the objects that got any counter filled.
+    """
+    pending = {}
+
+    for obj in objects:
+        fields = obj.denormalized_fields()
+
+        for name in names:
+            if (name in fields) and obj.__dict__.get('_%s_dencache_' % name, None) is None:
+                pending.setdefault((name, fields[name]), []).append(obj)
+
+    filled = {}
+
+    for (name, field), instances in pending.items():
+        counts = field.grouped_count(instances[0].__class__, [obj.id for obj in instances])
+
+        for obj in instances:
+            obj.__dict__['_%s_dencache_' % name] = counts.get(obj.id, 0)
+            filled[obj.cache_key()] = obj
+
+    if filled:
+        cache.set_many(dict([(key, obj._as_dict()) for key, obj in filled.items()]), 60 * 60)
+
 
 class BaseMetaClass(models.Model.__metaclass__):
     to_denormalize = []
@@ -249,6 +490,10 @@ class BaseModel(models.Model):
 
     objects = CachedManager()
 
+    # Fields cached queries can be narrowed on, most selective first. A cached result filtered on one
+    # of these is only invalidated by saves of rows that had or have the same value for that field.
+    query_cache_dimensions = ()
+
     class Meta:
         abstract = True
         app_label = 'forum'
@@ -257,6 +502,15 @@ class BaseModel(models.Model):
         super(BaseModel, self).__init__(*args, **kwargs)
         self.reset_original_state(kwargs.keys())
 
+    @classmethod
+    def denormalized_fields(cls):
+        fields = {}
+
+        for klass in reversed(cls.__mro__):
+            fields.update(klass.__dict__.get('_denormalized_fields', {}))
+
+        return fields
+
     def reset_original_state(self, reset_fields=None):
         self._original_state = self._as_dict()
         
@@ -278,6 +532,7 @@ class BaseModel(models.Model):
 
     def save(self, full_save=False, *args, **kwargs):
         put_back = [k for k, v in self.__dict__.items() if isinstance(v, models.expressions.ExpressionNode)]
+        original_state = self._original_state
 
         if hasattr(self, '_state'):
             self._state.db = 'default'
@@ -297,19 +552,51 @@ class BaseModel(models.Model):
                 self.uncache()
 
         self.reset_original_state()
-        self._set_query_cache_invalidation_timestamp()
+        self._set_query_cache_invalidation_timestamp(self._query_cache_dependencies(original_state, self._original_state))
         self.cache()
 
     @classmethod
-    def _get_cache_query_invalidation_key(cls):
-        return cls._generate_cache_key("INV_TS")
+    def _query_cache_dimension_lookup(cls, dimension, lookup, value):
+        if lookup in PK_LOOKUPS and lookup not in ('in', 'isnull', 'pk__in', 'id__in'):
+            return getattr(value, 'pk', value)
+
+        return None
 
     @classmethod
-    def _set_query_cache_invalidation_timestamp(cls):
-        cache.set(cls._get_cache_query_invalidation_key(), datetime.datetime.now(), 60 * 60 * 24)
+    def _query_cache_dimension_values(cls, dimension, state):
+        return [state.get(cls._meta.get_field(dimension).attname, None)]
+
+    def _query_cache_dependencies(self, *states):
+        deps = set()
+
+        for state in states:
+            for dimension in self.query_cache_dimensions:
+                deps.update([(dimension, v) for v in self._query_cache_dimension_values(dimension, state) if v is not None])
+
+        return deps
+
+    @classmethod
+    def _get_cache_query_invalidation_key(cls, dependency=None):
+        if dependency is None:
+            return cls._generate_cache_key("INV_TS")
+
+        dimension, value = dependency
+
+        if not isinstance(value, (int, long)):
+            value = md5(smart_str(value)).hexdigest()
+
+        return cls._generate_cache_key("INV_TS:%s:%s" % (dimension, value))
+
+    @classmethod
+    def _set_query_cache_invalidation_timestamp(cls, dependencies=()):
+        now = datetime.datetime.now()
+        keys = [cls._get_cache_query_invalidation_key()] + [cls._get_cache_query_invalidation_key(d) for d in dependencies]
+
+        cache.set_many(dict([(k, now) for k in keys]), 60 * 60 * 24)
+        query_cache_stats.invalidated(len(keys))
 
         for base in filter(lambda c: issubclass(c, BaseModel) and (not c is BaseModel), cls.__bases__):
-            base._set_query_cache_invalidation_timestamp()
+            base._set_query_cache_invalidation_timestamp(dependencies)
 
     @classmethod
     def _generate_cache_key(cls, key, group=None):
@@ -348,11 +635,11 @@ class BaseModel(models.Model):
 
     def delete(self):
         self.uncache()
-        self._set_query_cache_invalidation_timestamp()
+        self._set_query_cache_invalidation_timestamp(self._query_cache_dependencies(self._original_state, self._as_dict()))
         super(BaseModel, self).delete()
 
 
-from user import User
+from user import User, hydrate_users
 from node import Node, NodeRevision, NodeManager
 from action import Action
 
@@ -38,6 +38,9 @@ class Comment(Node):
         if not self.id:
             self.parent.reset_comment_count_cache()
 
+        # Warm the render cache, so that the comment isn't rendered on the next page view
+        self._comment()
+
     def mark_deleted(self, user):
         if super(Comment, self).mark_deleted(user):
             self.parent.reset_comment_count_cache()
@@ -79,4 +79,14 @@ class Award(models.Model):
 
     class Meta:
         unique_together = ('user', 'badge', 'node')
-        app_label = 'forum'
\ No newline at end of file
+        app_label = 'forum'
+
+class ActivityCount(models.Model):
+    """The value of one of the counters of forum.utils.counters for a user or node, whose id is owner."""
+    name = models.CharField(max_length=32)
+    owner = models.PositiveIntegerField()
+    value = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('name', 'owner')
+        app_label = 'forum'
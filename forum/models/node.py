@@ -5,12 +5,14 @@ import re
 from tag import Tag
 
 import markdown
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_unicode, smart_str
 from django.utils.translation import ugettext as _
 from django.utils.safestring import mark_safe
 from django.utils.html import strip_tags
-from forum.utils.html import sanitize_html
+from forum.utils.html import sanitize_html, SANITIZER_VERSION
 from forum.utils.userlinking import auto_user_link
+from forum.utils import related as related_questions
+from forum.utils import rankings
 from forum.settings import SUMMARY_LENGTH
 from utils import PickledObjectField
 
@@ -31,16 +33,30 @@ class NodeContent(models.Model):
     def rendered(self, content):
         return auto_user_link(self, self._as_markdown(content, *['auto_linker']))
 
+    @classmethod
+    def _markdown_cache_key(cls, content, extensions):
+        return '%s:markdown:%s' % (settings.APP_URL, md5("%s|%s|%s|%s" % (
+            smart_str(content), ",".join(extensions), SANITIZER_VERSION, getattr(markdown, 'version', ''))).hexdigest())
+
     @classmethod
     def _as_markdown(cls, content, *extensions):
+        cache_key = cls._markdown_cache_key(content, extensions)
+        rendered = cache.get(cache_key)
+
+        if rendered is not None:
+            return mark_safe(rendered)
+
         try:
-            return mark_safe(sanitize_html(markdown.markdown(content, extensions=extensions)))
+            rendered = sanitize_html(markdown.markdown(content, extensions=extensions))
         except Exception, e:
             import traceback
             logging.error("Caught exception %s in markdown parser rendering %s %s:\s %s" % (
                 str(e), cls.__name__, str(e), traceback.format_exc()))
             return ''
 
+        cache.set(cache_key, rendered, 60 * 60 * 24 * 30)
+        return mark_safe(rendered)
+
     def as_markdown(self, *extensions):
         return self._as_markdown(smart_unicode(self.body), *extensions)
 
@@ -251,6 +267,8 @@ class Node(BaseModel, NodeContent):
 
     objects = NodeManager()
 
+    query_cache_dimensions = ('parent', 'abs_parent', 'author', 'tags', 'node_type', 'state_string')
+
     def __unicode__(self):
         return self.headline
 
@@ -258,6 +276,27 @@ class Node(BaseModel, NodeContent):
     def _generate_cache_key(cls, key, group="node"):
         return super(Node, cls)._generate_cache_key(key, group)
 
+    @classmethod
+    def _query_cache_dimension_lookup(cls, dimension, lookup, value):
+        if dimension == 'tags':
+            return (lookup in ('name', 'name__exact')) and value or None
+
+        if dimension == 'state_string':
+            match = (lookup == 'contains') and re.match(r'^\((\w+)\)$', value)
+            return match and match.group(1) or None
+
+        return super(Node, cls)._query_cache_dimension_lookup(dimension, lookup, value)
+
+    @classmethod
+    def _query_cache_dimension_values(cls, dimension, state):
+        if dimension == 'tags':
+            return (state.get('tagnames', None) or '').split()
+
+        if dimension == 'state_string':
+            return re.findall(r'\((\w+)\)', state.get('state_string', None) or '')
+
+        return super(Node, cls)._query_cache_dimension_values(dimension, state)
+
     @classmethod
     def get_type(cls):
         return cls.__name__.lower()
@@ -477,11 +516,20 @@ class Node(BaseModel, NodeContent):
                 tag.add_to_usage_count(1)
                 tag.save()
 
+        if self.node_type == "question":
+            if action:
+                related_questions.remove(self)
+            else:
+                related_questions.update(self)
+
     def delete(self, *args, **kwargs):
         for tag in self.tags.all():
             tag.add_to_usage_count(-1)
             tag.save()
 
+        if self.node_type == "question":
+            related_questions.remove(self)
+
         self.active_revision = None
         self.save()
 
@@ -506,14 +554,27 @@ class Node(BaseModel, NodeContent):
             self.abs_parent = self.parent.absolute_parent
         
         tags_changed = self._process_changes_in_tags()
+        old_tagnames = (self._original_state.get('tagnames', None) or '').split()
+        became_question = self.node_type == "question" and 'node_type' in self.get_dirty_fields()
         
         super(Node, self).save(*args, **kwargs)
+
+        if became_question:
+            rankings.question_added(self)
+
         if tags_changed:
             if self.tagnames.strip():
                 self.tags = list(Tag.objects.filter(name__in=self.tagname_list()))
             else:
                 self.tags = []
 
+            # Queries joining on tags may have been cached between the row update and the m2m update
+            self._set_query_cache_invalidation_timestamp(
+                [('tags', name) for name in set(old_tagnames + self.tagname_list())])
+
+            if self.node_type == "question" and not self.nis.deleted:
+                related_questions.update(self)
+
     class Meta:
         app_label = 'forum'
 
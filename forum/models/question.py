@@ -23,7 +23,8 @@ class Question(Node):
 
     @property    
     def view_count(self):
-        return self.extra_count
+        from forum.utils.viewcount import view_counter
+        return self.extra_count + view_counter.pending_for(self.id)
 
     @property
     def headline(self):
@@ -53,17 +54,33 @@ class Question(Node):
         return reverse('question_revisions', args=[self.id])
 
     def get_related_questions(self, count=10):
-        cache_key = '%s.related_questions:%d:%d' % (settings.APP_URL, count, self.id)
-        related_list = cache.get(cache_key)
+        from forum.utils.related import related_ids
 
-        if related_list is None:
-            related_list = Question.objects.filter_state(deleted=False).values('id').filter(tags__id__in=[t.id for t in self.tags.all()]
-            ).exclude(id=self.id).annotate(frequency=models.Count('id')).order_by('-frequency')[:count]
-            cache.set(cache_key, related_list, 60 * 60)
+        ids = related_ids(self)[:count]
+        questions = Question.objects.in_bulk(ids)
+        return [questions[id] for id in ids if id in questions]
 
-        return [Question.objects.get(id=r['id']) for r in related_list]
-    
 
+class RelatedQuestion(models.Model):
+    """One of the questions most alike to another by their tags, kept up to date by forum.utils.related."""
+    question = models.ForeignKey(Node, related_name='related_questions')
+    related = models.ForeignKey(Node, related_name='related_to')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('question', 'related')
+        app_label = 'forum'
+
+
+class RankedQuestion(models.Model):
+    """A question in one of the lists kept by forum.utils.rankings, the question list sorts page through score."""
+    ranking = models.CharField(max_length=16)
+    question = models.ForeignKey(Node, related_name='rankings')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('ranking', 'question')
+        app_label = 'forum'
 
 
 class QuestionSubscription(models.Model):
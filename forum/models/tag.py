@@ -7,6 +7,7 @@ from django.utils.translation import ugettext as _
 from django.utils.encoding import smart_unicode, force_unicode
 
 from forum import modules
+from forum.utils.autocomplete import tag_index
 
 class ActiveTagManager(CachedManager):
     use_for_related_fields = True
@@ -37,6 +38,18 @@ class Tag(BaseModel):
         else:
             self.used_count = models.F('used_count') + value
 
+    def save(self, *args, **kwargs):
+        reindex = (not self.id) or set(self.get_dirty_fields()) & set(['name', 'used_count'])
+
+        super(Tag, self).save(*args, **kwargs)
+
+        if reindex:
+            tag_index.update(self.id, self.name, self.used_count > 0 and self.used_count or None)
+
+    def delete(self):
+        tag_index.remove(self.id)
+        super(Tag, self).delete()
+
     def cache_key(self):
         return self._generate_cache_key(Tag.safe_cache_name(self.name))
 
@@ -0,0 +1,89 @@
+import random
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum.utils import autocomplete
+from forum.utils.autocomplete import PrefixIndex, tag_index, user_index
+
+
+ROWS = [(1, 'django', 50), (2, 'django-admin', 10), (3, 'python', 80), (4, 'python-3', 5), (5, 'admin-site', 20)]
+
+
+class PrefixIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.max_results = autocomplete.MAX_RESULTS
+
+    def tearDown(self):
+        autocomplete.MAX_RESULTS = self.max_results
+
+    def _index(self, rows=ROWS, name='test'):
+        index = PrefixIndex(name, lambda: list(rows))
+        index.load()
+        return index
+
+    def _names(self, results):
+        return [name for id, name, weight in results]
+
+    def test_ranked_word_prefixes(self):
+        index = self._index()
+
+        self.assertEqual(self._names(index.search('D')), ['django', 'django-admin'])
+        self.assertEqual(self._names(index.search('adm')), ['admin-site', 'django-admin'])
+        self.assertEqual(self._names(index.search('adm', whole_name=True)), ['admin-site'])
+        self.assertEqual(self._names(index.search('p', limit=1)), ['python'])
+        self.assertEqual(index.search(' '), [])
+
+    def test_updates_match_a_fresh_load(self):
+        autocomplete.MAX_RESULTS = 5
+        random.seed(1)
+
+        words = ['ab', 'abc', 'abd', 'b', 'bc', 'ca']
+        rows = dict([(i, ('-'.join(random.sample(words, 2)), random.randint(1, 50))) for i in range(1, 60)])
+        index = self._index([(id, name, weight) for id, (name, weight) in rows.items()])
+        prefixes = ['a', 'ab', 'abc', 'b', 'bc', 'c', 'ca']
+
+        for prefix in prefixes:
+            index.search(prefix)
+
+        for i in range(300):
+            id = random.randint(1, 70)
+
+            if random.random() < 0.1:
+                rows.pop(id, None)
+                index.remove(id)
+            else:
+                rows[id] = (rows.get(id, ('-'.join(random.sample(words, 2)), 0))[0], random.randint(1, 50))
+                index.update(id, rows[id][0], rows[id][1])
+
+        fresh = self._index([(id, name, weight) for id, (name, weight) in rows.items()], 'fresh')
+
+        for prefix in prefixes:
+            for whole_name in (False, True):
+                self.assertEqual(index.search(prefix, whole_name=whole_name), fresh.search(prefix, whole_name=whole_name))
+
+    def test_changes_reach_other_processes(self):
+        index, other = self._index(), self._index()
+
+        index.update(6, 'pylons', 100)
+        index.remove(3)
+
+        other.checked = other.checked.replace(year=2000)
+        self.assertEqual(self._names(other.search('py')), ['pylons', 'python-3'])
+        self.assertEqual(other.loads, 1)
+
+    def test_model_saves_update_the_index(self):
+        tag_index.keys = user_index.keys = None
+
+        user = User(username='indexed', email='indexed@example.com')
+        user.save()
+
+        self.assertEqual(self._names(user_index.search('index')), ['indexed'])
+
+        tag = Tag(name='indexing', created_by=user, used_count=1)
+        tag.save()
+        self.assertEqual(self._names(tag_index.search('index')), ['indexing'])
+
+        tag.used_count = 0
+        tag.save()
+        self.assertEqual(tag_index.search('index'), [])
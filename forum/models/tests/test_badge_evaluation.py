@@ -0,0 +1,44 @@
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum.actions import AwardAction
+from forum.management.commands.award_badges import evaluate_badge, write_awards
+import forum.badges
+from forum_modules.default_badges.settings import NICE_QUESTION_VOTES_UP
+
+
+class BadgeEvaluationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(username='validated', email='validated@example.com', email_isvalid=True)
+        self.user.save()
+        self.other = User(username='other', email='other@example.com')
+        self.other.save()
+
+        self.question = Question(author=self.user, title='question', body='body', tagnames='awards')
+        self.question.save()
+
+    def test_missing_once_awards_are_given(self):
+        name, count, missing, seconds = evaluate_badge('ValidatedEmail')
+        self.assertEqual(missing, [(self.user.id, None, None)])
+
+        badge = Badge.objects.get(cls='ValidatedEmail')
+        write_awards(name, missing, 100)
+
+        self.assertEqual(Award.objects.filter(badge=badge, user=self.user).count(), 1)
+        self.assertEqual(Award.objects.get(badge=badge, user=self.user).action.action_type, 'award')
+        self.assertEqual(User.objects.get(id=self.user.id).bronze, self.user.bronze + 1)
+        self.assertEqual(Badge.objects.get(id=badge.id).awarded_count, badge.awarded_count + 1)
+        self.assertTrue(badge.id in AwardAction.badges_of(self.user.id))
+
+        self.assertEqual(evaluate_badge('ValidatedEmail')[2], [])
+
+    def test_per_node_awards_follow_the_nodes(self):
+        Node.objects.filter(id=self.question.id).update(score=int(NICE_QUESTION_VOTES_UP))
+
+        name, count, missing, seconds = evaluate_badge('NiceQuestion')
+        self.assertEqual(missing, [(self.user.id, self.question.id, None)])
+
+        write_awards(name, missing, 1)
+        self.assertEqual(Award.objects.get(badge__cls='NiceQuestion').node_id, self.question.id)
+        self.assertEqual(evaluate_badge('NiceQuestion')[2], [])
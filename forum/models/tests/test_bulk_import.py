@@ -0,0 +1,50 @@
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import User, Node, Tag
+from forum.utils.bulk import BulkWriter
+from forum_modules.exporter.orm import orm
+
+
+class BulkWriterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.existing = User(username='existing', email='existing@example.com')
+        self.existing.save()
+
+    def test_rows_are_written_with_ids_given_in_advance(self):
+        writer = BulkWriter(2)
+        users = []
+
+        for i in range(3):
+            user = orm.User(username='imported%d' % i, email='imported%d@example.com' % i, password='!')
+            writer.save(user)
+            users.append(user)
+
+        tag = orm.Tag(name='imported', used_count=1, created_by_id=users[0].id)
+        writer.save(tag)
+
+        node = orm.Node(node_type='question', author_id=users[1].id, title='Imported', body='body', tagnames='imported')
+        writer.reserve(node)
+        writer.relate(node, 'tags', [tag])
+
+        revision = orm.NodeRevision(node=node, author_id=users[1].id, revision=1, title='Imported', body='body',
+                                    tagnames='imported', summary='')
+        writer.save(revision)
+        node.active_revision = revision
+        writer.save(node)
+
+        self.assertEqual([u.id for u in users], range(self.existing.id + 1, self.existing.id + 4))
+
+        # Full batches are written as they fill up, the rest on flush
+        self.assertEqual(User.objects.filter(username__startswith='imported').count(), 2)
+        writer.flush()
+
+        self.assertEqual(sorted(User.objects.filter(username__startswith='imported').values_list('id', flat=True)),
+                         [u.id for u in users])
+
+        imported = Node.objects.get(id=node.id)
+        self.assertEqual(imported.author.username, 'imported1')
+        self.assertEqual(imported.active_revision.id, revision.id)
+        self.assertEqual([t.name for t in imported.tags.all()], ['imported'])
+        self.assertEqual(Tag.objects.get(name='imported').created_by.id, users[0].id)
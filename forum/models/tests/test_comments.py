@@ -0,0 +1,54 @@
+from django.test import TestCase
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
+from django.template import Template, Context
+from forum.models import *
+
+
+class ThreadCommentsQueryCountTest(TestCase):
+    def setUp(self):
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+        self.viewer = User(username='viewer', email='viewer@example.com', reputation=1000)
+        self.viewer.save()
+
+    def _create_thread(self, answers, comments_per_post):
+        question = Question(author=self.author, title='question', body='question body', tagnames='thread')
+        question.save()
+
+        posts = [question]
+
+        for i in range(answers):
+            answer = Answer(author=self.author, parent=question, body='answer %d' % i)
+            answer.save()
+            posts.append(answer)
+
+        for post in posts:
+            for i in range(comments_per_post):
+                Comment(author=self.author, parent=post, body='comment %d on %d' % (i, post.id)).save()
+
+        return posts
+
+    def _render_queries(self, posts):
+        cache.clear()
+        tpl = Template("{% load node_tags %}{% for post in posts %}{% comments post user %}{% endfor %}")
+        context = Context({'posts': posts, 'user': self.viewer})
+
+        debug, django_settings.DEBUG = django_settings.DEBUG, True
+        connection.queries = []
+
+        try:
+            tpl.render(context)
+            return len(connection.queries)
+        finally:
+            django_settings.DEBUG = debug
+
+    def test_query_count_does_not_grow_with_comments(self):
+        small_thread = self._create_thread(20, 1)
+        self._render_queries(small_thread)
+
+        small = self._render_queries(small_thread)
+        large = self._render_queries(self._create_thread(20, 10))
+
+        self.assertEqual(small, large)
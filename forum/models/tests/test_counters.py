@@ -0,0 +1,60 @@
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum.actions import CommentAction, DeleteAction, FavoriteAction
+from forum.utils import counters
+import forum.counters
+
+
+class ActivityCountersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+        self.reader = User(username='reader', email='reader@example.com')
+        self.reader.save()
+
+        self.question = Question(author=self.author, title='question', body='body', tagnames='counted')
+        self.question.save()
+
+    def _comment(self):
+        return CommentAction(user=self.author, ip='127.0.0.1').save(
+            dict(text='a comment long enough', parent=self.question), threaded=False).node
+
+    def test_comments_follow_posts_and_deletes(self):
+        comments = [self._comment() for i in range(3)]
+        self.assertEqual(counters.comments.get(self.author.id), 3)
+
+        delete = DeleteAction(node=comments[0], user=self.author, ip='127.0.0.1').save(threaded=False)
+        self.assertEqual(counters.comments.get(self.author.id), 2)
+
+        delete.cancel()
+        self.assertEqual(counters.comments.get(self.author.id), 3)
+
+    def test_favorites_follow_marks_and_cancels(self):
+        favorite = FavoriteAction(node=self.question, user=self.reader, ip='127.0.0.1').save(threaded=False)
+        FavoriteAction(node=self.question, user=self.author, ip='127.0.0.1').save(threaded=False)
+        self.assertEqual(counters.favorites.get(self.question.id), 2)
+
+        favorite.cancel()
+        self.assertEqual(counters.favorites.get(self.question.id), 1)
+
+    def test_missing_counts_are_taken_from_history(self):
+        self._comment()
+        self._comment()
+        ActivityCount.objects.all().delete()
+
+        self.assertEqual(counters.comments.get(self.author.id), 2)
+        self.assertEqual(counters.comments.get(self.reader.id), 0)
+
+    def test_rebuild_matches_incremental_counts(self):
+        for i in range(2):
+            self._comment()
+
+        FavoriteAction(node=self.question, user=self.reader, ip='127.0.0.1').save(threaded=False)
+        before = sorted(ActivityCount.objects.values_list('name', 'owner', 'value'))
+
+        counters.comments.rebuild()
+        counters.favorites.rebuild()
+
+        self.assertEqual(sorted(ActivityCount.objects.values_list('name', 'owner', 'value')), before)
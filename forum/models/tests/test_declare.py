@@ -0,0 +1,49 @@
+from django.test import TestCase
+from django.template import Template, Context
+from forum.templatetags.extra_tags import DeclareNode
+
+
+class DeclareTest(TestCase):
+    def _render(self, source, values):
+        context = Context(values)
+        Template("{% load extra_tags %}" + source).render(context)
+        return context
+
+    def test_expressions_see_the_context_and_earlier_declarations(self):
+        context = self._render("{% declare %}\n"
+                               "    total = sum([n * factor for n in numbers])\n"
+                               "    label = smart_unicode(total) + suffix\n"
+                               "{% enddeclare %}", {'numbers': [1, 2, 3], 'factor': 2, 'suffix': ' points'})
+
+        self.assertEqual(context['total'], 12)
+        self.assertEqual(context['label'], u'12 points')
+
+    def test_generators_and_lambdas_see_the_context(self):
+        context = self._render("{% declare %}\n"
+                               "    names = \", \".join(n.upper() for n in members)\n"
+                               "    scaled = map(lambda n: n * factor, [1, 2])\n"
+                               "{% enddeclare %}", {'members': ['ann', 'bob'], 'factor': 3})
+
+        self.assertEqual(context['names'], 'ANN, BOB')
+        self.assertEqual(context['scaled'], [3, 6])
+
+    def test_only_the_names_used_are_read_from_the_context(self):
+        template = Template("{% load extra_tags %}{% declare %}\n    a = sum(n * k for n in numbers)\n{% enddeclare %}")
+        node = template.nodelist.get_nodes_by_type(DeclareNode)[0]
+
+        self.assertTrue(set(['sum', 'numbers', 'k']) <= node.declarations[0][3])
+        self.assertFalse('unused' in node.declarations[0][3])
+
+    def test_context_shadows_the_declare_globals(self):
+        context = self._render("{% declare %}\n    value = html\n{% enddeclare %}", {'html': 'from the context'})
+        self.assertEqual(context['value'], 'from the context')
+
+    def test_plain_blocks_are_compiled_with_the_template(self):
+        template = Template("{% load extra_tags %}{% declare %}\n    a = 1 + 1\n{% enddeclare %}")
+        node = template.nodelist.get_nodes_by_type(DeclareNode)[0]
+
+        self.assertEqual([name for name, command, code, names in node.declarations], ['a'])
+
+    def test_blocks_with_template_code_are_compiled_when_rendered(self):
+        context = self._render("{% declare %}\n    a = {{ n }} + 1\n{% enddeclare %}", {'n': 41})
+        self.assertEqual(context['a'], 42)
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
+from forum.models import *
+
+
+class PrefetchDenormalizedTest(TestCase):
+    def setUp(self):
+        # Rows cached by earlier tests point to rolled back ids
+        cache.clear()
+
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+
+        self.questions = []
+
+        for i in range(5):
+            question = Question(author=self.author, title='question %d' % i, body='body', tagnames='python')
+            question.save()
+            self.questions.append(question)
+
+            for j in range(i):
+                Answer(author=self.author, parent=question, body='answer %d' % j, marked=(j == 0)).save()
+
+        for canceled in (False, True):
+            action = Action(user=self.author, node=self.questions[1], canceled=canceled)
+            action.save()
+            # Action.save takes the type from the class, skip the favorite processing
+            Action.objects.filter(id=action.id).update(action_type='favorite')
+
+        cache.clear()
+
+    def _counters(self, questions):
+        return [(q.answer_count, q.accepted_count, q.favorite_count) for q in questions]
+
+    def _queries(self, function):
+        debug = django_settings.DEBUG
+        django_settings.DEBUG = True
+        connection.queries = []
+
+        try:
+            result = function()
+            return result, len(connection.queries)
+        finally:
+            django_settings.DEBUG = debug
+
+    def test_counters_match_per_instance_counts(self):
+        expected = self._counters(Question.objects.filter(author=self.author).order_by('id'))
+        cache.clear()
+
+        prefetched = list(Question.objects.filter(author=self.author).order_by('id').prefetch_denormalized(
+                'answer_count', 'accepted_count', 'favorite_count'))
+
+        self.assertEqual(self._counters(prefetched), expected)
+        self.assertEqual(expected[1], (1, 1, 1))
+        self.assertEqual(expected[4], (4, 1, 0))
+
+    def test_one_query_per_counter(self):
+        questions = Question.objects.filter(author=self.author).order_by('id').prefetch_denormalized(
+                'answer_count', 'accepted_count', 'favorite_count')
+
+        def read():
+            return self._counters(list(questions))
+
+        plain_queries = self._queries(lambda: self._counters(list(Question.objects.filter(author=self.author))))[1]
+        cache.clear()
+        prefetched_queries = self._queries(read)[1]
+
+        self.assertTrue(plain_queries >= 15)
+        self.assertTrue(prefetched_queries <= 5)
+
+        # The filled counters were cached with the rows
+        self.assertEqual(self._queries(read)[1], 0)
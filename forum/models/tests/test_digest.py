@@ -0,0 +1,84 @@
+import datetime
+from django.test import TestCase
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
+from forum.models import *
+from forum.management.commands.send_email_alerts import DigestQuestionsIndex
+
+
+class DigestQuestionsIndexTest(TestCase):
+    def setUp(self):
+        # Rows cached by earlier tests point to rolled back ids
+        cache.clear()
+
+        self.from_date = datetime.datetime.now() - datetime.timedelta(days=1)
+
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+
+        self.questions = []
+
+        for i, tags in enumerate(['python', 'django', 'python django', 'java', 'ruby']):
+            question = Question(author=self.author, title='question %d' % i, body='body', tagnames=tags)
+            question.save()
+            self.questions.append(question)
+
+        self.old = Question(author=self.author, title='old question', body='body', tagnames='python')
+        self.old.save()
+        Question.objects.filter(id=self.old.id).update(added_at=self.from_date - datetime.timedelta(days=1))
+
+    def _user(self, name, tags=()):
+        user = User(username=name, email='%s@example.com' % name)
+        user.save()
+
+        for name in tags:
+            MarkedTag(user=user, tag=Tag.objects.get(name=name), reason='good').save()
+
+        return user
+
+    def _ids(self, questions):
+        return sorted([q.id for q in questions])
+
+    def test_interesting_questions_follow_marked_tags(self):
+        user = self._user('pythonista', ['python'])
+        digest = DigestQuestionsIndex(self.from_date)
+        digest.prepare([user])
+
+        self.assertEqual(self._ids(digest.get_for_user(user)['interesting']),
+                         self._ids([self.questions[0], self.questions[2]]))
+
+    def test_seen_questions_are_left_out(self):
+        user = self._user('reader', ['python'])
+        QuestionSubscription(user=user, question=self.questions[0], last_view=datetime.datetime.now() + datetime.timedelta(hours=1)).save()
+
+        digest = DigestQuestionsIndex(self.from_date)
+        self.assertEqual(self._ids(digest.get_for_user(user)['interesting']), [self.questions[2].id])
+
+    def test_updated_subscriptions(self):
+        user = self._user('subscriber')
+        QuestionSubscription(user=user, question=self.old, last_view=self.from_date - datetime.timedelta(days=2)).save()
+
+        digest = DigestQuestionsIndex(self.from_date)
+        self.assertEqual(self._ids(digest.get_for_user(user)['subscriptions']), [self.old.id])
+
+    def test_queries_do_not_grow_with_recipients(self):
+        digest = DigestQuestionsIndex(self.from_date)
+
+        def queries_for(users):
+            debug = django_settings.DEBUG
+            django_settings.DEBUG = True
+            connection.queries = []
+
+            try:
+                digest.prepare(users)
+                for user in users:
+                    digest.get_for_user(user)
+                return len(connection.queries)
+            finally:
+                django_settings.DEBUG = debug
+
+        few = [self._user('few%d' % i, ['python']) for i in range(2)]
+        many = [self._user('many%d' % i, ['django']) for i in range(20)]
+
+        self.assertEqual(queries_for(few), queries_for(many))
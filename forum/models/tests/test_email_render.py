@@ -0,0 +1,53 @@
+from django.test import TestCase
+from django.core.cache import cache
+from django.template import Template, loader
+from forum.models import *
+from forum.templatetags.email_tags import MultiUserMailMessage
+from forum.utils.mail import render_template_email
+
+
+class RenderOnceEmailTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+
+        self.recipients = []
+
+        for name in ('alice', 'bob', 'carol'):
+            user = User(username=name, email='%s@example.com' % name)
+            user.save()
+            self.recipients.append(user)
+
+        self.question = Question(author=self.author, title='a question', body='question *body*', tagnames='python django')
+        self.question.save()
+
+    def test_slots_are_filled_per_recipient(self):
+        template = Template("{% load email_tags %}{% email render_once %}"
+                            "{% subject %}Hi {% recipientslot %}{{ recipient.username }}{% endrecipientslot %}{% endsubject %}"
+                            "{% htmlcontent %}<b>{{ title }}</b> {% recipientslot %}{{ recipient.email }}{% endrecipientslot %}{% endhtmlcontent %}"
+                            "{% textcontent %}{{ title }}{% endtextcontent %}"
+                            "{% endemail %}")
+
+        messages = render_template_email(self.recipients, template, {'title': 'shared'})
+
+        self.assertEqual([m[1] for m in messages], ['Hi alice', 'Hi bob', 'Hi carol'])
+        self.assertEqual(messages[1][2], '<b>shared</b> bob@example.com')
+        self.assertEqual([m[3] for m in messages], ['shared'] * 3)
+
+    def test_render_once_matches_rendering_each_recipient(self):
+        template = loader.get_template('notifications/newquestion.html')
+        node = template.nodelist.get_nodes_by_type(MultiUserMailMessage)[0]
+        outputs = []
+
+        for render_once in (False, True):
+            node.render_once = render_once
+            messages = render_template_email(self.recipients, template, {'question': self.question})
+            outputs.append([m[1:4] for m in messages])
+
+        self.assertEqual(outputs[0], outputs[1])
+
+        for recipient, (subject, html, text) in zip(self.recipients, outputs[1]):
+            self.assertTrue(recipient.username in html)
+            self.assertTrue(recipient.username in text)
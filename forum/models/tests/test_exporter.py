@@ -0,0 +1,61 @@
+import os
+import datetime
+import shutil
+import tempfile
+import xml.etree.ElementTree
+from xml.etree import ElementTree as ET
+
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum_modules.exporter import exporter
+
+
+class StreamingExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        xml.etree.ElementTree._ElementInterface.add = exporter.ET_Element_add_tag
+        self.chunk_size = exporter.EXPORT_CHUNK_SIZE
+        exporter.EXPORT_CHUNK_SIZE = 3
+
+        self.folder = tempfile.mkdtemp()
+
+        for i in range(7):
+            user = User(username=u'user%d \u00e9' % i, email='user%d@example.com' % i)
+            user.save()
+            Question(author=user, title='question <%d> & more' % i, body='<p>body "%d"</p>' % i,
+                     tagnames='python xml').save()
+
+    def tearDown(self):
+        exporter.EXPORT_CHUNK_SIZE = self.chunk_size
+        del xml.etree.ElementTree._ElementInterface.add
+        shutil.rmtree(self.folder)
+
+    def _whole_tree(self, queryset, root_tag, el_tag, fn):
+        root = ET.Element(root_tag)
+
+        for item in queryset.order_by('id'):
+            fn(item, root.add(el_tag), False)
+
+        path = os.path.join(self.folder, 'whole.xml')
+        ET.ElementTree(root).write(path, encoding='UTF-8')
+        return open(path, 'rb').read()
+
+    def _streamed(self, step, lock):
+        fname = step(lambda: None, lock, False, self.folder)
+        return open(os.path.join(self.folder, fname), 'rb').read()
+
+    def test_streamed_files_match_whole_tree(self):
+        lock = datetime.datetime.now()
+
+        for step, queryset, root_tag, el_tag in (
+                (exporter.export_users, User.objects.all(), 'users', 'user'),
+                (exporter.export_nodes, Node.objects.all(), 'nodes', 'node'),
+                (exporter.export_tags, Tag.objects.all(), 'tags', 'tag')):
+            expected = self._whole_tree(queryset, root_tag, el_tag, step.export_row)
+            self.assertEqual(self._streamed(step, lock), expected)
+
+    def test_empty_table(self):
+        Award.objects.all().delete()
+        expected = self._whole_tree(Award.objects.all(), 'awards', 'award', exporter.export_awards.export_row)
+        self.assertEqual(self._streamed(exporter.export_awards, datetime.datetime.now()), expected)
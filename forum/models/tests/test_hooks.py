@@ -0,0 +1,85 @@
+import threading
+
+from django.test import TestCase
+from forum.utils.hooks import HookDispatcher
+from forum import settings
+
+
+class FakeAction(object):
+    def __init__(self, node_id):
+        self.node_id = node_id
+
+
+class HookDispatcherTest(TestCase):
+    def setUp(self):
+        settings.ACTION_HOOK_WORKERS.set_value(2)
+        settings.ACTION_HOOK_QUEUE_SIZE.set_value(10)
+
+        self.dispatcher = HookDispatcher()
+        self.calls = []
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.dispatcher.drain(5)
+
+    def record(self, action, new):
+        self.calls.append(action)
+
+    def blocked(self, action, new):
+        self.release.wait(5)
+
+    def failing(self, action, new):
+        raise ValueError('broken hook')
+
+    def test_hooks_run_in_the_pool(self):
+        actions = [FakeAction(i) for i in range(20)]
+
+        for action in actions:
+            self.dispatcher.submit(action, [self.record], set(), True)
+
+        self.assertEqual(self.dispatcher.drain(5), 0)
+        self.assertEqual(sorted([a.node_id for a in self.calls]), range(20))
+        self.assertEqual(self.dispatcher.metrics()['workers'], 2)
+
+    def test_coalesced_hooks_run_once_per_waiting_node(self):
+        # Keep both workers busy so the coalesced calls wait in the queue
+        self.dispatcher.submit(FakeAction(None), [self.blocked], set(), True)
+        self.dispatcher.submit(FakeAction(None), [self.blocked], set(), True)
+
+        actions = [FakeAction(1) for i in range(5)] + [FakeAction(2)]
+
+        for action in actions:
+            self.dispatcher.submit(action, [self.record], set([self.record]), True)
+
+        self.release.set()
+        self.assertEqual(self.dispatcher.drain(5), 0)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertTrue(actions[4] in self.calls)
+        self.assertEqual(self.dispatcher.metrics()['merged'], 4)
+
+    def test_full_queue_runs_hooks_in_the_caller(self):
+        settings.ACTION_HOOK_QUEUE_SIZE.set_value(1)
+        dispatcher = self.dispatcher = HookDispatcher()
+
+        for i in range(3):
+            dispatcher.submit(FakeAction(None), [self.blocked], set(), True)
+
+        # Two running and one queued, so there's no room left for this one
+        dispatcher.submit(FakeAction(1), [self.record], set(), True)
+
+        self.assertEqual(dispatcher.metrics()['inline'], 1)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_failures_and_latency_are_counted_per_hook(self):
+        self.dispatcher.submit(FakeAction(1), [self.failing, self.record], set(), True)
+        self.dispatcher.drain(5)
+
+        hooks = self.dispatcher.metrics()['hooks']
+        failing = [stats for name, stats in hooks.items() if name.endswith('.failing')][0]
+        record = [stats for name, stats in hooks.items() if name.endswith('.record')][0]
+
+        self.assertEqual((failing['calls'], failing['failures']), (1, 1))
+        self.assertEqual((record['calls'], record['failures']), (1, 0))
+        self.assertEqual(len(self.calls), 1)
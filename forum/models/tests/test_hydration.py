@@ -0,0 +1,75 @@
+from django.test import TestCase
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
+from forum.models import *
+from forum.models.user import hydrate_users
+from forum.actions import SuspendAction
+
+
+class HydrateUsersTest(TestCase):
+    def setUp(self):
+        # Rows cached by earlier tests point to rolled back ids
+        cache.clear()
+
+        self.moderator = User(username='moderator', email='moderator@example.com')
+        self.moderator.save()
+
+        self.users = []
+
+        for i in range(4):
+            user = User(username='user%d' % i, email='user%d@example.com' % i)
+            user.save()
+            self.users.append(user)
+
+        self.suspended = self.users[0]
+        SuspendAction(user=self.moderator, ip='127.0.0.1').save(data=dict(
+                suspended=self.suspended, bantype='indefinitely', publicmsg='', privatemsg=''))
+
+        for user in self.users:
+            Question(author=user, last_activity_by=user, title='question by %s' % user.username, body='body',
+                     tagnames='python').save()
+
+        cache.clear()
+
+    def _queries(self, function):
+        debug = django_settings.DEBUG
+        django_settings.DEBUG = True
+        connection.queries = []
+
+        try:
+            result = function()
+            return result, len(connection.queries)
+        finally:
+            django_settings.DEBUG = debug
+
+    def test_page_users_in_constant_queries(self):
+        questions = list(Question.objects.filter(author__in=self.users).order_by('id'))
+
+        users, queries = self._queries(lambda: hydrate_users(questions, 'author', 'last_activity_by'))
+
+        # The users, the suspension reputes and the suspension actions
+        self.assertEqual(queries, 3)
+        self.assertEqual(sorted(users.keys()), sorted([u.id for u in self.users]))
+
+        suspended, queries = self._queries(lambda: [q.last_activity_by.is_suspended() for q in questions])
+
+        self.assertEqual(queries, 0)
+        self.assertEqual(suspended, [True, False, False, False])
+
+    def test_cached_users_are_not_queried(self):
+        User.objects.in_bulk([u.id for u in self.users])
+        questions = list(Question.objects.filter(author__in=self.users[1:]))
+
+        self.assertEqual(self._queries(lambda: hydrate_users(questions, 'author'))[1], 0)
+
+    def test_queryset_hydrates_each_page(self):
+        questions = Question.objects.filter(author__in=self.users).order_by('id').hydrate_users('last_activity_by')
+
+        page = list(questions[:2])
+        self.assertEqual(self._queries(lambda: [q.last_activity_by.username for q in page])[1], 0)
+
+    def test_suspension_is_looked_up_once(self):
+        user = User.objects.get(id=self.suspended.id)
+        self.assertEqual(user.suspension.action_type, 'suspend')
+        self.assertEqual(self._queries(lambda: user.suspension)[1], 0)
@@ -0,0 +1,131 @@
+import asyncore
+import os
+import time
+import shutil
+import smtpd
+import tempfile
+import threading
+
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import User
+from forum.utils.mail import create_and_send_mail_messages
+from forum.utils.mailqueue import mail_queue, QUEUED, SENDING, SENT, FAILED
+from forum import settings
+
+
+class StandInSMTPServer(smtpd.SMTPServer):
+    """Accepts everything on a local port, except the addresses in refuse which get a temporary failure."""
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.refuse = set()
+        self.received = []
+        self.connections = 0
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if self.refuse.intersection(rcpttos):
+            return '451 Try again later'
+
+        self.received.append((mailfrom, rcpttos, data))
+
+
+class MailQueueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.server = StandInSMTPServer()
+        self.loop = threading.Thread(target=asyncore.loop, kwargs=dict(timeout=0.05))
+        self.loop.setDaemon(True)
+        self.loop.start()
+
+        self.folder = tempfile.mkdtemp()
+
+        settings.EMAIL_HOST.set_value('127.0.0.1')
+        settings.EMAIL_PORT.set_value(self.server.port)
+        settings.EMAIL_QUEUE_FOLDER.set_value(self.folder)
+        settings.EMAIL_QUEUE_CONNECTIONS.set_value(4)
+        settings.EMAIL_QUEUE_MAX_ATTEMPTS.set_value(2)
+        settings.EMAIL_QUEUE_RETRY_SECONDS.set_value(0)
+
+        mail_queue.reset_stats()
+
+    def tearDown(self):
+        self.server.close()
+        asyncore.close_all()
+        self.loop.join()
+        shutil.rmtree(self.folder)
+
+    def test_delivers_over_pooled_connections(self):
+        count = 200
+        ids = [mail_queue.enqueue('site@example.com', 'user%d@example.com' % i, 'Subject: %d\n\nBody' % i)
+               for i in range(count)]
+
+        self.assertEqual(mail_queue.counts()[QUEUED], count)
+
+        mail_queue.start(4, wait=True)
+
+        self.assertEqual(len(self.server.received), count)
+        self.assertEqual(mail_queue.sent, count)
+        self.assertTrue(self.server.connections <= 4)
+        self.assertEqual(set([mail_queue.status(id) for id in ids]), set([SENT]))
+
+    def test_retries_then_gives_up(self):
+        self.server.refuse.add('bounce@example.com')
+
+        bounced = mail_queue.enqueue('site@example.com', 'bounce@example.com', 'Subject: x\n\nBody')
+        delivered = mail_queue.enqueue('site@example.com', 'ok@example.com', 'Subject: y\n\nBody')
+
+        mail_queue.start(1, wait=True)
+
+        self.assertEqual(mail_queue.status(delivered), SENT)
+        self.assertEqual(mail_queue.retried + mail_queue.failed, 2)
+        self.assertEqual(mail_queue.status(bounced), FAILED)
+
+    def test_backoff_delays_retry(self):
+        settings.EMAIL_QUEUE_RETRY_SECONDS.set_value(3600)
+        self.server.refuse.add('later@example.com')
+
+        id = mail_queue.enqueue('site@example.com', 'later@example.com', 'Subject: x\n\nBody')
+        mail_queue.start(1, wait=True)
+
+        self.assertEqual(mail_queue.retried, 1)
+        self.assertEqual(mail_queue.status(id), QUEUED)
+        self.assertEqual(mail_queue.claim(), None)
+
+    def test_recover_leaves_recent_claims(self):
+        id = mail_queue.enqueue('site@example.com', 'slow@example.com', 'Subject: x\n\nBody')
+        new = os.path.join(self.folder, 'new')
+        name = os.listdir(new)[0]
+
+        # Waited an hour in the queue before a worker got to it
+        hour_ago = time.time() - 3600
+        os.utime(os.path.join(new, name), (hour_ago, hour_ago))
+
+        claimed, message = mail_queue.claim()
+        self.assertEqual(mail_queue.recover(), 0)
+        self.assertEqual(mail_queue.status(id), SENDING)
+
+        # Put back anyway, finishing the send must not fail
+        os.rename(os.path.join(self.folder, 'sending', claimed), os.path.join(new, claimed))
+        mail_queue.delivered(claimed)
+        self.assertEqual(mail_queue.sent, 1)
+
+    def test_sending_only_enqueues(self):
+        user = User(username='mailed', email='mailed@example.com')
+
+        # No delivery workers, the call must return with the message still queued
+        settings.EMAIL_QUEUE_CONNECTIONS.set_value(0)
+        create_and_send_mail_messages([(user, u'Hello', u'<p>Hi</p>', u'Hi', {})])
+
+        self.assertEqual(self.server.received, [])
+        self.assertEqual(mail_queue.counts()[QUEUED], 1)
+
+        mail_queue.start(1, wait=True)
+
+        self.assertEqual(len(self.server.received), 1)
+        self.assertEqual(self.server.received[0][1], ['mailed@example.com'])
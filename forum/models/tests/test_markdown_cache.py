@@ -0,0 +1,60 @@
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum.models import node as node_module
+from forum import settings
+
+
+class MarkdownCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+
+        self.renders = []
+        self.markdown = node_module.markdown.markdown
+
+        def counting_markdown(content, *args, **kwargs):
+            self.renders.append(content)
+            return self.markdown(content, *args, **kwargs)
+
+        node_module.markdown.markdown = counting_markdown
+
+    def tearDown(self):
+        node_module.markdown.markdown = self.markdown
+
+    def test_second_render_is_cached(self):
+        first = Node._as_markdown(u'some *text*')
+        second = Node._as_markdown(u'some *text*')
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.renders), 1)
+
+    def test_key_follows_content_sanitizer_and_extensions(self):
+        key = Node._markdown_cache_key(u'some *text*', ())
+
+        self.assertNotEqual(Node._markdown_cache_key(u'other *text*', ()), key)
+        self.assertNotEqual(Node._markdown_cache_key(u'some *text*', ('limitedsyntax',)), key)
+
+        version = node_module.SANITIZER_VERSION
+        node_module.SANITIZER_VERSION = version + 1
+
+        try:
+            self.assertNotEqual(Node._markdown_cache_key(u'some *text*', ()), key)
+        finally:
+            node_module.SANITIZER_VERSION = version
+
+    def test_comment_save_warms_the_cache(self):
+        settings.FORM_ALLOW_MARKDOWN_IN_COMMENTS.set_value(True)
+
+        question = Question(author=self.author, title='question', body='body', tagnames='markdown')
+        question.save()
+
+        comment = Comment(author=self.author, parent=question, body=u'a *warm* comment')
+        comment.save()
+
+        self.assertNotEqual(cache.get(Comment._markdown_cache_key(u'a *warm* comment', ('limitedsyntax',))), None)
+
+        renders = len(self.renders)
+        Comment.objects.get(id=comment.id).comment
+        self.assertEqual(len(self.renders), renders)
@@ -0,0 +1,85 @@
+import datetime
+from base64 import urlsafe_b64encode
+from django.test import TestCase
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest, QueryDict, Http404
+from forum.models import *
+from forum.utils import pagination
+from forum.views.readers import QuestionListPaginatorContext
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(username='author', email='author@example.com')
+        self.user.save()
+
+        added_at = datetime.datetime(2010, 1, 1)
+
+        for i in range(7):
+            question = Question(author=self.user, title='question %d' % i, body='body', tagnames='paged')
+            question.save()
+
+            # Pairs of questions share the sort column, the id has to break the tie
+            Node.objects.filter(id=question.id).update(added_at=added_at + datetime.timedelta(hours=i / 2))
+
+        cache.clear()
+
+        self.context = QuestionListPaginatorContext(pagesizes=(2,), default_pagesize=2)
+        self.context.keyset_pages = 1
+
+    def _request(self, url):
+        request = HttpRequest()
+        request.path, query = (url.replace('&amp;', '&').split('?') + [''])[:2]
+        request.GET = QueryDict(query)
+        request.session = {}
+        request.user = AnonymousUser()
+        return request
+
+    def _page(self, url):
+        questions = pagination._paginated(self._request(url), Question.objects.filter(tags__name='paged'), self.context)
+        return [q.id for q in questions.paginator.page], questions.paginator.page_numbers_context
+
+    def _offset_pages(self, sort):
+        ids = []
+
+        for page in range(1, 5):
+            ids.append(self._page('/questions/?sort=%s&page=%d' % (sort, page))[0])
+
+        return ids
+
+    def test_cursors_walk_the_offset_pages(self):
+        for sort in ('newest', 'mostvoted'):
+            pages = self._offset_pages(sort)
+            self.assertEqual(sorted(sum(pages, [])), sorted(Question.objects.filter(tags__name='paged').values_list('id', flat=True)))
+
+            url, walked = '/questions/?sort=%s' % sort, []
+
+            while url:
+                ids, numbers = self._page(url)
+                walked.append(ids)
+                url = numbers['next_url']
+
+            self.assertEqual(walked, pages)
+            self.assertTrue('cursor=' in self._page('/questions/?sort=%s' % sort)[1]['next_url'])
+
+            url, walked = self._page('/questions/?sort=%s&page=4' % sort)[1]['previous_url'], []
+
+            while url:
+                ids, numbers = self._page(url)
+                walked.insert(0, ids)
+                url = numbers['previous_url']
+
+            self.assertEqual(walked, pages[:3])
+
+    def test_cursor_roundtrip(self):
+        values = [True, 3, 1.5, datetime.datetime(2010, 1, 2, 3, 4, 5, 6), u'caf\xe9']
+        token = pagination.encode_cursor('newest', 12, values, True)
+        self.assertEqual(pagination.decode_cursor(token), (u'newest', 12, 'p', values))
+
+        self.assertRaises(Http404, self._page, '/questions/?sort=newest&cursor=garbage')
+
+        empty = urlsafe_b64encode("newest\x002\x00n\x00").rstrip('=')
+        self.assertRaises(ValueError, pagination.decode_cursor, empty)
+        self.assertRaises(Http404, self._page, '/questions/?sort=newest&cursor=%s' % empty)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+from django.core.cache import cache
+from forum.utils import presence as presence_module
+from forum.utils.presence import PresenceTracker
+from forum import settings
+
+
+class CountingCache(object):
+    def __init__(self, cache):
+        self.cache = cache
+        self.writes = 0
+        self.reads = 0
+
+    def get_many(self, *args, **kwargs):
+        self.reads += 1
+        return self.cache.get_many(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        self.writes += 1
+        return self.cache.set(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+
+class PresenceTrackerTest(TestCase):
+    def setUp(self):
+        settings.ONLINE_USERS_MINUTES.set_value(15)
+        settings.ONLINE_USERS_BUCKET_SECONDS.set_value(60)
+        cache.clear()
+
+        self.counting = CountingCache(presence_module.cache)
+        presence_module.cache = self.counting
+        self.now = datetime(2011, 6, 1, 12, 0, 0)
+
+    def tearDown(self):
+        presence_module.cache = self.counting.cache
+
+    def test_one_write_per_user_per_bucket(self):
+        tracker = PresenceTracker()
+
+        for i in range(50):
+            tracker.record(1, self.now + timedelta(seconds=i))
+            tracker.record(2, self.now + timedelta(seconds=i))
+
+        self.assertEqual(self.counting.writes, 2)
+
+        tracker.record(1, self.now + timedelta(seconds=60))
+        self.assertEqual(self.counting.writes, 3)
+
+    def test_online_list_is_merged_once_per_bucket(self):
+        tracker = PresenceTracker()
+        tracker.record(1, self.now)
+
+        first = tracker.online(self.now + timedelta(minutes=1))
+        reads = self.counting.reads
+
+        self.assertEqual(tracker.online(self.now + timedelta(minutes=1, seconds=30)), first)
+        self.assertEqual(self.counting.reads, reads)
+
+        tracker.online(self.now + timedelta(minutes=2))
+        self.assertTrue(self.counting.reads > reads)
+
+    def test_processes_share_the_online_list(self):
+        first, second = PresenceTracker(), PresenceTracker()
+
+        first.record(1, self.now)
+        second.record(2, self.now + timedelta(seconds=5))
+        second.record(1, self.now + timedelta(minutes=2))
+
+        online = first.online(self.now + timedelta(minutes=3))
+        self.assertEqual([user_id for user_id, last_seen in online], [1, 2])
+        self.assertEqual(online[0][1], self.now + timedelta(minutes=2))
+
+    def test_users_go_offline_after_the_window(self):
+        tracker = PresenceTracker()
+
+        tracker.record(1, self.now)
+        tracker.record(2, self.now + timedelta(minutes=10))
+
+        online = tracker.online(self.now + timedelta(minutes=20))
+        self.assertEqual([user_id for user_id, last_seen in online], [2])
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.core.cache import cache
+from forum.utils.progress import Progress
+
+
+class CountingProgress(Progress):
+    """Counts its publishes, on a clock that only moves when the test moves it."""
+    INTERVAL = timedelta(hours=1)
+    clock = datetime(2011, 1, 1)
+
+    def now(self):
+        return self.clock
+
+    def publish(self):
+        self.published = getattr(self, 'published', 0) + 1
+        super(CountingProgress, self).publish()
+
+
+class ProgressTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_publishes_every_percent(self):
+        progress = CountingProgress('progress-test', [('users', 20000), ('nodes', 30000)])
+
+        for name, count in (('users', 20000), ('nodes', 30000)):
+            progress.start(name, 'Running')
+
+            for i in range(count):
+                progress.ping(name)
+
+        # The first snapshot, one per step start and one per percent of the rows
+        self.assertEqual(progress.published, 103)
+
+        snapshot = cache.get('progress-test')
+        self.assertEqual(snapshot['state']['overall']['parsed'], 50000)
+        self.assertTrue(snapshot['running'])
+
+    def test_publishes_every_interval(self):
+        progress = CountingProgress('progress-test', [('users', 1000)])
+        progress.INTERVAL = timedelta(seconds=1)
+        progress.PERCENT = 100
+        progress.start('users', 'Running')
+
+        for i in range(100):
+            progress.clock += timedelta(milliseconds=100)
+            progress.ping('users')
+
+        # The first snapshot, the step start and one per second of the 10 seconds of rows
+        self.assertEqual(progress.published, 12)
+
+    def test_finish_publishes_rate_and_eta(self):
+        progress = Progress('progress-test', [('tags', 10)], 20)
+        progress.start('tags', 'Running')
+
+        for i in range(5):
+            progress.ping('tags')
+
+        progress.finish(status='Done', fname='backup.zip')
+
+        snapshot = cache.get('progress-test')
+        self.assertEqual(snapshot['running'], False)
+        self.assertEqual(snapshot['errors'], False)
+        self.assertEqual(snapshot['state']['overall']['count'], 20)
+        self.assertEqual(snapshot['state']['overall']['fname'], 'backup.zip')
+        self.assertTrue(snapshot['state']['tags']['rate'] > 0)
+        self.assertEqual(snapshot['state']['tags']['eta'], 5 / snapshot['state']['tags']['rate'])
@@ -0,0 +1,54 @@
+from django.test import TestCase
+from django.db.models import Q, Count
+from forum.models import *
+from forum.models.base import query_cache_stats
+
+
+class QueryCacheDependencyTest(TestCase):
+    def setUp(self):
+        self.user = User(username='author', email='author@example.com')
+        self.user.save()
+
+    def test_narrowest_dimension_is_used(self):
+        qs = Question.objects.filter(author=100).filter_state(deleted=False)
+        self.assertEqual(qs._get_query_cache_dependency(), ('author', 100))
+
+    def test_proxy_manager_depends_on_node_type(self):
+        self.assertEqual(Question.objects.all()._get_query_cache_dependency(), ('node_type', 'question'))
+
+    def test_related_manager_depends_on_parent(self):
+        qs = Node.objects.filter(parent__pk=7, node_type='comment')
+        self.assertEqual(qs._get_query_cache_dependency(), ('parent', 7))
+
+    def test_tag_and_state_lookups(self):
+        self.assertEqual(Question.objects.filter(tags__name='django')._get_query_cache_dependency(), ('tags', 'django'))
+        self.assertEqual(Node.objects.all().any_state('closed')._get_query_cache_dependency(), ('state_string', 'closed'))
+
+    def test_negated_and_or_filters_do_not_narrow(self):
+        qs = Node.objects.filter(~Q(author=100))
+        self.assertEqual(qs._get_query_cache_dependency(), None)
+
+        qs = Node.objects.filter(Q(author=100) | Q(author=101))
+        self.assertEqual(qs._get_query_cache_dependency(), None)
+
+    def test_queries_over_other_nodes_are_wide(self):
+        self.assertEqual(Question.objects.filter(children__marked=True)._get_query_cache_dependency(), None)
+        self.assertEqual(Question.objects.annotate(c=Count('all_children'))._get_query_cache_dependency(), None)
+        self.assertEqual(Question.objects.exclude(id__in=Question.objects.filter(marked=True)
+                                                  )._get_query_cache_dependency(), None)
+
+    def test_unrelated_save_keeps_cached_count(self):
+        user = self.user
+        first = Question(author=user, title='first', body='first', tagnames='one')
+        first.save()
+        second = Question(author=user, title='second', body='second', tagnames='two')
+        second.save()
+
+        Comment(author=user, parent=first, body='comment').save()
+        first.comments.count()
+
+        query_cache_stats.reset()
+        Comment(author=user, parent=second, body='comment').save()
+        first.comments.count()
+
+        self.assertEqual(query_cache_stats.hits.get('Comment.CNT', 0), 1)
@@ -0,0 +1,78 @@
+import datetime
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum.actions import AnswerAction, CommentAction, AcceptAnswerAction, VoteUpAction
+from forum.utils import rankings
+from forum.views.readers import RankedQuestionsSort
+
+
+class QuestionRankingsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User(username='author', email='author@example.com')
+        self.author.save()
+        self.voter = User(username='voter', email='voter@example.com')
+        self.voter.save()
+
+        self.questions = []
+
+        for i in range(3):
+            question = Question(author=self.author, title='question %d' % i, body='body', tagnames='ranked')
+            question.save()
+            self.questions.append(question)
+
+    def _answer(self, question):
+        return AnswerAction(user=self.author, ip='127.0.0.1').save(
+            dict(question=question, text='answer'), threaded=False).node
+
+    def _list(self, ranking):
+        return dict(RankedQuestion.objects.filter(ranking=ranking, question__in=self.questions).values_list('question', 'score'))
+
+    def _snapshot(self):
+        return [self._list(r) for r in (rankings.HOT, rankings.UNANSWERED, rankings.MOST_VOTED)]
+
+    def _sorted(self, ranking):
+        questions = RankedQuestionsSort('', ranking).apply(Question.objects.filter(tags__name='ranked'))
+        return [q.id for q in questions]
+
+    def test_actions_keep_the_lists(self):
+        q = self.questions
+        self.assertEqual(sorted(self._list(rankings.UNANSWERED)), [x.id for x in q])
+
+        answer = self._answer(q[0])
+        self._answer(q[1])
+
+        for i in range(2):
+            CommentAction(user=self.author, ip='127.0.0.1').save(dict(text='comment', parent=q[1]), threaded=False)
+
+        self.assertEqual(self._list(rankings.HOT), {q[0].id: 1, q[1].id: 3})
+
+        accept = AcceptAnswerAction(node=answer, user=self.author, ip='127.0.0.1').save(threaded=False)
+        self.assertFalse(q[0].id in self._list(rankings.UNANSWERED))
+
+        vote = VoteUpAction(node=q[2], user=self.voter, ip='127.0.0.1').save(threaded=False)
+        self.assertEqual(self._list(rankings.MOST_VOTED)[q[2].id], 1)
+
+        incremental = self._snapshot()
+        rankings.rebuild()
+        self.assertEqual(self._snapshot(), incremental)
+
+        self.assertEqual(self._sorted(rankings.HOT), [q[1].id, q[0].id])
+        self.assertEqual(self._sorted(rankings.MOST_VOTED), [q[2].id, q[1].id, q[0].id])
+
+        accept.cancel()
+        vote.cancel()
+        self.assertTrue(q[0].id in self._list(rankings.UNANSWERED))
+        self.assertEqual(self._list(rankings.MOST_VOTED)[q[2].id], 0)
+
+    def test_hot_questions_decay(self):
+        q = self.questions
+        old = self._answer(q[0])
+        self._answer(q[1])
+
+        Node.objects.filter(id=old.id).update(added_at=datetime.datetime.now() - datetime.timedelta(days=2))
+        self.assertEqual(self._list(rankings.HOT), {q[0].id: 1, q[1].id: 1})
+
+        # Reading the list is what brings it up to date
+        self.assertEqual(self._sorted(rankings.HOT), [q[1].id])
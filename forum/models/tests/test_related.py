@@ -0,0 +1,73 @@
+from django.test import TestCase
+from django.core.cache import cache
+from forum.models import *
+from forum.actions import DeleteAction
+from forum.utils import related
+
+
+class RelatedQuestionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(username='author', email='author@example.com')
+        self.user.save()
+
+        self.questions = []
+
+        for tags in ('rare common', 'rare', 'common', 'common', 'common other'):
+            question = Question(author=self.user, title=tags, body='body', tagnames=tags)
+            question.save()
+            self.questions.append(question)
+
+    def _related(self, question):
+        return [q.id for q in Question.objects.get(id=question.id).get_related_questions()]
+
+    def _ids(self, *indexes):
+        return [self.questions[i].id for i in indexes]
+
+    def _all(self):
+        return [self._related(q) for q in self.questions]
+
+    def test_rare_tags_weigh_more(self):
+        q = self.questions
+        related.rebuild()
+
+        self.assertEqual(self._related(q[0]), self._ids(1, 4, 3, 2))
+        self.assertEqual(self._related(q[1]), self._ids(0))
+        self.assertEqual(self._related(q[2]), self._ids(4, 3, 0))
+
+    def test_incremental_changes_match_a_rebuild(self):
+        q = self.questions
+
+        q[2].tagnames = 'rare common'
+        q[2].save()
+        self.assertEqual(self._related(q[0])[0], q[2].id)
+        self.assertEqual(sorted(self._related(q[1])), sorted(self._ids(2, 0)))
+
+        DeleteAction(user=self.user, node=q[4]).save()
+        self.assertFalse(q[4].id in self._related(q[0]))
+
+        # Scores taken at different times may differ from a rebuild, the neighbours themselves must not
+        incremental = [sorted(ids) for ids in self._all()[:4]]
+        related.rebuild()
+        self.assertEqual([sorted(ids) for ids in self._all()[:4]], incremental)
+        self.assertEqual(RelatedQuestion.objects.filter(related=q[4]).count(), 0)
+
+    def test_reading_never_computes(self):
+        lonely = Question(author=self.user, title='lonely', body='body', tagnames='lonely')
+        lonely.save()
+        cache.clear()
+
+        similarities = related.similarities
+
+        def fail(question):
+            raise AssertionError("Computed in the read path")
+
+        related.similarities = fail
+
+        try:
+            self.assertEqual(related.related_ids(lonely), [])
+            self.assertEqual(related.related_ids(lonely), [])
+        finally:
+            related.similarities = similarities
+
+        self.assertEqual(cache.get(related._cache_key(lonely.id)), [])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import markdown
+from django.test import TestCase
+from html5lib import serializer
+from forum.utils.html import sanitize_html, _stream_sanitized, _parse_sanitized
+
+
+MARKDOWN_CORPUS = [
+    u"Plain paragraph.",
+    u"First paragraph.\n\nSecond *emphasis* and **strong** & <stuff>.",
+    u"# Heading\n\n## Sub heading\n\nText under it.",
+    u"* one\n* two\n    * nested\n    * list\n* three",
+    u"1. first\n2. second\n\n    continued paragraph",
+    u"> quoted\n> text\n>\n> > nested quote",
+    u"    def code():\n        return '<b>' & \"x\"\n\nafter the code",
+    u"Inline `code <tag>` and a [link](http://example.com/?a=1&b=2 \"Title\").",
+    u"![image](http://example.com/i.png \"An image\") and <http://example.com/auto>",
+    u"Line with two trailing spaces  \nbreak, then a rule\n\n---\n\nend",
+    u"Unicode: caf\xe9, 日本語, ☃ &amp; &copy; &#169; &#x263a;",
+    u"Raw <span title='t'>html</span> inside <em>markdown</em>.",
+    u"<div class=\"x\" onclick=\"evil()\">block <b>html</b></div>\n\nand markdown after",
+]
+
+HTML_CORPUS = [
+    u"",
+    u"<script>alert('xss')</script>",
+    u"<a href=\"javascript:alert(1)\">bad link</a> <a href=\"http://ok\" rel=\"nofollow\">ok</a>",
+    u"<img src=\"x.png\" onerror=\"alert(1)\" alt=\"a\" width=\"10\">",
+    u"<p style=\"color: red\">styled</p><!-- comment --><p>after</p>",
+    u"<p>unclosed paragraph<p>second",
+    u"<p>paragraph <div>block inside</div></p>",
+    u"<b><i>misnested</b></i>",
+    u"<a href=\"a\">one <a href=\"b\">two</a></a>",
+    u"<ul><li>one<li>two</ul>",
+    u"<dl><dt>term<dd>definition<dt>term</dl>",
+    u"<ul><li>outer<ul><li>inner</li></ul></li></ul>",
+    u"<table><tr><td>cell</td></tr></table>",
+    u"<td>stray cell</td>",
+    u"<pre>\nleading newline</pre>",
+    u"<pre>no leading newline\n</pre>",
+    u"<pre><code>\ncode</code></pre>",
+    u"<h1>heading <h2>inside</h2></h1>",
+    u"<h1>heading</h2>",
+    u"text </p> stray end tags </div></br>",
+    u"<br/><hr/><span/>self closing<div/>",
+    u"<DIV ID=\"upper\" TITLE=\"case\">Upper case</DIV>",
+    u"<span title=\"first\" title=\"second\">duplicate attributes</span>",
+    u"<iframe src=\"http://evil\"></iframe><object><embed></object>",
+    u"<p>a &lt; b &gt; c &amp; d &quot;e&quot; &unknown; &#0; \x00</p>",
+    u"<!DOCTYPE html><html><head><title>t</title></head><body>body</body></html>",
+    u"<font color=\"red\" face=\"x\">font</font><center>centered</center>",
+    u"<blockquote><p>quote</p></blockquote><p>after <a href=\"#\">anchor</a></p>",
+    u"<textarea>\n<b>raw</b></textarea><style>b {}</style>",
+    u"<p>unterminated <a href=\"x",
+    u"<<>>< <a <b>",
+]
+
+
+class StreamingSanitizerTest(TestCase):
+    def _dom_sanitize(self, html):
+        s = serializer.HTMLSerializer(omit_optional_tags=False, quote_attr_values=True)
+        return u''.join(s.serialize(_parse_sanitized(html)))
+
+    def test_markdown_output_is_identical(self):
+        for source in MARKDOWN_CORPUS:
+            html = markdown.markdown(source)
+            self.assertEqual(sanitize_html(html), self._dom_sanitize(html), source)
+
+    def test_markdown_output_is_streamed(self):
+        for source in MARKDOWN_CORPUS:
+            self.assertNotEqual(_stream_sanitized(markdown.markdown(source)), None, source)
+
+    def test_hostile_and_malformed_html_is_identical(self):
+        for html in HTML_CORPUS:
+            self.assertEqual(sanitize_html(html), self._dom_sanitize(html), html)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
+from forum import settings
+from forum.settings.base import Setting, SettingsSnapshot, snapshot
+
+
+class SettingsSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        snapshot.values = None
+        self.all_settings = [s for set in Setting.sets.values() for s in set]
+        self.debug = django_settings.DEBUG
+        django_settings.DEBUG = True
+
+        # Stores the defaults of the settings missing from the test database
+        for setting in self.all_settings:
+            setting.value
+
+    def tearDown(self):
+        django_settings.DEBUG = self.debug
+
+    def _read_all(self):
+        connection.queries = []
+        loads = snapshot.loads
+
+        for setting in self.all_settings:
+            setting.value
+
+        return len(connection.queries), snapshot.loads - loads
+
+    def test_reads_are_served_from_memory(self):
+        self._read_all()
+        self.assertEqual(self._read_all(), (0, 0))
+
+    def test_set_value_is_seen_without_reloading(self):
+        self._read_all()
+        settings.SUMMARY_LENGTH.set_value(123)
+
+        self.assertEqual(settings.SUMMARY_LENGTH.value, 123)
+        self.assertEqual(self._read_all(), (0, 0))
+
+    def test_other_processes_see_changes_after_the_check_interval(self):
+        other = SettingsSnapshot()
+        self.assertNotEqual(other.get_values().get('SUMMARY_LENGTH'), 321)
+
+        settings.SUMMARY_LENGTH.set_value(321)
+        self.assertNotEqual(other.get_values().get('SUMMARY_LENGTH'), 321)
+
+        other.checked = datetime.now() - timedelta(days=1)
+        self.assertEqual(other.get_values().get('SUMMARY_LENGTH'), 321)
+
+    def test_reads_during_an_uncommitted_save_dont_outlive_it(self):
+        reader = SettingsSnapshot()
+        stale = dict(reader.get_values())
+
+        # Other connections don't see the save until the request commits
+        reader._query = lambda: dict(stale)
+        incr = cache.incr
+
+        def incr_then_read(key, *args, **kwargs):
+            generation = incr(key, *args, **kwargs)
+            reader.checked = datetime.now() - timedelta(days=1)
+            reader.get_values()
+            return generation
+
+        cache.incr = incr_then_read
+
+        try:
+            settings.SUMMARY_LENGTH.set_value(777)
+        finally:
+            del cache.incr
+
+        self.assertNotEqual(reader.values.get('SUMMARY_LENGTH'), 777)
+
+        reader.checked = datetime.now() - timedelta(days=1)
+        self.assertEqual(reader.get_values().get('SUMMARY_LENGTH'), 777)
+
+        other = SettingsSnapshot()
+        other._query = lambda: dict(stale)
+        self.assertEqual(other.get_values().get('SUMMARY_LENGTH'), 777)
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from base64 import b64encode
+
+from django.test import TransactionTestCase
+from django.core.cache import cache
+from forum.models import *
+from forum_modules.sximporter import importer
+
+def write_table(folder, name, rows):
+    f = open(os.path.join(folder, '%s.xml' % name), 'wb')
+    f.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<%s>\n" % name)
+
+    for row in rows:
+        f.write("  <row>%s</row>\n" % "".join(["<%s>%s</%s>" % (k, v, k) for k, v in row]))
+
+    f.write("</%s>\n" % name)
+    f.close()
+
+class SXImportTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.folder = tempfile.mkdtemp()
+        date = '2010-01-0%dT10:00:00.000'
+
+        user = lambda id, name: [('Id', id), ('DisplayName', name), ('Email', '%s@example.com' % name),
+                                 ('UserTypeId', 3), ('CreationDate', date % 1), ('LastAccessDate', date % 2),
+                                 ('Reputation', id), ('BadgeSummary', '3=%d' % (id - 10)), ('OpenId', 'http://%s.example.com/' % name)]
+
+        write_table(self.folder, 'Users', [[('Id', -1), ('DisplayName', 'Community')]] +
+                                          [user(10 + i, 'user%d' % i) for i in (1, 2, 3)] + [user(14, 'user1')])
+        write_table(self.folder, 'Tags', [[('Id', 1), ('Name', 'python'), ('Count', 1), ('UserId', 11)],
+                                          [('Id', 2), ('Name', 'xml'), ('Count', 2), ('UserId', 12)]])
+
+        post = lambda id, type, user, extra: [('Id', id), ('PostTypeId', type), ('CreationDate', date % 3),
+                                              ('Body', '&lt;p&gt;body %d&lt;/p&gt;' % id), ('Score', id),
+                                              ('OwnerUserId', user)] + extra
+
+        write_table(self.folder, 'Posts', [
+            post(1, 1, 11, [('Title', 'Question &amp; one'), ('Tags', 'python xml missing python')]),
+            post(2, 2, 12, [('ParentId', 1), ('LastEditorUserId', 13), ('LastEditDate', date % 4)]),
+            post(3, 1, 13, [('Title', 'Question three'), ('Tags', 'xml'), ('CommunityOwnedDate', date % 5)]),
+        ])
+        write_table(self.folder, 'PostComments', [
+            [('Id', 10), ('PostId', 2), ('UserId', 11), ('Text', 'comment'), ('CreationDate', date % 4)],
+            [('Id', 11), ('PostId', 1), ('UserId', 12), ('Text', 'deleted'), ('CreationDate', date % 4),
+             ('DeletionDate', date % 5), ('DeletionUserId', 13)],
+        ])
+
+        vote = lambda type, post, user, extra=[]: [('PostId', post), ('UserId', user), ('VoteTypeId', type),
+                                                   ('CreationDate', date % 6)] + extra
+
+        write_table(self.folder, 'CloseReasons', [[('Id', 1), ('Name', 'Off topic')]])
+        write_table(self.folder, 'Posts2Votes', [
+            vote(1, 2, 11, [('TargetUserId', 12), ('TargetRepChange', 15)]),
+            vote(2, 1, 12, [('TargetUserId', 11), ('TargetRepChange', 10)]),
+            vote(2, 1, 12),
+            vote(3, 1, 13),
+            vote(5, 1, 13),
+            vote(6, 3, 11, [('Comment', 1)]),
+            vote(7, 3, 11),
+            vote(6, 3, 12, [('Comment', 1)]),
+            vote(2, 99, 11),
+        ])
+        write_table(self.folder, 'Comments2Votes', [
+            [('PostCommentId', 10), ('UserId', 12), ('VoteTypeId', 2), ('CreationDate', date % 6)],
+            [('PostCommentId', 10), ('UserId', 13), ('VoteTypeId', 2), ('CreationDate', date % 6)],
+            [('PostCommentId', 10), ('UserId', 13), ('VoteTypeId', 2), ('CreationDate', date % 6)],
+        ])
+        write_table(self.folder, 'Badges', [[('Id', 1), ('Name', 'Nice Answer'), ('Class', 3)]])
+        write_table(self.folder, 'Users2Badges', [[('BadgeId', 1), ('UserId', 12), ('Date', date % 7)],
+                                                  [('BadgeId', 1), ('UserId', 13), ('Date', date % 7)]])
+        write_table(self.folder, 'FlatPages', [[('Name', 'About'), ('Value', b64encode('about us')), ('Url', '/about'),
+                                                ('ContentType', 'text/html'), ('UseMaster', 'true'), ('Active', 'true')]])
+        write_table(self.folder, 'ThemeTextResources', [[('Name', 'theme.html.name'), ('Value', 'Imported')]])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def assertImported(self):
+        # Ids are kept, repeated names are numbered
+        self.assertEqual(sorted(User.objects.values_list('id', 'username')),
+                         [(11, 'user1'), (12, 'user2'), (13, 'user3'), (14, 'user1 1')])
+        self.assertEqual(User.objects.get(id=13).bronze, 3)
+
+        question, answer, wiki = [Node.objects.get(id=id) for id in (1, 2, 3)]
+        self.assertEqual(question.title, 'Question & one')
+        self.assertEqual(question.tagnames, 'python xml')
+        self.assertEqual(sorted([t.name for t in question.tags.all()]), ['python', 'xml'])
+        self.assertEqual(question.extra_ref_id, answer.id)
+        self.assertEqual(question.active_revision.body, '<p>body 1</p>')
+
+        self.assertEqual(answer.abs_parent_id, question.id)
+        self.assertEqual(answer.last_edited.user_id, 13)
+        self.assertTrue(answer.marked)
+        self.assertEqual(answer.state_string, '(accepted)')
+
+        # Closed, reopened and closed again
+        self.assertEqual(wiki.state_string, '(wiki)(closed)')
+        self.assertEqual(NodeState.objects.get(node=wiki, state_type='closed').action.user_id, 12)
+
+        comments = Node.objects.filter(node_type='comment').order_by('id')
+        self.assertEqual([(c.parent_id, c.abs_parent_id, c.author_id) for c in comments], [(2, 1, 11), (1, 1, 13)])
+        self.assertEqual(comments[0].score, 2)
+        self.assertEqual(comments[1].state_string, '(deleted)')
+
+        self.assertEqual(sorted(Vote.objects.values_list('node', 'user', 'value')),
+                         [(1, 12, 1), (1, 13, -1), (comments[0].id, 12, 1), (comments[0].id, 13, 1)])
+        self.assertEqual(ActionRepute.objects.filter(action__action_type='acceptanswer').get().value, 15)
+        self.assertEqual(Action.objects.filter(action_type='userjoins').count(), 4)
+        self.assertEqual(AuthKeyUserAssociation.objects.count(), 3)
+
+        self.assertEqual(Award.objects.count(), 2)
+        self.assertEqual(Badge.objects.get(cls='NiceAnswer').awarded_count, 2)
+        self.assertEqual(Node.objects.filter(node_type='page').count(), 1)
+
+        self.assertEqual(sorted(os.listdir(self.folder)), sorted([f for f in os.listdir(self.folder) if f.endswith('.xml')]))
+
+    def test_import(self):
+        importer.sximport(self.folder, {'workers': 0, 'chunk_size': 2})
+        self.assertImported()
+
+    def test_resumed_import_matches(self):
+        save_setting = importer.save_setting
+        commits = []
+
+        def failing_save_setting(k, v):
+            if k == importer.CHECKPOINT_KEY:
+                commits.append(v)
+
+                # Stops with the checkpoint written but not committed, in the middle of the votes
+                if len(commits) == 12:
+                    raise IOError("crash")
+
+            save_setting(k, v)
+
+        importer.save_setting = failing_save_setting
+
+        try:
+            self.assertRaises(IOError, importer.sximport, self.folder, {'workers': 2, 'chunk_size': 2})
+        finally:
+            importer.save_setting = save_setting
+
+        self.assertFalse(Vote.objects.exists())
+
+        importer.sximport(self.folder, {'workers': 2, 'chunk_size': 2})
+        self.assertImported()
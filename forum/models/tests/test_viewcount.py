@@ -0,0 +1,61 @@
+from django.test import TestCase
+from forum.models import *
+from forum.actions import QuestionViewAction, QuestionViewCountAction
+from forum.utils.viewcount import view_counter
+from forum import settings
+
+
+class ViewCountBufferTest(TestCase):
+    def setUp(self):
+        settings.VIEW_COUNT_FLUSH_VIEWS.set_value(100)
+        settings.VIEW_COUNT_FLUSH_SECONDS.set_value(3600)
+
+        self.user = User(username='author', email='author@example.com')
+        self.user.save()
+        self.question = Question(author=self.user, title='question', body='body', tagnames='views')
+        self.question.save()
+
+        view_counter.reset_stats()
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def test_writes_per_thousand_views(self):
+        for i in range(1000):
+            QuestionViewAction(self.question, self.user).save()
+
+        self.assertEqual(view_counter.views, 1000)
+        self.assertEqual(view_counter.writes, 10)
+        self.assertEqual(Question.objects.filter(id=self.question.id).values_list('extra_count', flat=True)[0], 1000)
+
+    def test_quiet_views_are_flushed_on_time(self):
+        QuestionViewAction(self.question, self.user).save()
+
+        self.assertTrue(view_counter.timer.isAlive())
+        self.assertEqual(view_counter.timer.interval, 3600)
+
+        view_counter.flush()
+        self.assertEqual(view_counter.timer, None)
+
+    def test_view_count_includes_pending_views(self):
+        for i in range(5):
+            QuestionViewAction(self.question, self.user).save()
+
+        self.assertEqual(Question.objects.get(id=self.question.id).view_count, 5)
+
+    def test_thresholds_are_reported_once(self):
+        crossed = []
+
+        def hook(action, new):
+            if action.previous_count < 150 <= action.view_count:
+                crossed.append(action.view_count)
+
+        QuestionViewCountAction.hook(hook)
+
+        try:
+            for i in range(300):
+                QuestionViewAction(self.question, self.user).save()
+        finally:
+            QuestionViewCountAction.hooks.remove(hook)
+
+        self.assertEqual(crossed, [200])
@@ -0,0 +1,22 @@
+from forum.actions import AnswerAction, CommentAction, AcceptAnswerAction, VoteUpAction, VoteDownAction
+from forum.utils import rankings
+
+def child_posted(action, new):
+    rankings.child_added(action.node)
+
+AnswerAction.hook(child_posted)
+CommentAction.hook(child_posted)
+
+
+def answer_accepted(action, new):
+    rankings.answer_accepted(action.node)
+
+AcceptAnswerAction.hook(answer_accepted)
+
+
+def node_voted(action, new):
+    if action.node.node_type == "question":
+        rankings.question_voted(action.node)
+
+VoteUpAction.hook(node_voted, coalesce=True)
+VoteDownAction.hook(node_voted, coalesce=True)
@@ -28,7 +28,6 @@ FORCE_SCRIPT_NAME = djsettings.FORCE_SCRIPT_NAME
 OSQA_SKIN = djsettings.OSQA_DEFAULT_SKIN
 LANGUAGE_CODE = djsettings.LANGUAGE_CODE
 ADMIN_MEDIA_PREFIX = djsettings.ADMIN_MEDIA_PREFIX
-ONLINE_USERS = Setting('ONLINE_USERS', {})
 
 
 from basic import *
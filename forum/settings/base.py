@@ -1,10 +1,117 @@
 import django.dispatch
+from django.core.cache import cache
 from django.utils.encoding import force_unicode, smart_unicode
 from datetime import datetime, timedelta
+from threading import Lock
 import logging
 
 TMP_MINICACHE_SECONDS = 5
 
+class SettingsSnapshot(object):
+    """
+    Every stored setting value, loaded at once and served from process memory.
+
+    The snapshot is tagged with a generation number kept in the cache, which is bumped whenever a setting is saved.
+    Processes check the generation at most every TMP_MINICACHE_SECONDS and reload the whole snapshot when it moved,
+    either from the cache, where it is stored under its generation, or with a single query.
+
+    The query may run while a save is bumping the generation and isn't committed yet, so what it read is only added
+    to the cache, the saving process sets its own snapshot over it, and is checked against the cache again next time.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.values = None
+        self.generation = None
+        self.checked = None
+
+        self.loads = 0
+
+    def _generation_key(self):
+        from django.conf import settings as djsettings
+        return '%s:settings:generation' % djsettings.APP_URL
+
+    def _snapshot_key(self, generation):
+        from django.conf import settings as djsettings
+        return '%s:settings:snapshot:%s' % (djsettings.APP_URL, generation)
+
+    def _current_generation(self):
+        generation = cache.get(self._generation_key())
+
+        if generation is None:
+            # Start from the clock rather than from 1, so that a generation lost from the cache is never reused
+            delta = datetime.now() - datetime(1970, 1, 1)
+            cache.add(self._generation_key(), (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+            generation = cache.get(self._generation_key())
+
+        return generation
+
+    def _query(self):
+        from forum.models import KeyValue
+        return dict([(kv.key, kv.value) for kv in KeyValue.objects.all()])
+
+    def _load(self, generation):
+        """The values of generation, which must have been read before calling, and whether they came from the cache."""
+        values = generation is not None and cache.get(self._snapshot_key(generation)) or None
+        cached = values is not None
+
+        if not cached:
+            values = self._query()
+
+            if generation is not None:
+                cache.add(self._snapshot_key(generation), values)
+
+        self.loads += 1
+        return values, cached
+
+    def get_values(self):
+        now = datetime.now()
+
+        with self.lock:
+            if self.values is not None and self.checked + timedelta(seconds=TMP_MINICACHE_SECONDS) > now:
+                return self.values
+
+        generation = self._current_generation()
+
+        with self.lock:
+            must_load = self.values is None or generation is None or generation != self.generation
+
+        if must_load:
+            values, cached = self._load(generation)
+
+            with self.lock:
+                # Values from the database may miss a save being committed, the next check reads the cache again
+                self.values, self.generation = values, cached and generation or None
+
+        with self.lock:
+            self.checked = now
+            return self.values
+
+    def changed(self, name, value):
+        try:
+            generation = cache.incr(self._generation_key())
+        except ValueError:
+            # Nothing to bump, the next read starts a new generation
+            generation = None
+
+        with self.lock:
+            values = self.values
+
+        if values is None:
+            # The saving process sees its own write
+            values = self._query()
+
+        values = dict(values)
+        values[name] = value
+
+        if generation is not None:
+            # Over whatever a process that read the database before the commit added
+            cache.set(self._snapshot_key(generation), values)
+
+        with self.lock:
+            self.values, self.generation = values, generation
+
+snapshot = SettingsSnapshot()
+
 class SettingSet(list):
     def __init__(self, name, title, description, weight=1000, markdown=False, can_preview=False):
         self.name = name
@@ -28,8 +135,6 @@ class BaseSetting(object):
         self.default = default
         self.field_context = field_context or {}
 
-        self._temp = None
-
         if set is not None:
             self.set = set
             
@@ -46,29 +151,20 @@ class BaseSetting(object):
 
     @property
     def value(self):
-        if self._temp:
-            v, exp = self._temp
-            if exp + timedelta(seconds=TMP_MINICACHE_SECONDS) > datetime.now():
-                return v
-
-        from forum.models import KeyValue
-
         try:
-            kv = KeyValue.objects.get(key=self.name)
-            v = kv.value
-            self._temp = (v, datetime.now() + timedelta(seconds=TMP_MINICACHE_SECONDS))
-            return v
-        except KeyValue.DoesNotExist:
-            self._temp = (self.default, datetime.now() + timedelta(seconds=TMP_MINICACHE_SECONDS))
-            self.save(self.default)
+            values = snapshot.get_values()
         except Exception, e:
             logging.error("Error retrieving setting from database (%s): %s" % (self.name, str(e)))
-            
+            return self.default
+
+        if self.name in values:
+            return values[self.name]
+
+        self.save(self.default)
         return self.default
 
     def set_value(self, new_value):
         new_value = self._parse(new_value)
-        self._temp = None
         self.save(new_value)
 
     def save(self, value):
@@ -84,6 +180,7 @@ class BaseSetting(object):
 
         kv.value = value
         kv.save()
+        snapshot.changed(self.name, value)
 
     def to_default(self):
         self.set_value(self.default)
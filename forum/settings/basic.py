@@ -49,4 +49,15 @@ label = _("Contact URL"),
 help_text = _("The URL provided for users to contact you. It can be http: or mailto: or whatever your preferred contact scheme is."),
 required=False))
 
+ACTION_HOOK_WORKERS = Setting('ACTION_HOOK_WORKERS', 4, BASIC_SET, dict(
+label = _("Action hook workers"),
+help_text = _("How many threads of each server process run the work that follows a user action, like awarding badges and sending notifications.")))
+
+ACTION_HOOK_QUEUE_SIZE = Setting('ACTION_HOOK_QUEUE_SIZE', 1000, BASIC_SET, dict(
+label = _("Action hook queue size"),
+help_text = _("How many actions can wait for a free action hook worker. When the queue is full, the request that saved the action does that work itself.")))
+
+ACTION_HOOK_DRAIN_SECONDS = Setting('ACTION_HOOK_DRAIN_SECONDS', 10, BASIC_SET, dict(
+label = _("Action hook drain time"),
+help_text = _("Seconds a server process waits on exit for the queued action hooks to finish.")))
 
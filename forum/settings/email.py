@@ -1,3 +1,4 @@
+import os.path
 from base import Setting, SettingSet
 from django.utils.translation import ugettext_lazy as _
 from django.forms.widgets import PasswordInput
@@ -83,4 +84,24 @@ label = _("Send digest only to validated users"),
 help_text = _("If checked the daily digest won't be sent to users that haven't validated their emails."),
 required=False))
 
+EMAIL_QUEUE_FOLDER = Setting('EMAIL_QUEUE_FOLDER', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'mail_queue'), EMAIL_SET, dict(
+label = _("Outgoing mail queue folder"),
+help_text = _("The filesystem path where outgoing emails wait to be delivered. It must be writable by the web server and by the mail delivery command."),
+required=False))
+
+EMAIL_QUEUE_CONNECTIONS = Setting('EMAIL_QUEUE_CONNECTIONS', 4, EMAIL_SET, dict(
+label = _("Simultaneous SMTP connections"),
+help_text = _("How many connections to your SMTP server are used at the same time to deliver queued emails."),
+required=False))
+
+EMAIL_QUEUE_MAX_ATTEMPTS = Setting('EMAIL_QUEUE_MAX_ATTEMPTS', 5, EMAIL_SET, dict(
+label = _("Delivery attempts"),
+help_text = _("How many times delivering an email is attempted before giving up on it."),
+required=False))
+
+EMAIL_QUEUE_RETRY_SECONDS = Setting('EMAIL_QUEUE_RETRY_SECONDS', 60, EMAIL_SET, dict(
+label = _("Delivery retry delay"),
+help_text = _("Seconds to wait before the first retry of an email that couldn't be delivered. The delay doubles after each failed attempt."),
+required=False))
+
 EMAIL_DIGEST_FLAG = Setting('EMAIL_DIGEST_FLAG', None)
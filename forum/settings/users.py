@@ -116,3 +116,11 @@ widget=RadioSelect,
 choices=GRAVATAR_DEFAULT_CHOICES,
 required=False))
 
+
+ONLINE_USERS_MINUTES = Setting('ONLINE_USERS_MINUTES', 15, USERS_SET, dict(
+label = _("Online users window"),
+help_text = _("Users who requested a page in the last this many minutes are listed as online.")))
+
+ONLINE_USERS_BUCKET_SECONDS = Setting('ONLINE_USERS_BUCKET_SECONDS', 60, USERS_SET, dict(
+label = _("Online users precision"),
+help_text = _("The last seen time of online users is recorded at most once every this many seconds.")))
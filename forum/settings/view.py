@@ -24,6 +24,18 @@ label = _("Question summary on questions list?"),
 help_text = _("Choose whether to show the question summary on questions list"),
 required=False))
 
+VIEW_COUNT_FLUSH_SECONDS = Setting('VIEW_COUNT_FLUSH_SECONDS', 60, VIEW_SET, dict(
+label = _("View count flush interval"),
+help_text = _("Question views are counted in memory and written to the database at most this many seconds apart.")))
+
+VIEW_COUNT_FLUSH_VIEWS = Setting('VIEW_COUNT_FLUSH_VIEWS', 100, VIEW_SET, dict(
+label = _("View count flush size"),
+help_text = _("The number of buffered question views that forces a write to the database.")))
+
+QUESTION_RANKINGS_REFRESH_SECONDS = Setting('QUESTION_RANKINGS_REFRESH_SECONDS', 300, VIEW_SET, dict(
+label = _("Hottest questions refresh interval"),
+help_text = _("Answers and comments older than a day stop counting toward the hottest questions at most this many seconds late.")))
+
 # Tag settings
 RECENT_TAGS_SIZE = Setting('RECENT_TAGS_SIZE', 25, VIEW_SET, dict(
 label = _("Recent tags block size"),
@@ -8,8 +8,11 @@ get_modules_script('settings')
 get_modules_script('startup')
 
 
+# Counters before badges, whose hooks read them
+import forum.counters
 import forum.badges
 import forum.subscriptions
+import forum.rankings
 import forum.registry
 get_modules_script('registry')
 
@@ -1,3 +1,5 @@
+import re
+
 from django import template
 from forum import settings
 from forum.utils.mail import create_and_send_mail_messages
@@ -6,12 +8,26 @@ import logging
 
 register = template.Library()
 
+SLOT_MARK = u'\x00recipientslot:%d\x00'
+SLOT_RE = re.compile(u'\x00recipientslot:(\\d+)\x00')
+
+EMAIL_PARTS = ('subject', 'htmlcontent', 'textcontent')
+
+def fill_slots(bits, filled):
+    # SLOT_RE.split leaves the slot numbers at the odd positions
+    text = list(bits)
+
+    for i in range(1, len(text), 2):
+        text[i] = filled[int(text[i])]
+
+    return u''.join(text).strip()
+
 class MultiUserMailMessage(template.Node):
-    def __init__(self, nodelist):
+    def __init__(self, nodelist, render_once=False):
         self.nodelist = nodelist
+        self.render_once = render_once
 
-    def render(self, context):
-        recipients = context['recipients']
+    def render_each(self, context, recipients):
         messages = list()
 
         for recipient in recipients:
@@ -19,14 +35,89 @@ class MultiUserMailMessage(template.Node):
             context['recipient'] = recipient
             self.nodelist.render(context)
             messages.append((recipient, context['subject'], context['htmlcontent'], context['textcontent'], context['embeddedmedia']))
-        
-        create_and_send_mail_messages(messages, sender_data=context['sender'], reply_to=context['reply_to'])
+
+        return messages
+
+    def render_shared(self, context, recipients):
+        """
+        Renders the message once without a recipient, leaving a mark where each recipientslot goes, and then
+        only renders the slots for every recipient.
+        """
+        messages = list()
+        slots = list()
+
+        context.push()
+        context['recipientslots'] = slots
+        context['embeddedmedia'] = {}
+        self.nodelist.render(context)
+
+        media = context['embeddedmedia']
+        parts = [SLOT_RE.split(context[name]) for name in EMAIL_PARTS]
+
+        for recipient in recipients:
+            context.push()
+            context['recipientslots'] = None
+            context['recipient'] = recipient
+            context['embeddedmedia'] = dict(media)
+
+            filled = [slot.nodelist.render(context) for slot in slots]
+            subject, html, text = [fill_slots(bits, filled) for bits in parts]
+
+            messages.append((recipient, subject, html, text, context['embeddedmedia']))
+            context.pop()
+
+        context.pop()
+        return messages
+
+    def render(self, context):
+        recipients = context['recipients']
+
+        if self.render_once:
+            messages = self.render_shared(context, recipients)
+        else:
+            messages = self.render_each(context, recipients)
+
+        if context.get('outbox', None) is not None:
+            context['outbox'].extend(messages)
+        else:
+            create_and_send_mail_messages(messages, sender_data=context['sender'], reply_to=context['reply_to'])
+
+        return ''
 
 @register.tag
 def email(parser, token):
+    bits = token.split_contents()
+
+    if len(bits) > 2 or (len(bits) == 2 and bits[1] != 'render_once'):
+        raise template.TemplateSyntaxError, "%r tag only accepts the render_once argument" % bits[0]
+
     nodelist = parser.parse(('endemail',))
     parser.delete_first_token()
-    return MultiUserMailMessage(nodelist)
+    return MultiUserMailMessage(nodelist, len(bits) == 2)
+
+
+class RecipientSlotNode(template.Node):
+    """
+    The part of a render_once email that depends on the recipient. It is rendered for every recipient with the
+    context left by the shared rendering, so it can't use the variables of an enclosing for loop.
+    """
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        slots = context.get('recipientslots', None)
+
+        if slots is None:
+            return self.nodelist.render(context)
+
+        slots.append(self)
+        return SLOT_MARK % (len(slots) - 1)
+
+@register.tag
+def recipientslot(parser, token):
+    nodelist = parser.parse(('endrecipientslot',))
+    parser.delete_first_token()
+    return RecipientSlotNode(nodelist)
 
 
 
@@ -6,6 +6,7 @@ import math
 import re
 import logging
 import random
+import types
 from django import template
 from django.utils.encoding import smart_unicode, force_unicode, smart_str
 from django.utils.safestring import mark_safe
@@ -293,36 +294,92 @@ def do_var(parser, token):
 
     raise template.TemplateSyntaxError("Invalid number of arguments")
 
+DECLARE_GLOBALS = {
+    '_': _,
+    'os': os,
+    'html': html,
+    'reverse': reverse,
+    'settings': settings,
+    'smart_str': smart_str,
+    'smart_unicode': smart_unicode,
+    'force_unicode': force_unicode,
+}
+
+def code_names(code):
+    """The names code may look up as globals, those of the generator expressions and lambdas inside it included."""
+    names = set(code.co_names)
+
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+
+    return names
+
+def declare_scope(context, names):
+    """
+    The globals of the expressions of a declare block: DECLARE_GLOBALS shadowed by the names of the template context
+    the expressions use. They have to be globals, generator expressions and lambdas don't see the locals of eval.
+    """
+    scope = dict(DECLARE_GLOBALS)
+
+    for name in names:
+        if name in context:
+            scope[name] = context[name]
+
+    return scope
+
 class DeclareNode(template.Node):
     dec_re = re.compile('^\s*(\w+)\s*(:?=)\s*(.*)$')
+    compiled = {}
 
     def __init__(self, block):
         self.block = block
 
-    def render(self, context):
-        source = self.block.render(context)
+        # Blocks without template code can be compiled once, here
+        if all([isinstance(node, template.TextNode) for node in block]):
+            self.declarations = self.compile(block.render(template.Context()))
+        else:
+            self.declarations = None
+
+    @classmethod
+    def compile(cls, source):
+        declarations = []
 
         for line in source.splitlines():
-            m = self.dec_re.search(line)
+            m = cls.dec_re.search(line)
             if m:
-                clist = list(context)
-                clist.reverse()
-                d = {}
-                d['_'] = _
-                d['os'] = os
-                d['html'] = html
-                d['reverse'] = reverse
-                d['settings'] = settings
-                d['smart_str'] = smart_str
-                d['smart_unicode'] = smart_unicode
-                d['force_unicode'] = force_unicode
-                for c in clist:
-                    d.update(c)
-                try:
-                    command = m.group(3).strip()
-                    context[m.group(1).strip()] = eval(command, d)
-                except Exception, e:
-                    logging.error("Error in declare tag, when evaluating: %s" % m.group(3).strip())
+                command = m.group(3).strip()
+                compiled = cls.compiled.get(command, None)
+
+                if compiled is None:
+                    try:
+                        code = compile(command, '<declare>', 'eval')
+                    except SyntaxError:
+                        logging.error("Error in declare tag, when compiling: %s" % command)
+                        continue
+
+                    if len(cls.compiled) > 1000:
+                        cls.compiled.clear()
+
+                    compiled = cls.compiled[command] = (code, code_names(code))
+
+                declarations.append((m.group(1).strip(), command) + compiled)
+
+        return declarations
+
+    def render(self, context):
+        declarations = self.declarations
+
+        if declarations is None:
+            declarations = self.compile(self.block.render(context))
+
+        scope = declarations and declare_scope(context, set([n for d in declarations for n in d[3]]))
+
+        for name, command, code, names in declarations:
+            try:
+                context[name] = scope[name] = eval(code, scope)
+            except Exception, e:
+                logging.error("Error in declare tag, when evaluating: %s" % command)
         return ''
 
 @register.tag(name='declare')
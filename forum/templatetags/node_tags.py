@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta
 import re
 
-from forum.models import Question, Action
+from forum.models import Question, Action, Comment, Vote, User
+from forum.models.user import hydrate_users
 from django.template import Template, Context
 from django.utils.translation import ungettext, ugettext as _
 from django.utils.html import strip_tags
@@ -192,9 +193,54 @@ def post_controls(post, user):
 
     return {'controls': controls, 'menu': menu, 'post': post, 'user': user}
 
-def _comments(post, user):
-    all_comments = post.comments.filter_state(deleted=False)\
-                                .order_by('-added_at' if settings.SHOW_LATEST_COMMENTS_FIRST else 'added_at')
+class ThreadComments(object):
+    """
+    The visible comments of a question (or page) and of all its answers, loaded with one query along with
+    their authors and the viewer's votes on them, so that rendering the comments of every post in the
+    thread doesn't cost a query per post and per comment.
+    """
+    def __init__(self, root_id, user):
+        comments = list(Comment.objects.filter_state(deleted=False).filter(abs_parent=root_id)\
+                                .order_by('-added_at' if settings.SHOW_LATEST_COMMENTS_FIRST else 'added_at'))
+
+        hydrate_users(comments, 'author')
+
+        self.by_parent = {}
+
+        for c in comments:
+            self.by_parent.setdefault(c.parent_id, []).append(c)
+
+        if user.is_authenticated() and comments:
+            self.votes = dict(Vote.objects.filter(user=user, node__in=[c.id for c in comments]).values_list('node', 'value'))
+        else:
+            self.votes = {}
+
+    def for_post(self, post):
+        comments = self.by_parent.get(post.id, [])
+
+        for c in comments:
+            c.parent = post
+
+        return comments
+
+    def likes(self, comment):
+        return self.votes.get(comment.id, None) == 1
+
+    @classmethod
+    def for_context(cls, context, post, user):
+        root_id = post.abs_parent_id or post.id
+        key = (cls, root_id, user.id)
+
+        if not key in context.render_context:
+            context.render_context[key] = cls(root_id, user)
+
+        return context.render_context[key]
+
+def _comments(post, user, thread=None):
+    if thread is None:
+        thread = ThreadComments(post.abs_parent_id or post.id, user)
+
+    all_comments = thread.for_post(post)
 
     if len(all_comments) <= 5:
         top_scorers = all_comments
@@ -216,7 +262,7 @@ def _comments(post, user):
             showing += 1
         
         if context['can_like']:
-            context['likes'] = VoteAction.get_for(user, c) == 1
+            context['likes'] = thread.likes(c)
 
         context['user'] = c.user
         context['comment'] = c.comment
@@ -249,9 +295,9 @@ def _comments(post, user):
         'user': user,
     }
 
-@register.inclusion_tag('node/comments.html')
-def comments(post, user):
-    return _comments(post, user)
+@register.inclusion_tag('node/comments.html', takes_context=True)
+def comments(context, post, user):
+    return _comments(post, user, ThreadComments.for_context(context, post, user))
 
 @register.inclusion_tag("node/contributors_info.html", takes_context=True)
 def contributors_info(context, node, verb=None):
@@ -0,0 +1,286 @@
+import re
+import heapq
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from threading import Lock
+
+from django.core.cache import cache
+from django.utils.encoding import smart_unicode
+
+from forum import settings
+
+# Results kept for every prefix looked up, larger limits are clipped to it
+MAX_RESULTS = 100
+
+# Prefixes whose results are remembered before starting over
+MAX_REMEMBERED = 10000
+
+# Prefixes up to this length, or matching more than HEAVY_PREFIX names, are too costly to rank on every lookup, their
+# results are kept up to date instead
+SHORT_PREFIX = 2
+HEAVY_PREFIX = 500
+
+# Characters that start a new word inside a name, every word is a prefix entry point
+WORD_SEPARATORS = re.compile(r'[-_.+#\s]+', re.UNICODE)
+
+def normalize(name):
+    return smart_unicode(name).strip().lower()
+
+def _keys(name):
+    name = normalize(name)
+    return set([name] + [name[m.end():] for m in WORD_SEPARATORS.finditer(name) if m.end() < len(name)])
+
+class PrefixIndex(object):
+    """
+    Names ranked by a weight, such as tag usage or user reputation, held in process memory in a sorted array of
+    normalized keys so that prefix lookups are a binary search. Every word of a name is a key, so "admin" finds
+    "django-admin". The top MAX_RESULTS matches of every prefix of up to SHORT_PREFIX characters are ranked at load
+    time, those of other prefixes when first looked up. Prefixes matching many names are then kept ranked as names
+    change, the rest are remembered until a name matching them changes.
+
+    The index is loaded from the database on first use. Changes are applied to the local copy and published in the
+    cache as a numbered log, which other processes replay at most every SYNC_SECONDS. A process that can't replay
+    the log, because entries expired or too many piled up, reloads the whole index.
+    """
+    SYNC_SECONDS = 5
+    MAX_REPLAY = 1000
+    LOG_TIMEOUT = 60 * 60
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.lock = Lock()
+
+        self.keys = None
+        self.entries = {}
+        self.ranked = {}
+        self.top = {}
+        self.generation = None
+        self.checked = None
+
+        self.loads = 0
+
+    def _generation_key(self):
+        return '%s:autocomplete:%s' % (settings.APP_URL, self.name)
+
+    def _log_key(self, generation):
+        return '%s:autocomplete:%s:%s' % (settings.APP_URL, self.name, generation)
+
+    def _current_generation(self):
+        generation = cache.get(self._generation_key())
+
+        if generation is None:
+            # Start from the clock, so that a generation lost from the cache is never reused
+            delta = datetime.now() - datetime(1970, 1, 1)
+            cache.add(self._generation_key(), (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+            generation = cache.get(self._generation_key())
+
+        return generation
+
+    def load(self, rows=None):
+        """Rebuilds the index from rows of (id, name, weight), read with the loader when not given."""
+        generation = self._current_generation()
+        entries = {}
+        keys = []
+
+        if rows is None:
+            rows = self.loader()
+
+        for id, name, weight in rows:
+            entry_keys = _keys(name)
+            entries[id] = (smart_unicode(name), weight, entry_keys, normalize(name))
+            keys.extend([(key, id) for key in entry_keys])
+
+        keys.sort()
+        ranked = {}
+
+        for id in sorted(entries.keys(), key=lambda id: self._rank(entries[id])):
+            for prefix in self._prefixes(entries[id], SHORT_PREFIX):
+                top = ranked.setdefault(prefix, [])
+
+                if len(top) < MAX_RESULTS and not (top and top[-1] == id):
+                    top.append(id)
+
+        with self.lock:
+            self.keys, self.entries, self.ranked, self.top = keys, entries, ranked, {}
+            self.generation, self.checked = generation, datetime.now()
+            self.loads += 1
+
+    def _rank(self, entry):
+        return (-entry[1], entry[3])
+
+    def _prefixes(self, entry, longest=None):
+        prefixes = set()
+
+        for key in entry[2]:
+            for end in range(1, min(len(key), longest or len(key)) + 1):
+                prefixes.add((key[:end], False))
+
+                if key == entry[3]:
+                    prefixes.add((key[:end], True))
+
+        return prefixes
+
+    def _forget_prefixes(self, entry):
+        for key in entry[2]:
+            for end in range(1, len(key) + 1):
+                self.top.pop((key[:end], False), None)
+                self.top.pop((key[:end], True), None)
+
+    def _rerank(self, id, old, new):
+        prefixes = set()
+
+        for entry in (old, new):
+            if entry is not None:
+                prefixes |= self._prefixes(entry)
+
+        new_prefixes = new is not None and self._prefixes(new) or set()
+
+        for prefix in prefixes:
+            top = self.ranked.get(prefix, None)
+
+            if top is None:
+                continue
+
+            was_full = len(top) >= MAX_RESULTS
+
+            if id in top:
+                top.remove(id)
+
+            if prefix in new_prefixes:
+                rank = self._rank(new)
+                position = 0
+
+                while position < len(top) and self._rank(self.entries[top[position]]) < rank:
+                    position += 1
+
+                # Past the end of a full list some name not in it may rank higher
+                if position < len(top) or not was_full:
+                    top.insert(position, id)
+                    del top[MAX_RESULTS:]
+
+            if was_full and len(top) < MAX_RESULTS:
+                # A name past the list may belong in it now, rank the prefix again when looked up
+                del self.ranked[prefix]
+
+    def _apply(self, id, name, weight):
+        old = self.entries.pop(id, None)
+        new = None
+
+        if old is not None:
+            for key in old[2]:
+                i = bisect_left(self.keys, (key, id))
+
+                if i < len(self.keys) and self.keys[i] == (key, id):
+                    del self.keys[i]
+
+            self._forget_prefixes(old)
+
+        if weight is not None:
+            new = (smart_unicode(name), weight, _keys(name), normalize(name))
+            self.entries[id] = new
+
+            for key in new[2]:
+                insort(self.keys, (key, id))
+
+            self._forget_prefixes(new)
+
+        if old or new:
+            self._rerank(id, old, new)
+
+    def _sync(self):
+        now = datetime.now()
+
+        if self.keys is not None and self.checked + timedelta(seconds=self.SYNC_SECONDS) > now:
+            return
+
+        if self.keys is None:
+            return self.load()
+
+        current = cache.get(self._generation_key())
+        self.checked = now
+
+        if current == self.generation:
+            return
+
+        if (current is None) or (self.generation is None) or not (0 < current - self.generation <= self.MAX_REPLAY):
+            return self.load()
+
+        log_keys = [self._log_key(generation) for generation in range(self.generation + 1, current + 1)]
+        changes = cache.get_many(log_keys)
+
+        if len(changes) != len(log_keys):
+            return self.load()
+
+        with self.lock:
+            for log_key in log_keys:
+                self._apply(*changes[log_key])
+
+            self.generation = current
+
+    def update(self, id, name, weight):
+        """Adds, changes or, with a weight of None, removes a name, here and in every other process."""
+        with self.lock:
+            if self.keys is not None:
+                self._apply(id, name, weight)
+
+        self._current_generation()
+
+        try:
+            generation = cache.incr(self._generation_key())
+        except ValueError:
+            # The generation expired or was evicted, every process will reload
+            return
+
+        cache.set(self._log_key(generation), (id, name, weight), self.LOG_TIMEOUT)
+
+        with self.lock:
+            if self.generation is not None and generation == self.generation + 1:
+                self.generation = generation
+
+    def remove(self, id):
+        self.update(id, None, None)
+
+    def _top(self, prefix, whole_name):
+        top = self.ranked.get((prefix, whole_name), None) or self.top.get((prefix, whole_name), None)
+
+        if top is None:
+            matches = self.keys[bisect_left(self.keys, (prefix,)):bisect_left(self.keys, (prefix + u'\uffff',))]
+            ids = set([id for key, id in matches if (not whole_name) or key == self.entries[id][3]])
+            top = heapq.nsmallest(MAX_RESULTS, ids, key=lambda id: self._rank(self.entries[id]))
+
+            if len(prefix) <= SHORT_PREFIX or len(ids) > HEAVY_PREFIX:
+                self.ranked[(prefix, whole_name)] = top
+            else:
+                if len(self.top) >= MAX_REMEMBERED:
+                    self.top = {}
+
+                self.top[(prefix, whole_name)] = top
+
+        return top
+
+    def search(self, prefix, limit=10, whole_name=False):
+        """
+        Returns up to limit (id, name, weight) tuples for the names with a word starting with prefix, the highest
+        weights first. With whole_name only names that start with prefix match.
+        """
+        prefix = normalize(prefix)
+
+        if not prefix:
+            return []
+
+        self._sync()
+
+        with self.lock:
+            return [(id,) + self.entries[id][:2] for id in self._top(prefix, whole_name)[:max(min(limit, MAX_RESULTS), 0)]]
+
+def _load_tags():
+    from forum.models import Tag
+    return Tag.active.order_by().values_list('id', 'name', 'used_count')
+
+def _load_users():
+    from forum.models import User
+    return User.objects.order_by().values_list('id', 'username', 'reputation')
+
+tag_index = PrefixIndex('tags', _load_tags)
+user_index = PrefixIndex('users', _load_users)
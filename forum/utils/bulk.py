@@ -0,0 +1,138 @@
+from django.db import connection
+from django.db.models import Max
+
+# Parameters bound to a single statement, sqlite doesn't take more than 999
+MAX_PARAMETERS = 999
+
+class BulkInsert(object):
+    """Rows of a table kept in memory until size of them are waiting, then written with multi-row INSERTs."""
+    def __init__(self, table, columns, size):
+        self.table = table
+        self.columns = columns
+        self.size = size
+        self.rows = []
+        self.written = 0
+
+    def add(self, values):
+        self.rows.append(values)
+
+        if len(self.rows) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        per_statement = max(MAX_PARAMETERS / len(self.columns), 1)
+
+        for start in range(0, len(self.rows), per_statement):
+            rows = self.rows[start:start + per_statement]
+            placeholders = "(%s)" % ", ".join(["%s"] * len(self.columns))
+
+            cursor.execute("INSERT INTO %s (%s) VALUES %s" % (
+                qn(self.table), ", ".join([qn(c) for c in self.columns]), ", ".join([placeholders] * len(rows))
+            ), [v for row in rows for v in row])
+
+        self.written += len(self.rows)
+        self.rows = []
+
+def _table_models(model):
+    models = []
+
+    for parent in model._meta.parents:
+        models.extend(_table_models(parent))
+
+    return models + [model]
+
+class ModelInsert(object):
+    """
+    Instances of a model written with a BulkInsert for each of its tables, parents first. Ids are given out here,
+    past the highest one in the table, so that rows can point to each other before any of them is written.
+    """
+    def __init__(self, model, size):
+        self.models = _table_models(model)
+        self.inserts = [(m._meta.local_fields, BulkInsert(m._meta.db_table, [f.column for f in m._meta.local_fields], size))
+                        for m in self.models]
+
+        root = self.models[0]._meta.pk
+        self.next_id = (self.models[0]._default_manager.aggregate(top=Max(root.attname))['top'] or 0) + 1
+
+    def reserve(self, obj):
+        id = getattr(obj, self.models[0]._meta.pk.attname)
+
+        if id is None:
+            id = self.next_id
+        else:
+            id = int(id)
+
+        self.next_id = max(self.next_id, id + 1)
+
+        for m in self.models:
+            setattr(obj, m._meta.pk.attname, id)
+
+    def add(self, obj):
+        self.reserve(obj)
+
+        for fields, insert in self.inserts:
+            insert.add([f.get_db_prep_save(f.pre_save(obj, True), connection=connection) for f in fields])
+
+    def flush(self):
+        for fields, insert in self.inserts:
+            insert.flush()
+
+class RowWriter(object):
+    """Saves every object as soon as it is given, the way a single row is saved anywhere else."""
+    def reserve(self, obj):
+        obj.save()
+
+    def save(self, obj):
+        obj.save()
+
+    def relate(self, obj, name, related):
+        setattr(obj, name, related)
+
+    def flush(self):
+        pass
+
+class BulkWriter(object):
+    """
+    Buffers new objects per model and writes them size at a time. Objects being updated must be saved directly,
+    everything given here is inserted. Nothing is readable from the database until flush, so the rows being
+    imported are looked up in memory.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.models = {}
+        self.relations = {}
+
+    def _insert(self, model):
+        insert = self.models.get(model, None)
+
+        if insert is None:
+            insert = self.models[model] = ModelInsert(model, self.size)
+
+        return insert
+
+    def reserve(self, obj):
+        if obj.pk is None:
+            self._insert(obj.__class__).reserve(obj)
+
+    def save(self, obj):
+        self._insert(obj.__class__).add(obj)
+
+    def relate(self, obj, name, related):
+        field = obj.__class__._meta.get_field(name)
+        insert = self.relations.get(field, None)
+
+        if insert is None:
+            insert = self.relations[field] = BulkInsert(field.m2m_db_table(),
+                                                        [field.m2m_column_name(), field.m2m_reverse_name()], self.size)
+
+        for r in related:
+            insert.add([obj.pk, r.pk])
+
+    def flush(self):
+        for insert in self.models.values() + self.relations.values():
+            insert.flush()
@@ -0,0 +1,104 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from forum.models import Node, Action, ActivityCount
+from forum.utils.bulk import BulkInsert
+
+class ActivityCounter(object):
+    """
+    A count of rows of model per owner, a user or node id in owner_field, kept in the ActivityCount table so that
+    reading it is a lookup by primary key instead of a COUNT. Action hooks and cancel paths move it with add(). The
+    first time an owner's count is read or moved it is counted from history, which already includes the change that
+    is being made, and rebuild() counts everybody's again.
+    """
+    by_name = {}
+
+    def __init__(self, name, model, owner_field, *filter_args, **filter_kwargs):
+        self.name = name
+        self.model = model
+        self.owner_field = owner_field
+        self.filter = (filter_args, filter_kwargs)
+
+        ActivityCounter.by_name[name] = self
+
+    def history(self, owner_ids=None):
+        """Counts the rows of model, for owner_ids or everybody, and returns a dict of owner id to count."""
+        rows = self.model._default_manager.filter(*self.filter[0], **self.filter[1])
+
+        if owner_ids is not None:
+            rows = rows.filter(**{'%s__in' % self.owner_field: owner_ids})
+
+        key = self.owner_field
+
+        return dict([(row[key], row['count']) for row in
+                     rows.order_by().values(key).annotate(count=Count('id'))])
+
+    def _rows(self, owner_id):
+        return ActivityCount.objects.filter(name=self.name, owner=owner_id)
+
+    def _create(self, owner_id):
+        value = self.history([owner_id]).get(owner_id, 0)
+
+        # The way get_or_create recovers, a failed INSERT must not abort the transaction of a request
+        sid = transaction.savepoint()
+
+        try:
+            ActivityCount.objects.create(name=self.name, owner=owner_id, value=value)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            # Counted by someone else in the meantime
+            transaction.savepoint_rollback(sid)
+            return self._rows(owner_id).values_list('value', flat=True)[0]
+
+        return value
+
+    def get(self, owner_id):
+        if not owner_id:
+            return 0
+
+        values = list(self._rows(owner_id).values_list('value', flat=True))
+
+        if values:
+            return values[0]
+
+        return self._create(owner_id)
+
+    def add(self, owner_id, value=1):
+        if not owner_id:
+            return
+
+        if not self._rows(owner_id).update(value=F('value') + value):
+            self._create(owner_id)
+
+    def rebuild(self):
+        ActivityCount.objects.filter(name=self.name).delete()
+
+        insert = BulkInsert(ActivityCount._meta.db_table, ['name', 'owner', 'value'], 500)
+
+        for owner_id, value in self.history().items():
+            if owner_id:
+                insert.add([self.name, owner_id, value])
+
+        insert.flush()
+        return insert.written
+
+def action_count(action_cls):
+    """The counter of the actions of action_cls each user did, canceled ones included."""
+    name = 'actions:%s' % action_cls.get_type()
+
+    if not name in ActivityCounter.by_name:
+        counter = ActivityCounter(name, Action, 'user', action_type=action_cls.get_type())
+
+        def count_action(action, new):
+            if action.action_type == action_cls.get_type():
+                counter.add(action.user_id)
+
+        action_cls.hook(count_action)
+
+    return ActivityCounter.by_name[name]
+
+# Comments of each user that aren't deleted
+comments = ActivityCounter('comments', Node, 'author', ~Q(state_string__contains="(deleted)"), node_type="comment")
+
+# Users that have each node as favorite
+favorites = ActivityCounter('favorites', Action, 'node', action_type="favorite", canceled=False)
@@ -0,0 +1,202 @@
+import atexit
+import logging
+import traceback
+from datetime import datetime
+from threading import Thread, Lock
+from Queue import Queue, Full
+
+from forum import settings
+from forum.utils.progress import total_seconds
+
+def hook_name(hook):
+    return '%s.%s' % (hook.__module__, hook.__name__)
+
+class HookStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self):
+        return dict(calls=self.calls, failures=self.failures, max_seconds=self.max_seconds,
+                    avg_seconds=self.calls and self.seconds / self.calls or 0.0)
+
+class HookDispatcher(object):
+    """
+    Runs the action hooks out of the request in a fixed pool of ACTION_HOOK_WORKERS threads fed by a queue of at
+    most ACTION_HOOK_QUEUE_SIZE actions. When the queue is full the action that can't be queued has its hooks run by
+    the thread that saved it, which slows down whoever is producing actions faster than the workers can keep up.
+
+    Hooks registered with coalesce=True only care about the latest state of the node, so while one of them is waiting
+    for a node, later actions on that node replace the waiting one instead of queueing another call.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.queue = None
+        self.workers = []
+        self.accepting = True
+
+        # (hook, node id) -> (action, new) of the coalesced calls waiting in the queue
+        self.coalesced = {}
+
+        self.stats = {}
+        self.inline = 0
+        self.merged = 0
+
+    def _start(self):
+        with self.lock:
+            if self.queue is None:
+                self.queue = Queue(max(int(settings.ACTION_HOOK_QUEUE_SIZE), 1))
+
+            self.workers = [w for w in self.workers if w.isAlive()]
+            started = [HookWorker(self) for i in range(max(int(settings.ACTION_HOOK_WORKERS) - len(self.workers), 0))]
+            self.workers += started
+
+        for worker in started:
+            worker.setDaemon(True)
+            worker.start()
+
+    def _put(self, item):
+        try:
+            self.queue.put(item, True, 1)
+        except Full:
+            with self.lock:
+                self.inline += 1
+
+            self.process(item)
+
+    def submit(self, action, hooks, coalesced, new):
+        """Queues the hooks, a list of functions, to be called with the action. Those in coalesced are merged per node."""
+        if not self.accepting:
+            return self.call(action, hooks, new)
+
+        if len(self.workers) < int(settings.ACTION_HOOK_WORKERS) or self.queue is None:
+            self._start()
+
+        immediate = []
+
+        for hook in hooks:
+            if (hook in coalesced) and action.node_id:
+                key = (hook, action.node_id)
+
+                with self.lock:
+                    waiting = key in self.coalesced
+                    self.coalesced[key] = (action, new)
+
+                if waiting:
+                    with self.lock:
+                        self.merged += 1
+                else:
+                    self._put(('coalesced', key))
+            else:
+                immediate.append(hook)
+
+        if immediate:
+            self._put(('action', (action, immediate, new)))
+
+    def process(self, item):
+        kind, payload = item
+
+        if kind == 'coalesced':
+            with self.lock:
+                action, new = self.coalesced.pop(payload)
+
+            self.call(action, [payload[0]], new)
+        else:
+            self.call(*payload)
+
+    def call(self, action, hooks, new):
+        for hook in hooks:
+            started = datetime.now()
+            failed = False
+
+            try:
+                hook(action=action, new=new)
+            except Exception, e:
+                failed = True
+                logging.error("Error in %s hook: %s" % (hook_name(hook), str(e)))
+                logging.error(traceback.format_exc())
+
+            elapsed = total_seconds(datetime.now() - started)
+
+            with self.lock:
+                stats = self.stats.setdefault(hook_name(hook), HookStats())
+                stats.calls += 1
+                stats.failures += failed and 1 or 0
+                stats.seconds += elapsed
+                stats.max_seconds = max(stats.max_seconds, elapsed)
+
+    def depth(self):
+        return self.queue is not None and self.queue.qsize() or 0
+
+    def metrics(self):
+        with self.lock:
+            return dict(depth=self.depth(), workers=len([w for w in self.workers if w.isAlive()]),
+                        inline=self.inline, merged=self.merged,
+                        hooks=dict([(name, s.as_dict()) for name, s in self.stats.items()]))
+
+    def drain(self, timeout=None):
+        """
+        Stops queueing, waits up to timeout seconds for the workers to run what is already queued and returns how
+        many queued actions were left undone. Actions saved after this run their hooks inline.
+        """
+        self.accepting = False
+
+        if self.queue is None:
+            return 0
+
+        if timeout is None:
+            timeout = int(settings.ACTION_HOOK_DRAIN_SECONDS)
+
+        started = datetime.now()
+
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = timeout - total_seconds(datetime.now() - started)
+
+                if remaining <= 0:
+                    break
+
+                self.queue.all_tasks_done.wait(remaining)
+
+            return self.queue.unfinished_tasks
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
+            self.inline = self.merged = 0
+
+class HookWorker(Thread):
+    def __init__(self, dispatcher):
+        super(HookWorker, self).__init__()
+        self.dispatcher = dispatcher
+
+    def run(self):
+        from django.db import connection
+
+        queue = self.dispatcher.queue
+
+        while True:
+            item = queue.get()
+
+            try:
+                self.dispatcher.process(item)
+            except Exception, e:
+                logging.error("Error dispatching action hooks: %s" % str(e))
+            finally:
+                queue.task_done()
+
+            if not queue.qsize():
+                # Don't keep a connection open while the worker waits for work
+                connection.close()
+
+hook_dispatcher = HookDispatcher()
+
+def _drain_at_exit():
+    left = hook_dispatcher.drain()
+
+    if left:
+        logging.error("Exiting with the hooks of %d actions not run" % left)
+
+atexit.register(_drain_at_exit)
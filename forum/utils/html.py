@@ -1,12 +1,16 @@
 """Utilities for working with HTML."""
 #import html5lib
 from html5lib import sanitizer, serializer, tokenizer, treebuilders, treewalkers, HTMLParser
+from html5lib.constants import tokenTypes, voidElements, headingElements, scopingElements, specialElements
 from urllib import quote_plus
 from django.utils.html import strip_tags
 from forum.utils.html2text import HTML2Text
 from django.utils.safestring import mark_safe
 from forum import settings
 
+# Bump whenever the sanitizer whitelist or output changes, so that cached renders are discarded.
+SANITIZER_VERSION = 1
+
 class HTMLSanitizerMixin(sanitizer.HTMLSanitizerMixin):
     acceptable_elements = ('a', 'abbr', 'acronym', 'address', 'b', 'big',
         'blockquote', 'br', 'caption', 'center', 'cite', 'code', 'col',
@@ -38,13 +42,92 @@ class HTMLSanitizer(tokenizer.HTMLTokenizer, HTMLSanitizerMixin):
             if token:
                 yield token
 
-def sanitize_html(html):
-    """Sanitizes an HTML fragment."""
+# Elements whose start tag makes the parser rearrange the tree, or that it only accepts inside a table.
+_TABLE_ELEMENTS = frozenset(('caption', 'col', 'colgroup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr'))
+_CLOSES_P = frozenset(('address', 'blockquote', 'center', 'dd', 'dir', 'div', 'dl', 'dt', 'h1', 'h2', 'h3', 'h4',
+                       'h5', 'h6', 'hr', 'li', 'ol', 'p', 'pre', 'ul'))
+_LIST_ITEM_STOPS = {'li': ('li',), 'dd': ('dd', 'dt'), 'dt': ('dd', 'dt')}
+_LIST_ITEM_SCOPE = frozenset([name for namespace, name in scopingElements | specialElements]) - frozenset(('address', 'div', 'p'))
+
+def _opens_cleanly(name, open_elements):
+    """True if the parser would simply push a start tag named ``name`` on top of ``open_elements``."""
+    if name in _TABLE_ELEMENTS:
+        return False
+
+    if name in _CLOSES_P and 'p' in open_elements:
+        return False
+
+    if name in headingElements and open_elements and open_elements[-1] in headingElements:
+        return False
+
+    if name == 'a' and 'a' in open_elements:
+        return False
+
+    if name in _LIST_ITEM_STOPS:
+        for element in reversed(open_elements):
+            if element in _LIST_ITEM_STOPS[name]:
+                return False
+            if element in _LIST_ITEM_SCOPE:
+                break
+
+    return True
+
+def _stream_sanitized(html):
+    """
+    Turns the sanitized token stream straight into serializer tokens, without building a DOM.
+
+    This only works when the tags in the fragment are balanced, which is what markdown produces. Whenever the parser
+    would have to recover from the markup (stray or misnested end tags, implied end tags, tables, the newline it drops
+    after <pre>), None is returned and the caller must go through the full parser to get the same output.
+    """
+    tokens = []
+    open_elements = []
+    after_pre = False
+
+    for token in HTMLSanitizer(html):
+        type = token["type"]
+
+        if type in (tokenTypes["Characters"], tokenTypes["SpaceCharacters"]):
+            if after_pre and token["data"].startswith("\n"):
+                return None
+            tokens.append({"type": "Characters", "data": token["data"]})
+        elif type in (tokenTypes["StartTag"], tokenTypes["EmptyTag"]):
+            name = token["name"]
+            if not _opens_cleanly(name, open_elements):
+                return None
+
+            if name in voidElements:
+                tokens.append({"type": "EmptyTag", "name": name, "data": dict(token["data"][::-1])})
+            else:
+                open_elements.append(name)
+                tokens.append({"type": "StartTag", "name": name, "data": dict(token["data"][::-1])})
+        elif type == tokenTypes["EndTag"]:
+            if not open_elements or open_elements[-1] != token["name"]:
+                return None
+            tokens.append({"type": "EndTag", "name": open_elements.pop(), "data": []})
+        else:
+            # Parse errors and doctypes leave the fragment untouched.
+            continue
+
+        after_pre = type == tokenTypes["StartTag"] and token["name"] == 'pre'
+
+    while open_elements:
+        tokens.append({"type": "EndTag", "name": open_elements.pop(), "data": []})
+
+    return tokens
+
+def _parse_sanitized(html):
     p = HTMLParser(tokenizer=HTMLSanitizer,
                             tree=treebuilders.getTreeBuilder("dom"))
     dom_tree = p.parseFragment(html)
     walker = treewalkers.getTreeWalker("dom")
-    stream = walker(dom_tree)
+    return walker(dom_tree)
+
+def sanitize_html(html):
+    """Sanitizes an HTML fragment."""
+    stream = _stream_sanitized(html)
+    if stream is None:
+        stream = _parse_sanitized(html)
     s = serializer.HTMLSerializer(omit_optional_tags=False,
                                   quote_attr_values=True)
     output_generator = s.serialize(stream)
@@ -22,6 +22,7 @@ from django.template import loader, Context, Template
 from forum.utils.html import sanitize_html
 from forum.context import application_settings
 from forum.utils.html2text import HTML2Text
+from forum.utils.mailqueue import mail_queue
 from threading import Thread
 
 def send_template_email(recipients, template, context, sender=None, reply_to = None):
@@ -29,6 +30,19 @@ def send_template_email(recipients, template, context, sender=None, reply_to = N
     context.update(dict(recipients=recipients, settings=settings, sender=sender, reply_to=reply_to))
     t.render(Context(context))
 
+def render_template_email(recipients, template, context):
+    """
+    Renders the messages send_template_email would send and returns them as (recipient, subject, html, text, media)
+    tuples instead of sending them.
+    """
+    if not hasattr(template, 'render'):
+        template = loader.get_template(template)
+
+    outbox = []
+    context.update(dict(recipients=recipients, settings=settings, sender=None, reply_to=None, outbox=outbox))
+    template.render(Context(context))
+    return outbox
+
 def create_connection():
     connection = SMTP(str(settings.EMAIL_HOST), str(settings.EMAIL_PORT),
                           local_hostname=DNS_NAME.get_fqdn())
@@ -44,7 +58,40 @@ def create_connection():
     return connection
 
 
+def create_mail_message(sender, reply_to, recipient, subject, html, text, media):
+    msgRoot = MIMEMultipart('related')
+
+    msgRoot['Subject'] = Header(subject, 'utf-8')
+    msgRoot['From'] = sender
+
+    to = Header(u"%s <%s>" % (recipient.username, recipient.email), 'utf-8')
+    msgRoot['To'] = to
+
+    if reply_to:
+        msgRoot['Reply-To'] = reply_to
+
+    msgRoot.preamble = 'This is a multi-part message from %s.' % unicode(settings.APP_SHORT_NAME).encode('utf8')
+
+    msgAlternative = MIMEMultipart('alternative')
+    msgRoot.attach(msgAlternative)
+
+    msgAlternative.attach(MIMEText(text.encode('utf-8'), _charset='utf-8'))
+    msgAlternative.attach(MIMEText(html.encode('utf-8'), 'html', _charset='utf-8'))
+
+    for alias, location in media.items():
+        fp = open(location, 'rb')
+        msgImage = MIMEImage(fp.read())
+        fp.close()
+        msgImage.add_header('Content-ID', '<'+alias+'>')
+        msgRoot.attach(msgImage)
+
+    return msgRoot.as_string()
+
 def create_and_send_mail_messages(messages, sender_data=None, reply_to=None):
+    """
+    Builds the messages and leaves them in the outgoing mail queue, the delivery itself happens in the queue
+    workers so the caller doesn't wait on the SMTP server.
+    """
     if not settings.EMAIL_HOST:
         return
 
@@ -63,60 +110,18 @@ def create_and_send_mail_messages(messages, sender_data=None, reply_to=None):
     else:
         reply_to = unicode(reply_to)
 
-    try:
-        connection = None
+    queued = 0
 
-        if sender is None:
-            sender = str(settings.DEFAULT_FROM_EMAIL)
-
-        for recipient, subject, html, text, media in messages:
-            if connection is None:
-                connection = create_connection()
-
-            msgRoot = MIMEMultipart('related')
-
-            msgRoot['Subject'] = Header(subject, 'utf-8')
-            msgRoot['From'] = sender
-
-            to = Header(u"%s <%s>" % (recipient.username, recipient.email), 'utf-8')
-            msgRoot['To'] = to
-
-            if reply_to:
-                msgRoot['Reply-To'] = reply_to
-
-            msgRoot.preamble = 'This is a multi-part message from %s.' % unicode(settings.APP_SHORT_NAME).encode('utf8')
-
-            msgAlternative = MIMEMultipart('alternative')
-            msgRoot.attach(msgAlternative)
-
-            msgAlternative.attach(MIMEText(text.encode('utf-8'), _charset='utf-8'))
-            msgAlternative.attach(MIMEText(html.encode('utf-8'), 'html', _charset='utf-8'))
-
-            for alias, location in media.items():
-                fp = open(location, 'rb')
-                msgImage = MIMEImage(fp.read())
-                fp.close()
-                msgImage.add_header('Content-ID', '<'+alias+'>')
-                msgRoot.attach(msgImage)
-
-            try:
-                connection.sendmail(sender, [recipient.email], msgRoot.as_string())
-            except SMTPRecipientsRefused, e:
-                logging.error("Email address not accepted.  Exception: %s" % e)
-            except Exception, e:
-                logging.error("Couldn't send mail using the sendmail method: %s" % e)
-                try:
-                    connection.quit()
-                except Exception, e:
-                    logging.error(e)
-                finally:
-                    connection = None
+    for recipient, subject, html, text, media in messages:
+        try:
+            mail_queue.enqueue(sender, recipient.email, create_mail_message(
+                sender, reply_to, recipient, subject, html, text, media))
+            queued += 1
+        except Exception, e:
+            logging.error("Couldn't queue mail for %s: %s" % (recipient.email, e))
 
+    if queued:
         try:
-            connection.quit()
-        except AttributeError:
-            pass
-        except socket.sslerror:
-            connection.close()
-    except Exception, e:
-        logging.error('Email sending has failed: %s' % e)
+            mail_queue.start()
+        except Exception, e:
+            logging.error('Email sending has failed: %s' % e)
@@ -0,0 +1,246 @@
+import os
+import logging
+import cPickle as pickle
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from uuid import uuid4
+
+from smtplib import SMTPRecipientsRefused
+
+from forum import settings
+
+EPOCH = datetime(1970, 1, 1)
+
+QUEUED, SENDING, SENT, FAILED = 'queued', 'sending', 'sent', 'failed'
+
+def _microseconds(time):
+    delta = time - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+class MailQueue(object):
+    """
+    Outgoing mail spooled in EMAIL_QUEUE_FOLDER, one file per recipient, so that nothing is lost when the process
+    that rendered it exits.
+
+    A message file lives in new/ until a worker claims it by renaming it into sending/. Delivered messages are
+    removed, messages that failed EMAIL_QUEUE_MAX_ATTEMPTS times, or whose recipient was refused, end up in
+    failed/. File names start with the time the message is due, so listing new/ gives the delivery order and retries
+    can be pushed back in time.
+    """
+    def __init__(self, folder=None):
+        self._folder = folder
+        self.lock = Lock()
+        self.workers = []
+
+        # Names listed from new/, due last first, shared by the workers so that new/ is listed once per pass
+        self.pending = []
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def folder(self):
+        return self._folder or unicode(settings.EMAIL_QUEUE_FOLDER)
+
+    def _path(self, state, name=''):
+        return os.path.join(self.folder, state, name)
+
+    def _ensure_folders(self):
+        for state in ('tmp', 'new', 'sending', 'failed'):
+            if not os.path.isdir(self._path(state)):
+                os.makedirs(self._path(state))
+
+    def _write(self, state, name, message):
+        tmp = self._path('tmp', '%s.%s' % (name, uuid4().hex))
+        fp = open(tmp, 'wb')
+        try:
+            pickle.dump(message, fp, pickle.HIGHEST_PROTOCOL)
+        finally:
+            fp.close()
+        os.rename(tmp, self._path(state, name))
+
+    def _read(self, path):
+        fp = open(path, 'rb')
+        try:
+            return pickle.load(fp)
+        finally:
+            fp.close()
+
+    def enqueue(self, sender, recipient, data, due=None):
+        """Spools one message for one recipient address and returns its id."""
+        self._ensure_folders()
+
+        id = uuid4().hex
+        self._write('new', '%020d-%s' % (_microseconds(due or datetime.now()), id), dict(
+            id=id, sender=sender, recipient=recipient, data=data, attempts=0, error=None))
+
+        return id
+
+    def status(self, id):
+        for state, folder in ((QUEUED, 'new'), (SENDING, 'sending'), (FAILED, 'failed')):
+            if os.path.isdir(self._path(folder)) and [n for n in os.listdir(self._path(folder)) if n.endswith(id)]:
+                return state
+
+        return SENT
+
+    def counts(self):
+        return dict([(state, os.path.isdir(self._path(folder)) and len(os.listdir(self._path(folder))) or 0)
+                     for state, folder in ((QUEUED, 'new'), (SENDING, 'sending'), (FAILED, 'failed'))])
+
+    def _next_due(self, now):
+        with self.lock:
+            if not self.pending:
+                self.pending = sorted(os.listdir(self._path('new')), reverse=True)
+
+            if not self.pending or self.pending[-1][:20] > now:
+                # Nothing due, the next claim lists new/ again
+                self.pending = []
+                return None
+
+            return self.pending.pop()
+
+    def claim(self):
+        """Moves the next due message into sending/ and returns its name and content, or None."""
+        if not os.path.isdir(self._path('new')):
+            return None
+
+        now = '%020d' % _microseconds(datetime.now())
+
+        while True:
+            name = self._next_due(now)
+
+            if name is None:
+                return None
+
+            try:
+                os.rename(self._path('new', name), self._path('sending', name))
+                # recover() goes by the time of the claim, the rename keeps the time of the enqueue
+                os.utime(self._path('sending', name), None)
+            except OSError:
+                # Claimed by another worker
+                continue
+
+            return name, self._read(self._path('sending', name))
+
+    def _done(self, name):
+        try:
+            os.remove(self._path('sending', name))
+        except OSError:
+            logging.error("Mail %s was put back in the queue while it was being sent" % name)
+
+    def delivered(self, name):
+        self._done(name)
+
+        with self.lock:
+            self.sent += 1
+
+    def give_up(self, name, message, error):
+        message['error'] = error
+        self._write('failed', name, message)
+        self._done(name)
+
+        with self.lock:
+            self.failed += 1
+
+        logging.error("Giving up sending mail to %s: %s" % (message['recipient'], error))
+
+    def retry(self, name, message, error):
+        message['attempts'] += 1
+        message['error'] = error
+
+        if message['attempts'] >= int(settings.EMAIL_QUEUE_MAX_ATTEMPTS):
+            return self.give_up(name, message, error)
+
+        delay = timedelta(seconds=int(settings.EMAIL_QUEUE_RETRY_SECONDS) * 2 ** (message['attempts'] - 1))
+        self._write('new', '%020d-%s' % (_microseconds(datetime.now() + delay), message['id']), message)
+        self._done(name)
+
+        with self.lock:
+            self.retried += 1
+
+    def recover(self, older_than=timedelta(minutes=10)):
+        """Puts back in the queue the messages left in sending/ by workers that died."""
+        if not os.path.isdir(self._path('sending')):
+            return 0
+
+        limit = _microseconds(datetime.now() - older_than) / 1000000.0
+        recovered = 0
+
+        for name in os.listdir(self._path('sending')):
+            try:
+                if os.path.getmtime(self._path('sending', name)) < limit:
+                    os.rename(self._path('sending', name), self._path('new', name))
+                    recovered += 1
+            except OSError:
+                pass
+
+        return recovered
+
+    def start(self, connections=None, wait=False):
+        """
+        Starts delivering with up to connections workers, each holding its own SMTP connection until the queue has
+        nothing due. Workers already running count towards the limit.
+        """
+        connections = connections or int(settings.EMAIL_QUEUE_CONNECTIONS)
+
+        with self.lock:
+            self.workers = [w for w in self.workers if w.isAlive()]
+            started = [MailQueueWorker(self) for i in range(max(connections - len(self.workers), 0))]
+            self.workers += started
+
+        for worker in started:
+            worker.setDaemon(True)
+            worker.start()
+
+        if wait:
+            for worker in list(self.workers):
+                worker.join()
+
+    def reset_stats(self):
+        self.sent = self.retried = self.failed = 0
+
+class MailQueueWorker(Thread):
+    def __init__(self, queue):
+        super(MailQueueWorker, self).__init__()
+        self.queue = queue
+        self.connection = None
+
+    def _close(self):
+        try:
+            if self.connection is not None:
+                self.connection.quit()
+        except Exception:
+            pass
+
+        self.connection = None
+
+    def run(self):
+        from forum.utils.mail import create_connection
+
+        try:
+            while True:
+                claimed = self.queue.claim()
+
+                if claimed is None:
+                    return
+
+                name, message = claimed
+
+                try:
+                    if self.connection is None:
+                        self.connection = create_connection()
+
+                    self.connection.sendmail(message['sender'], [message['recipient']], message['data'])
+                except SMTPRecipientsRefused, e:
+                    self.queue.give_up(name, message, str(e))
+                except Exception, e:
+                    logging.error("Couldn't send mail to %s: %s" % (message['recipient'], e))
+                    self._close()
+                    self.queue.retry(name, message, str(e))
+                else:
+                    self.queue.delivered(name)
+        finally:
+            self._close()
+
+mail_queue = MailQueue()
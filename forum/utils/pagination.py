@@ -1,11 +1,20 @@
 import math
+import datetime
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+try:
+    from hashlib import md5
+except:
+    from md5 import new as md5
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import models
 from django.utils.datastructures import SortedDict
 from django import template
 from django.core.paginator import Paginator, EmptyPage
 from django.utils.translation import ugettext as _
 from django.utils.html import escape
 from django.http import Http404
-from django.utils.encoding import smart_unicode
+from django.utils.encoding import smart_unicode, smart_str
 from django.utils.http import urlquote
 from django.utils.safestring import mark_safe
 from django.utils.html import strip_tags, escape
@@ -26,6 +35,51 @@ class SortBase(object):
         self.label = label
         self.description = description
 
+    def keys(self):
+        """The order_by of the sort when it is made of plain columns a page can seek past, None otherwise."""
+        return None
+
+    def seek_keys(self):
+        keys = self.keys()
+
+        if not keys:
+            return None
+
+        keys = list(keys)
+
+        if not 'id' in [k.lstrip('-') for k in keys]:
+            keys.append(keys[0].startswith('-') and '-id' or 'id')
+
+        return keys
+
+    def seek_values(self, obj):
+        return [getattr(obj, k.lstrip('-')) for k in self.seek_keys()]
+
+    def _after(self, values, backwards=False):
+        """The rows past values in the order of the sort, before them when going backwards."""
+        keys = self.seek_keys()
+        after = None
+
+        for i, key in enumerate(keys):
+            descending = key.startswith('-') != backwards
+            condition = models.Q(**{'%s__%s' % (key.lstrip('-'), descending and 'lt' or 'gt'): values[i]})
+
+            for previous, value in zip(keys[:i], values[:i]):
+                condition &= models.Q(**{previous.lstrip('-'): value})
+
+            after = after is None and condition or (after | condition)
+
+        return after
+
+    def seek(self, objects, values=None, backwards=False):
+        """The objects in the order of the sort with ties broken by id, starting past values when given."""
+        objects = self.apply(objects).order_by(*self.seek_keys())
+
+        if values is not None:
+            objects = objects.filter(self._after(values, backwards))
+
+        return backwards and objects.reverse() or objects
+
 class SimpleSort(SortBase):
     def __init__(self, label, order_by, description=''):
         super(SimpleSort, self) .__init__(label, description)
@@ -34,6 +88,9 @@ class SimpleSort(SortBase):
     def _get_order_by(self):
         return isinstance(self.order_by, (list, tuple)) and self.order_by or [self.order_by]
 
+    def keys(self):
+        return self.order_by and self._get_order_by() or None
+
     def apply(self, objects):
         if self.order_by:
             return objects.order_by(*self._get_order_by())
@@ -46,6 +103,19 @@ class PaginatorContext(object):
 
     base_path = None
 
+    # Denormalized counters read by every item of a page, filled with one query per counter for the whole page
+    denormalized_fields = ()
+
+    # User foreign keys of every item of a page loaded in bulk along with the users' suspensions. An empty tuple
+    # when the items are users themselves, None to leave the page alone.
+    user_fields = None
+
+    # Pages past the first keyset_pages are found by seeking past the last row of the previous one, with a cursor in
+    # the url, when the sort allows it. The total is then only counted every count_cache_seconds.
+    keyset = False
+    keyset_pages = 10
+    count_cache_seconds = 600
+
     def __init__(self, id, sort_methods=None, default_sort=None, force_sort = None,
                  pagesizes=None, default_pagesize=None, prefix=''):
         self.id = id
@@ -170,6 +240,89 @@ class PaginatorContext(object):
     def SORT(self):
         return self.prefix and "%s_%s" % (self.prefix, _('sort')) or _('sort')
 
+    @property
+    def CURSOR(self):
+        return self.prefix and "%s_%s" % (self.prefix, _('cursor')) or _('cursor')
+
+    def cursor(self, request, sort):
+        """The (page, values, backwards) a cursor of the request points at, None if it has none for this sort."""
+        token = request.GET.get(self.CURSOR, None)
+
+        if not token:
+            return None
+
+        try:
+            cursor_sort, page, direction, values = decode_cursor(token)
+        except (ValueError, TypeError):
+            logging.error('Found invalid cursor "%s", loading %s, refered by %s' % (
+                token, request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
+            ))
+            raise Http404()
+
+        if cursor_sort != sort or len(values) != len(self.sort_methods[sort].seek_keys()):
+            return None
+
+        return max(page, 1), values, direction == 'p'
+
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+def _encode_value(value):
+    if value is None:
+        raise ValueError("Rows can't be sought past a null")
+    if isinstance(value, bool):
+        return 'b' + str(int(value))
+    if isinstance(value, (int, long)):
+        return 'i' + str(value)
+    if isinstance(value, float):
+        return 'f' + repr(value)
+    if isinstance(value, datetime.datetime):
+        return 'd' + value.strftime(CURSOR_DATE_FORMAT)
+
+    return 'u' + smart_str(value)
+
+def _decode_value(value):
+    kind, value = value[0], value[1:]
+
+    if kind == 'b':
+        return bool(int(value))
+    if kind == 'i':
+        return int(value)
+    if kind == 'f':
+        return float(value)
+    if kind == 'd':
+        return datetime.datetime.strptime(value, CURSOR_DATE_FORMAT)
+    if kind == 'u':
+        return smart_unicode(value)
+
+    raise ValueError("Unknown cursor value %s" % kind)
+
+def encode_cursor(sort, page, values, backwards=False):
+    """A url safe token for the rows past values in the given sort, or before them going backwards."""
+    parts = [smart_str(sort), str(page), backwards and 'p' or 'n'] + [_encode_value(v) for v in values]
+    return urlsafe_b64encode("\x00".join(parts)).rstrip('=')
+
+def decode_cursor(token):
+    try:
+        parts = urlsafe_b64decode(smart_str(token) + '=' * (-len(token) % 4)).split("\x00")
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if len(parts) < 4 or not parts[2] in ('n', 'p') or '' in parts[3:]:
+        raise ValueError("Invalid cursor")
+
+    return smart_unicode(parts[0]), int(parts[1]), parts[2], [_decode_value(v) for v in parts[3:]]
+
+def approximate_count(objects, seconds=600):
+    """The count of a queryset, remembered for a while whatever changes in the meantime."""
+    key = '%s.pagination.count:%s' % (django_settings.APP_URL, md5(smart_str(objects.query)).hexdigest())
+    count = cache.get(key)
+
+    if count is None:
+        count = objects.count()
+        cache.set(key, count, seconds)
+
+    return count
+
 page_numbers_template = template.loader.get_template('paginator/page_numbers.html')
 page_sizes_template = template.loader.get_template('paginator/page_sizes.html')
 sort_tabs_template = template.loader.get_template('paginator/sort_tabs.html')
@@ -183,51 +336,114 @@ def paginated(request, paginators, tpl_context):
 
     return tpl_context
 
+class KeysetPaginator(Paginator):
+    """
+    Holds a page already read, as a list of rows rather than a slice of the queryset. Querysets built on top of the
+    paginated one copy it along, the rows are left as they are.
+    """
+    def __deepcopy__(self, memo):
+        return self
+
+def _shallow_page_numbers(page_numbers, page, shallow):
+    kept = []
+
+    for numbers in page_numbers:
+        if numbers is not None:
+            numbers = [(n, url) for n, url in numbers if n <= shallow or n == page]
+
+            if not numbers:
+                continue
+        elif not kept or kept[-1] is None:
+            continue
+
+        kept.append(numbers)
+
+    while kept and kept[-1] is None:
+        kept.pop()
+
+    return kept
+
 def _paginated(request, objects, context):
     session_prefs = context.preferences(request)
 
     pagesize = context.pagesize(request, session_prefs)
     page = context.page(request)
+    unsorted = objects
     sort, objects = context.sorted(objects, request, session_prefs)
 
-    paginator = Paginator(objects, pagesize)
+    def prepare(objects):
+        if context.denormalized_fields and hasattr(objects, 'prefetch_denormalized'):
+            objects = objects.prefetch_denormalized(*context.denormalized_fields)
 
-    try:
-        page_obj = paginator.page(page)
-    except EmptyPage:
-        logging.error('Found invalid page number "%s", loading %s, refered by %s' % (
-            request.GET.get(context.PAGE, ''), request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
-        ))
-        raise Http404()
+        if (context.user_fields is not None) and hasattr(objects, 'hydrate_users'):
+            objects = objects.hydrate_users(*context.user_fields)
+
+        return objects
+
+    objects = prepare(objects)
+    keyset = context.keyset and sort and context.sort_methods[sort].seek_keys() and True
+    if keyset:
+        paginator = KeysetPaginator(objects, pagesize)
+        sort_method = context.sort_methods[sort]
+        cursor = context.cursor(request, sort)
+
+        if cursor:
+            page, values, backwards = cursor
+            rows = list(prepare(sort_method.seek(unsorted, values, backwards))[:pagesize + 1])
+        else:
+            backwards = False
+            rows = list(prepare(sort_method.seek(unsorted))[(page - 1) * pagesize:page * pagesize + 1])
+
+        more = len(rows) > pagesize
+        rows = rows[:pagesize]
+
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = more or page > 1, True
+        else:
+            has_previous, has_next = page > 1, more
+
+        if page > 1 and not rows:
+            logging.error('Found invalid page number "%s", loading %s, refered by %s' % (
+                request.GET.get(context.PAGE, ''), request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
+            ))
+            raise Http404()
+
+        # The count only draws the page numbers, it may be a few minutes behind
+        paginator._count = approximate_count(unsorted, context.count_cache_seconds)
+        paginator._num_pages = has_next and max(paginator.num_pages, page + 1) or page
+    else:
+        paginator = Paginator(objects, pagesize)
+
+        try:
+            page_obj = paginator.page(page)
+        except EmptyPage:
+            logging.error('Found invalid page number "%s", loading %s, refered by %s' % (
+                request.GET.get(context.PAGE, ''), request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
+            ))
+            raise Http404()
+
+        rows = page_obj.object_list
 
     if context.base_path:
         base_path = context.base_path
     else:
         base_path = request.path
-        get_params = generate_uri(request.GET, (context.PAGE, context.PAGESIZE, context.SORT))
+        get_params = generate_uri(request.GET, (context.PAGE, context.PAGESIZE, context.SORT, context.CURSOR))
 
         if get_params:
             base_path += "?" + get_params
 
     url_joiner = "?" in base_path and "&amp;" or "?"
 
-
-    def get_page():
-        object_list = page_obj.object_list
-
-        #if hasattr(object_list, 'lazy'):
-        #    return object_list.lazy()
-        return object_list
-    paginator.page = get_page()
+    paginator.page = rows
 
     total_pages = paginator.num_pages
 
     if total_pages > 1:
-
-        total_pages = paginator.num_pages
-
-        has_previous = page > 1
-        has_next = page < total_pages
+        if not keyset:
+            has_previous = page > 1
+            has_next = page < total_pages
 
         range_start = page - context.visible_page_range / 2
         range_end = page + context.visible_page_range / 2
@@ -249,6 +465,16 @@ def _paginated(request, objects, context):
         else:
             url_builder = lambda n: mark_safe("%s%s%s=%s" % (escape(base_path), url_joiner, context.PAGE, n))
 
+        def page_url(n, row, backwards):
+            if keyset and n > context.keyset_pages:
+                try:
+                    cursor = encode_cursor(sort, n, sort_method.seek_values(row), backwards)
+                    return mark_safe("%s%s%s=%s&amp;%s=%s" % (escape(base_path), url_joiner, context.SORT, sort, context.CURSOR, cursor))
+                except ValueError:
+                    pass
+
+            return url_builder(n)
+
         if range_start > (context.outside_page_range + 1):
             page_numbers.append([(n, url_builder(n)) for n in range(1, context.outside_page_range + 1)])
             page_numbers.append(None)
@@ -263,11 +489,15 @@ def _paginated(request, objects, context):
         elif range_end < total_pages:
             page_numbers.append([(n, url_builder(n)) for n in range(range_end + 1, total_pages + 1)])
 
+        if keyset:
+            # Deep pages are only reached from their neighbours, only the shallow ones get a number to click
+            page_numbers = _shallow_page_numbers(page_numbers, page, context.keyset_pages)
+
         page_numbers_context = {
             'has_previous': has_previous,
-            'previous_url': has_previous and url_builder(page - 1) or None,
+            'previous_url': has_previous and page_url(page - 1, rows and rows[0], True) or None,
             'has_next': has_next,
-            'next_url': has_next and url_builder(page + 1) or None,
+            'next_url': has_next and page_url(page + 1, rows and rows[-1], False) or None,
             'current': page,
             'page_numbers': page_numbers
         }
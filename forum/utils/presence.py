@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from threading import Lock
+
+from django.core.cache import cache
+
+from forum import settings
+
+EPOCH = datetime(1970, 1, 1)
+
+class PresenceTracker(object):
+    """
+    Keeps track of the users seen in the last ONLINE_USERS_MINUTES, shared by all processes through the cache.
+
+    Time is cut in buckets of ONLINE_USERS_BUCKET_SECONDS. Each process claims a numbered slot in every bucket it is
+    active in and stores there the users it saw during that bucket, so a user costs one cache write per bucket no
+    matter how many pages they request. Slots expire by themselves once their bucket leaves the window. The online
+    list is merged from the slots once per bucket and kept in the cache until the next one.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.bucket = None
+        self.slot = None
+        self.seen = {}
+
+    def _bucket_seconds(self):
+        return max(int(settings.ONLINE_USERS_BUCKET_SECONDS), 1)
+
+    def _bucket_of(self, time):
+        delta = time - EPOCH
+        return (delta.days * 86400 + delta.seconds) // self._bucket_seconds()
+
+    def _timeout(self):
+        return int(settings.ONLINE_USERS_MINUTES) * 60 + self._bucket_seconds()
+
+    def _slots_key(self, bucket):
+        return '%s:presence:%s' % (settings.APP_URL, bucket)
+
+    def _slot_key(self, bucket, slot):
+        return '%s:presence:%s:%s' % (settings.APP_URL, bucket, slot)
+
+    def _online_key(self, bucket):
+        return '%s:presence:online:%s' % (settings.APP_URL, bucket)
+
+    def _claim_slot(self, bucket):
+        key = self._slots_key(bucket)
+
+        try:
+            cache.add(key, 0, self._timeout())
+            return cache.incr(key)
+        except ValueError:
+            # The counter expired or was evicted between add and incr
+            cache.set(key, 1, self._timeout())
+            return 1
+
+    def record(self, user_id, time=None):
+        time = time or datetime.now()
+        bucket = self._bucket_of(time)
+
+        with self.lock:
+            if bucket != self.bucket:
+                self.bucket, self.slot, self.seen = bucket, None, {}
+
+            if user_id in self.seen:
+                return
+
+            self.seen[user_id] = time
+            seen = dict(self.seen)
+
+            if self.slot is None:
+                self.slot = self._claim_slot(bucket)
+
+            # Under the lock, or an older and smaller seen could be written over a newer one
+            cache.set(self._slot_key(bucket, self.slot), seen, self._timeout())
+
+    def online(self, time=None):
+        """
+        Returns a list of (user id, last seen) tuples for the online users, the most recently seen first, as of the
+        first call in the bucket of time.
+        """
+        time = time or datetime.now()
+        key = self._online_key(self._bucket_of(time))
+        online = cache.get(key)
+
+        if online is None:
+            online = self._merge(time)
+            cache.set(key, online, self._bucket_seconds())
+
+        return online
+
+    def _merge(self, time):
+        since = time - timedelta(minutes=int(settings.ONLINE_USERS_MINUTES))
+        buckets = range(self._bucket_of(since), self._bucket_of(time) + 1)
+
+        slots = cache.get_many([self._slots_key(bucket) for bucket in buckets])
+        slot_keys = []
+
+        for bucket in buckets:
+            slot_keys += [self._slot_key(bucket, slot) for slot in
+                          range(1, (slots.get(self._slots_key(bucket), 0) or 0) + 1)]
+
+        last_seen = {}
+
+        for seen in cache.get_many(slot_keys).values():
+            for user_id, seen_at in seen.items():
+                if seen_at >= since and seen_at > last_seen.get(user_id, EPOCH):
+                    last_seen[user_id] = seen_at
+
+        return sorted(last_seen.items(), key=lambda x: x[1], reverse=True)
+
+presence = PresenceTracker()
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils.translation import ugettext as _
+
+def total_seconds(delta):
+    """The seconds in delta with the microseconds, as timedelta.total_seconds() of Python 2.7."""
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0
+
+class Progress(object):
+    """
+    Row counts of a long running job, like an export or an import, split in named steps and shown to the admin
+    while it runs. Rows are counted in memory and a snapshot of the state is published to the cache at most once
+    every INTERVAL or every PERCENT of the rows, with the rows per second and the seconds left of every step.
+
+    The snapshot is a dict of running, errors, time_started and state, where state maps each step, and 'overall',
+    to its status, count, parsed, rate and eta.
+    """
+    INTERVAL = timedelta(milliseconds=500)
+    PERCENT = 1
+
+    def __init__(self, cache_key, steps, total=None):
+        """steps is a list of (id, row count) pairs, in the order they run, total the overall rows if not their sum."""
+        self.cache_key = cache_key
+        self.started = self.now()
+        self.step_started = {}
+        self.running_steps = set()
+
+        if total is None:
+            total = sum([count for id, count in steps])
+
+        self.state = dict([(id, {
+            'status': _('Queued'), 'count': count, 'parsed': 0
+        }) for id, count in steps] + [
+            ('overall', {
+                'status': _('Starting'), 'count': total, 'parsed': 0
+            })
+        ])
+
+        self.full_state = dict(running=True, state=self.state, time_started="")
+
+        self.published_at = None
+        self.published_rows = 0
+        self.publish()
+
+    def now(self):
+        """The clock progress is timed with."""
+        return datetime.now()
+
+    def _rate(self, id, now):
+        elapsed = total_seconds(now - self.step_started.get(id, self.started))
+        return elapsed and int(self.state[id]['parsed'] / elapsed) or 0
+
+    def publish(self):
+        from forum.templatetags.extra_tags import diff_date
+
+        now = self.now()
+
+        for id, s in self.state.items():
+            if id in self.running_steps or id == 'overall':
+                s['rate'] = self._rate(id, now)
+                s['eta'] = None
+
+                if s['rate']:
+                    s['eta'] = max(s['count'] - s['parsed'], 0) / s['rate']
+
+        self.full_state['time_started'] = diff_date(self.started)
+        cache.set(self.cache_key, self.full_state)
+
+        self.published_at = now
+        self.published_rows = self.state['overall']['parsed']
+
+    def start(self, id, status, overall_status=None):
+        self.step_started[id] = self.now()
+        self.running_steps.add(id)
+        self.status(id, status, overall_status)
+
+    def done(self, id, status):
+        """Publishes the last rate of a step, which then stays as it was."""
+        self.status(id, status)
+        self.running_steps.discard(id)
+
+    def status(self, id, status, overall_status=None):
+        self.state[id]['status'] = status
+
+        if overall_status is not None:
+            self.state['overall']['status'] = overall_status
+
+        self.publish()
+
+    def ping(self, id, rows=1):
+        self.state[id]['parsed'] += rows
+        overall = self.state['overall']
+        overall['parsed'] += rows
+
+        if (overall['parsed'] - self.published_rows) * 100 >= overall['count'] * self.PERCENT or \
+                self.now() - self.published_at >= self.INTERVAL:
+            self.publish()
+
+    def finish(self, errors=False, **overall):
+        """Marks the job as stopped, errors is False or the message shown to the admin."""
+        self.full_state['running'] = False
+        self.full_state['errors'] = errors
+        self.state['overall'].update(overall)
+        self.publish()
@@ -0,0 +1,173 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from forum import settings
+
+# The lists kept, each row of one is a question and its score in it
+HOT = 'hot'
+UNANSWERED = 'unanswered'
+MOST_VOTED = 'mostvoted'
+
+HOT_WINDOW = timedelta(days=1)
+
+BUILT_KEY = 'QUESTION_RANKINGS_BUILT'
+
+def _refreshed_key():
+    return '%s.question_rankings.refreshed' % settings.APP_URL
+
+def _changed():
+    # Question lists join on the rankings, cached ones must be read again
+    from forum.models import Node
+    Node._set_query_cache_invalidation_timestamp()
+
+def _set(ranking, question_id, score=0, increment=False):
+    from forum.models import RankedQuestion
+
+    rows = RankedQuestion.objects.filter(ranking=ranking, question__id=question_id)
+
+    if rows.update(score=increment and (F('score') + score) or score):
+        return
+
+    # The way get_or_create recovers, a failed INSERT must not abort the transaction of a request
+    sid = transaction.savepoint()
+
+    try:
+        RankedQuestion.objects.create(ranking=ranking, question_id=question_id, score=score)
+        transaction.savepoint_commit(sid)
+    except IntegrityError:
+        # Inserted by someone else in the meantime
+        transaction.savepoint_rollback(sid)
+        rows.update(score=increment and (F('score') + score) or score)
+
+def _remove(ranking, question_id):
+    from forum.models import RankedQuestion
+    RankedQuestion.objects.filter(ranking=ranking, question__id=question_id).delete()
+
+def _score(question_id):
+    from forum.models import Node
+    return Node.objects.filter(id=question_id)._base_clone().values_list('score', flat=True)[0]
+
+def _is_answered(question_id):
+    from forum.models import Node
+    return Node.objects.filter(Q(id=question_id, marked=True) |
+                               Q(parent__id=question_id, node_type='answer', marked=True))._base_clone().exists()
+
+def question_added(question):
+    """A new question, or one converted from another node, enters the unanswered and most voted lists."""
+    if not question.marked:
+        _set(UNANSWERED, question.id)
+
+    _set(MOST_VOTED, question.id, _score(question.id))
+    _changed()
+
+def child_added(node):
+    """An answer or comment counts toward the activity of its question over the last day."""
+    if node.abs_parent_id:
+        _set(HOT, node.abs_parent_id, 1, increment=True)
+        _changed()
+
+def question_voted(question):
+    _set(MOST_VOTED, question.id, _score(question.id))
+    _changed()
+
+def answer_accepted(answer):
+    _remove(UNANSWERED, answer.parent_id)
+    _changed()
+
+def accept_canceled(answer):
+    if not _is_answered(answer.parent_id):
+        _set(UNANSWERED, answer.parent_id)
+        _changed()
+
+def _replace(ranking, scores):
+    """
+    Makes the rows of a list match scores, a dict of question ids to their score, writing only the differences.
+    Returns how many rows changed.
+    """
+    from forum.models import RankedQuestion
+    from forum.utils.bulk import BulkInsert
+
+    current = dict(RankedQuestion.objects.filter(ranking=ranking).values_list('question', 'score'))
+    gone = [id for id in current if not id in scores]
+
+    for start in range(0, len(gone), 500):
+        RankedQuestion.objects.filter(ranking=ranking, question__id__in=gone[start:start + 500]).delete()
+
+    insert = BulkInsert(RankedQuestion._meta.db_table, ['ranking', 'question_id', 'score'], 500)
+    changed = len(gone)
+
+    for id, score in scores.iteritems():
+        if not id in current:
+            insert.add([ranking, id, score])
+        elif current[id] != score:
+            RankedQuestion.objects.filter(ranking=ranking, question__id=id).update(score=score)
+        else:
+            continue
+
+        changed += 1
+
+    insert.flush()
+    transaction.commit_unless_managed()
+    return changed
+
+def refresh_hot():
+    """
+    Counts the answers and comments of the last day again, which drops the ones that have aged out of it. Between
+    two of these the counts only go up.
+    """
+    from forum.models import Node
+
+    children = Node.objects.filter(added_at__gt=datetime.now() - HOT_WINDOW, abs_parent__isnull=False)._base_clone()
+    counts = dict(children.values_list('abs_parent').annotate(count=Count('id')).order_by())
+
+    if _replace(HOT, counts):
+        _changed()
+
+def rebuild():
+    """Fills every list from scratch, needed once after the upgrade and after importing questions in bulk."""
+    from forum.models import Node, KeyValue
+
+    questions = Node.objects.filter(node_type='question')._base_clone()
+    answered = Node.objects.filter(node_type='answer', marked=True)._base_clone().values('parent')
+
+    _replace(UNANSWERED, dict([(id, 0) for id in questions.filter(marked=False).exclude(id__in=answered)
+                                                                .values_list('id', flat=True)]))
+    _replace(MOST_VOTED, dict(questions.values_list('id', 'score')))
+    refresh_hot()
+    _changed()
+
+    try:
+        built = KeyValue.objects.get(key=BUILT_KEY)
+    except KeyValue.DoesNotExist:
+        built = KeyValue(key=BUILT_KEY)
+
+    built.value = datetime.now()
+    built.save()
+
+def refresh_if_due():
+    """
+    Called when a list is read. Builds the lists the first time, then brings the hot one up to date at most every
+    QUESTION_RANKINGS_REFRESH_SECONDS, only one process doing it.
+    """
+    from forum.models import KeyValue
+
+    key = _refreshed_key()
+
+    if cache.get(key) is not None or not cache.add(key + '.lock', True, 60):
+        return
+
+    try:
+        if not KeyValue.objects.filter(key=BUILT_KEY).exists():
+            rebuild()
+        else:
+            refresh_hot()
+
+        cache.set(key, datetime.now(), int(settings.QUESTION_RANKINGS_REFRESH_SECONDS))
+    except Exception, e:
+        logging.error("Couldn't refresh the question rankings: %s" % e)
+    finally:
+        cache.delete(key + '.lock')
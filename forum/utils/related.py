@@ -0,0 +1,197 @@
+import heapq
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Neighbours kept for each question, the most get_related_questions can show
+NEIGHBOURS = 10
+
+def _cache_key(question_id):
+    return '%s.related_questions:%d' % (settings.APP_URL, question_id)
+
+def _postings(tag_ids):
+    """(question id, tag id) pairs of the live questions carrying any of the tags."""
+    from forum.models import Node
+
+    if not tag_ids:
+        return []
+
+    return Node.tags.through.objects.filter(tag__id__in=list(tag_ids), node__node_type='question').exclude(
+        node__state_string__contains='(deleted)').values_list('node', 'tag')
+
+def _question_count():
+    from forum.models import Node
+
+    count = cache.get('%s.related_questions.count' % settings.APP_URL)
+
+    if count is None:
+        count = Node.objects.filter(node_type='question').exclude(state_string__contains='(deleted)').count()
+        cache.set('%s.related_questions.count' % settings.APP_URL, count, 60 * 60)
+
+    return count
+
+def _idf(questions, used):
+    """
+    Inverse document frequency of a tag, log(1 + N / used), so that sharing a rare tag counts for much more than
+    sharing one that half the questions carry, and no shared tag counts for nothing.
+    """
+    return math.log(1 + float(max(questions, 1)) / max(used, 1))
+
+def _weights(tag_ids):
+    from forum.models import Tag
+
+    questions = _question_count()
+    return dict([(id, _idf(questions, used))
+                 for id, used in Tag.objects.filter(id__in=list(tag_ids)).values_list('id', 'used_count')])
+
+def _top(scores):
+    # Ties go to the newest question
+    return heapq.nlargest(NEIGHBOURS, scores.items(), key=lambda (id, score): (score, id))
+
+def similarities(question):
+    """Weighted tag overlap between the question and every live question sharing a tag with it."""
+    tag_ids = [t.id for t in question.tags.all()]
+    weights = _weights(tag_ids)
+    scores = {}
+
+    for node_id, tag_id in _postings(tag_ids):
+        scores[node_id] = scores.get(node_id, 0) + weights.get(tag_id, 0)
+
+    scores.pop(question.id, None)
+    return scores
+
+def _store(question_id, neighbours):
+    from forum.models import RelatedQuestion
+
+    RelatedQuestion.objects.filter(question__id=question_id).delete()
+
+    for id, score in neighbours:
+        RelatedQuestion.objects.create(question_id=question_id, related_id=id, score=score)
+
+    cache.set(_cache_key(question_id), [id for id, score in neighbours])
+
+def _refresh(question_id):
+    from forum.models import Question
+
+    try:
+        question = Question.objects.get(id=question_id)
+    except Question.DoesNotExist:
+        return
+
+    _store(question_id, _top(similarities(question)))
+
+def _offer(question_id, related_id, score):
+    """Puts related_id into the neighbours of question_id if it beats the weakest of them."""
+    from forum.models import RelatedQuestion
+
+    current = list(RelatedQuestion.objects.filter(question__id=question_id).order_by('-score', '-related__id'))
+
+    if len(current) >= NEIGHBOURS and (score, related_id) <= (current[-1].score, current[-1].related_id):
+        return
+
+    RelatedQuestion.objects.create(question_id=question_id, related_id=related_id, score=score)
+
+    for dropped in current[NEIGHBOURS - 1:]:
+        dropped.delete()
+
+    cache.delete(_cache_key(question_id))
+
+def update(question):
+    """
+    Called when the tags of a question change or it comes back from deletion. Its own neighbours are computed again,
+    and only the questions that already list it or that it now lists are looked at in turn, since the similarity is
+    symmetric. Tag weights drift as usage counts change, rebuild_related_questions brings everything up to date.
+    """
+    from forum.models import RelatedQuestion
+
+    scores = similarities(question)
+    neighbours = _top(scores)
+    _store(question.id, neighbours)
+
+    listed_by = set(RelatedQuestion.objects.filter(related__id=question.id).values_list('question', flat=True))
+
+    for id in listed_by:
+        if id in scores:
+            RelatedQuestion.objects.filter(question__id=id, related__id=question.id).update(score=scores[id])
+            cache.delete(_cache_key(id))
+        else:
+            _refresh(id)
+
+    for id, score in neighbours:
+        if not id in listed_by:
+            _offer(id, question.id, score)
+
+def remove(question):
+    """Called when a question is deleted, the questions listing it fill the gap with their next best match."""
+    from forum.models import RelatedQuestion
+
+    listed_by = list(RelatedQuestion.objects.filter(related__id=question.id).values_list('question', flat=True))
+
+    RelatedQuestion.objects.filter(related__id=question.id).delete()
+    RelatedQuestion.objects.filter(question__id=question.id).delete()
+    cache.delete(_cache_key(question.id))
+
+    for id in listed_by:
+        _refresh(id)
+
+def related_ids(question):
+    """
+    Ids of the stored neighbours of the question, best first. Nothing is computed here, questions get theirs from
+    update when their tags are saved, and from rebuild. Having none is cached too, every write drops the key.
+    """
+    from forum.models import RelatedQuestion
+
+    ids = cache.get(_cache_key(question.id))
+
+    if ids is None:
+        ids = list(RelatedQuestion.objects.filter(question__id=question.id).order_by('-score', '-related__id')
+                   .values_list('related', flat=True))
+        cache.set(_cache_key(question.id), ids)
+
+    return ids
+
+def rebuild(batch_size=1000):
+    """
+    Computes the neighbours of every live question from posting lists held in memory and writes them in batches.
+    Returns the number of questions done.
+    """
+    from forum.models import Node, RelatedQuestion
+    from forum.utils.bulk import BulkInsert
+
+    tags_of = {}
+    postings = {}
+
+    for node_id, tag_id in Node.tags.through.objects.filter(node__node_type='question').exclude(
+            node__state_string__contains='(deleted)').values_list('node', 'tag').iterator():
+        tags_of.setdefault(node_id, []).append(tag_id)
+        postings.setdefault(tag_id, []).append(node_id)
+
+    questions = Node.objects.filter(node_type='question').exclude(state_string__contains='(deleted)').count()
+    weights = dict([(tag_id, _idf(questions, len(nodes))) for tag_id, nodes in postings.items()])
+
+    stale = set(RelatedQuestion.objects.values_list('question', flat=True))
+    RelatedQuestion.objects.all().delete()
+    insert = BulkInsert(RelatedQuestion._meta.db_table, ['question_id', 'related_id', 'score'], batch_size)
+
+    for question_id, tag_ids in tags_of.iteritems():
+        scores = {}
+
+        for tag_id in tag_ids:
+            weight = weights[tag_id]
+
+            for node_id in postings[tag_id]:
+                scores[node_id] = scores.get(node_id, 0) + weight
+
+        scores.pop(question_id, None)
+
+        for id, score in _top(scores):
+            insert.add([question_id, id, score])
+
+    insert.flush()
+    cache.set('%s.related_questions.count' % settings.APP_URL, questions, 60 * 60)
+
+    for question_id in stale | set(tags_of):
+        cache.delete(_cache_key(question_id))
+
+    return len(tags_of)
@@ -4,6 +4,7 @@ import re
 
 from django.utils.encoding import smart_unicode
 from forum.models.user import User
+from forum.utils.autocomplete import user_index, MAX_RESULTS
 
 def find_best_match_in_name(content,  uname,  fullname,  start_index):      
     uname = smart_unicode(uname)
@@ -48,7 +49,8 @@ def auto_user_link(node, content):
                                 (find_best_match_in_name(content,  username, smart_unicode(matches[0].username),  appeal.start(0) + 1),  matches[0])
                                 )                                
         elif len(matches) == 0:
-            matches = User.objects.filter(username__istartswith=username)
+            matches = User.objects.in_bulk([id for id, name, reputation in
+                                            user_index.search(username, MAX_RESULTS, whole_name=True)]).values()
             
         if (len(matches) == 0):
                 continue
@@ -0,0 +1,114 @@
+import atexit
+import logging
+from datetime import datetime, timedelta
+from threading import Lock, Timer
+
+from django.core.cache import cache
+from django.db.models import F
+
+from forum import settings
+
+
+class ViewCountBuffer(object):
+    """
+    Coalesces question view increments in memory and writes them to the node table in bulk, either
+    every VIEW_COUNT_FLUSH_VIEWS views or every VIEW_COUNT_FLUSH_SECONDS seconds, whichever comes first. A timer
+    started with the first pending view flushes them when no other view comes in time.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.pending = {}
+        self.pending_views = 0
+        self.last_flush = datetime.now()
+        self.timer = None
+
+        self.views = 0
+        self.writes = 0
+
+    def record(self, node_id, count=1):
+        with self.lock:
+            self.pending[node_id] = self.pending.get(node_id, 0) + count
+            self.pending_views += count
+            self.views += count
+
+            must_flush = (self.pending_views >= int(settings.VIEW_COUNT_FLUSH_VIEWS)) or (
+                datetime.now() - self.last_flush >= timedelta(seconds=int(settings.VIEW_COUNT_FLUSH_SECONDS)))
+
+            timer = None
+
+            if not must_flush and self.timer is None:
+                timer = self.timer = Timer(int(settings.VIEW_COUNT_FLUSH_SECONDS), self._flush_on_time)
+                timer.setDaemon(True)
+
+        if timer is not None:
+            timer.start()
+
+        if must_flush:
+            self.flush()
+
+    def _flush_on_time(self):
+        from django.db import connection
+
+        try:
+            self.flush()
+        except Exception, e:
+            logging.error("Unable to flush pending question views: %s" % str(e))
+        finally:
+            # The timer's thread has a connection of its own
+            connection.close()
+
+    def pending_for(self, node_id):
+        return self.pending.get(node_id, 0)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.pending_views = 0
+            self.last_flush = datetime.now()
+
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        if not pending:
+            return {}
+
+        from forum.models import Node, Question
+        from forum.actions import QuestionViewCountAction
+
+        by_increment = {}
+
+        for node_id, count in pending.items():
+            by_increment.setdefault(count, []).append(node_id)
+
+        for count, ids in by_increment.items():
+            Node.objects.filter(id__in=ids).update(extra_count=F('extra_count') + count)
+            self.writes += 1
+
+        cache.delete_many([Node.infer_cache_key({'id': node_id}) for node_id in pending.keys()])
+
+        updated = dict(Node.objects.filter(id__in=pending.keys()).values_list('id', 'extra_count'))
+
+        for question in Question.objects.filter(id__in=updated.keys()):
+            try:
+                QuestionViewCountAction(question, updated[question.id] - pending[question.id], updated[question.id]).save()
+            except Exception, e:
+                logging.error("Error processing view count of question %s: %s" % (question.id, str(e)))
+
+        return updated
+
+    def reset_stats(self):
+        self.views = 0
+        self.writes = 0
+
+view_counter = ViewCountBuffer()
+
+def _flush_at_exit():
+    pending_views = view_counter.pending_views
+
+    try:
+        view_counter.flush()
+    except Exception, e:
+        logging.error("Unable to flush %d pending question views: %s" % (pending_views, str(e)))
+
+atexit.register(_flush_at_exit)
@@ -15,6 +15,7 @@ from django.shortcuts import get_object_or_404, render_to_response
 
 from forum.models import *
 from forum.utils.decorators import ajax_login_required
+from forum.utils.autocomplete import tag_index, user_index
 from forum.actions import *
 from forum.modules import decorate
 from forum import settings
@@ -547,14 +548,19 @@ def mark_tag(request, tag=None, **kwargs):#tagging system
             ts.update(reason=reason)
     return HttpResponse(simplejson.dumps(''), mimetype="application/json")
 
+def _autocomplete_limit(request):
+    try:
+        return int(request.GET.get('limit', 10))
+    except ValueError:
+        return 10
+
 def matching_tags(request):
     if len(request.GET['q']) == 0:
         raise CommandException(_("Invalid request"))
 
-    possible_tags = Tag.active.filter(name__icontains = request.GET['q'])
     tag_output = ''
-    for tag in possible_tags:
-        tag_output += "%s|%s|%s\n" % (tag.id, tag.name, tag.used_count)
+    for id, name, used_count in tag_index.search(request.GET['q'], _autocomplete_limit(request)):
+        tag_output += "%s|%s|%s\n" % (id, name, used_count)
 
     return HttpResponse(tag_output, mimetype="text/plain")
 
@@ -562,11 +568,14 @@ def matching_users(request):
     if len(request.GET['q']) == 0:
         raise CommandException(_("Invalid request"))
 
-    possible_users = User.objects.filter(username__icontains = request.GET['q'])
+    ids = [id for id, username, reputation in user_index.search(request.GET['q'], _autocomplete_limit(request))]
+    possible_users = User.objects.in_bulk(ids)
     output = ''
 
-    for user in possible_users:
-        output += ("%s|%s|%s\n" % (user.id, user.decorated_name, user.reputation))
+    for id in ids:
+        if id in possible_users:
+            user = possible_users[id]
+            output += ("%s|%s|%s\n" % (user.id, user.decorated_name, user.reputation))
 
     return HttpResponse(output, mimetype="text/plain")
 
@@ -2,8 +2,6 @@
 
 import logging
 
-from datetime import datetime
-
 from django.http import HttpResponse, HttpResponseRedirect
 from django.utils import simplejson
 from django.shortcuts import render_to_response
@@ -12,7 +10,7 @@ from django.template import RequestContext
 from django.utils.translation import ugettext as _
 
 from forum.modules import ui, decorate
-from forum.settings import ONLINE_USERS
+from forum.utils.presence import presence
 
 def login_required(func, request, *args, **kwargs):
     if not request.user.is_authenticated():
@@ -24,7 +22,7 @@ def render(template=None, tab=None, tab_title='', weight=500, tabbed=True):
     def decorator(func):        
         def decorated(context, request, *args, **kwargs):
             if request.user.is_authenticated():
-                ONLINE_USERS[request.user] = datetime.now()
+                presence.record(request.user.id)
 
             if isinstance(context, HttpResponse):
                 return context
@@ -17,7 +17,7 @@ from django.utils.safestring import mark_safe
 from forum import settings as django_settings
 from forum.utils.html import hyperlink
 from forum.utils.diff import textDiff as htmldiff
-from forum.utils import pagination
+from forum.utils import pagination, rankings
 from forum.forms import *
 from forum.models import *
 from forum.actions import QuestionViewAction
@@ -27,19 +27,45 @@ from forum.utils.pagination import generate_uri
 
 import decorators
 
-class HottestQuestionsSort(pagination.SortBase):
+class RankedQuestionsSort(pagination.SortBase):
+    """Pages through one of the lists kept by forum.utils.rankings, questions not in it aren't shown."""
+    def __init__(self, label, ranking, description=''):
+        super(RankedQuestionsSort, self).__init__(label, description)
+        self.ranking = ranking
+
+    def keys(self):
+        return ('-rankings__score', '-id')
+
     def apply(self, questions):
-        return questions.annotate(new_child_count=Count('all_children')).filter(
-                all_children__added_at__gt=datetime.datetime.now() - datetime.timedelta(days=1)).order_by('-new_child_count')
+        return self.seek(questions)
+
+    def seek(self, questions, values=None, backwards=False):
+        rankings.refresh_if_due()
+        filter = Q(rankings__ranking=self.ranking)
+
+        # In the same filter as the ranking, or the score would be read from a join of its own
+        if values is not None:
+            filter &= self._after(values, backwards)
+
+        questions = questions.filter(filter).order_by(*self.keys())
+        return backwards and questions.reverse() or questions
+
+    def seek_values(self, question):
+        return [RankedQuestion.objects.filter(ranking=self.ranking, question=question).values_list('score', flat=True)[0],
+                question.id]
 
 
 class QuestionListPaginatorContext(pagination.PaginatorContext):
+    denormalized_fields = ('answer_count', 'accepted_count', 'favorite_count')
+    user_fields = ('last_activity_by',)
+    keyset = True
+
     def __init__(self, id='QUESTIONS_LIST', prefix='', pagesizes=(15, 30, 50), default_pagesize=30):
         super (QuestionListPaginatorContext, self).__init__(id, sort_methods=(
             (_('active'), pagination.SimpleSort(_('active'), '-last_activity_at', _("Most <strong>recently updated</strong> questions"))),
             (_('newest'), pagination.SimpleSort(_('newest'), '-added_at', _("most <strong>recently asked</strong> questions"))),
-            (_('hottest'), HottestQuestionsSort(_('hottest'), _("most <strong>active</strong> questions in the last 24 hours</strong>"))),
-            (_('mostvoted'), pagination.SimpleSort(_('most voted'), '-score', _("most <strong>voted</strong> questions"))),
+            (_('hottest'), RankedQuestionsSort(_('hottest'), rankings.HOT, _("most <strong>active</strong> questions in the last 24 hours</strong>"))),
+            (_('mostvoted'), RankedQuestionsSort(_('most voted'), rankings.MOST_VOTED, _("most <strong>voted</strong> questions"))),
         ), pagesizes=pagesizes, default_pagesize=default_pagesize, prefix=prefix)
 
 class AnswerSort(pagination.SimpleSort):
@@ -50,6 +76,8 @@ class AnswerSort(pagination.SimpleSort):
             return super(AnswerSort, self).apply(answers)
 
 class AnswerPaginatorContext(pagination.PaginatorContext):
+    user_fields = ('author',)
+
     def __init__(self, id='ANSWER_LIST', prefix='', default_pagesize=10):
         super (AnswerPaginatorContext, self).__init__(id, sort_methods=(
             (_('oldest'), AnswerSort(_('oldest answers'), 'added_at', _("oldest answers will be shown first"))),
@@ -58,6 +86,8 @@ class AnswerPaginatorContext(pagination.PaginatorContext):
         ), default_sort=_('votes'), pagesizes=(5, 10, 20), default_pagesize=default_pagesize, prefix=prefix)
 
 class TagPaginatorContext(pagination.PaginatorContext):
+    keyset = True
+
     def __init__(self):
         super (TagPaginatorContext, self).__init__('TAG_LIST', sort_methods=(
             (_('name'), pagination.SimpleSort(_('by name'), 'name', _("sorted alphabetically"))),
@@ -84,8 +114,9 @@ def index(request):
 
 @decorators.render('questions.html', 'unanswered', _('unanswered'), weight=400)
 def unanswered(request):
+    rankings.refresh_if_due()
     return question_list(request,
-                         Question.objects.exclude(id__in=Question.objects.filter(children__marked=True).distinct()).exclude(marked=True),
+                         Question.objects.filter(id__in=RankedQuestion.objects.filter(ranking=rankings.UNANSWERED).values('question')),
                          _('open questions without an accepted answer'),
                          None,
                          _("Unanswered Questions"))
@@ -104,7 +135,7 @@ def tag(request, tag):
         raise Http404
 
     # Getting the questions QuerySet
-    questions = Question.objects.filter(tags__id=tag.id)
+    questions = Question.objects.filter(tags__name=tag.name)
 
     if request.method == "GET":
         user = request.GET.get('user', None)
@@ -211,7 +242,7 @@ def question_list(request, initial,
 
     context = {
         'questions' : questions.distinct(),
-        'questions_count' : questions.count(),
+        'questions_count' : pagination.approximate_count(questions),
         'keywords' : keywords,
         'list_description': list_description,
         'base_path' : base_path,
@@ -257,6 +288,8 @@ def question_search(request, keywords):
         paginator_context = QuestionListPaginatorContext()
         paginator_context.sort_methods[_('ranking')] = pagination.SimpleSort(_('relevance'), sort_order, _("most relevant questions"))
         paginator_context.force_sort = _('ranking')
+        # The relevance can be an extra() select, which rows can't be filtered past
+        paginator_context.keyset = False
     else:
         paginator_context = None
 
@@ -1,4 +1,5 @@
 from forum.models import User
+from forum.models.user import hydrate_users
 from django.db.models import Q, Count
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
 from django.template.defaultfilters import slugify
@@ -22,17 +23,23 @@ from forum.actions import EditProfileAction, FavoriteAction, BonusRepAction, Sus
 from forum.modules import ui
 from forum.utils import pagination
 from forum.views.readers import QuestionListPaginatorContext, AnswerPaginatorContext
-from forum.settings import ONLINE_USERS
+from forum.utils.presence import presence
  
 import time
 import datetime
 import decorators
 
 class UserReputationSort(pagination.SimpleSort):
+    def keys(self):
+        return ('-is_active', self.order_by)
+
     def apply(self, objects):
         return objects.order_by('-is_active', self.order_by)
 
 class UserListPaginatorContext(pagination.PaginatorContext):
+    user_fields = ()
+    keyset = True
+
     def __init__(self, pagesizes=(20, 35, 60), default_pagesize=35):
         super (UserListPaginatorContext, self).__init__('USERS_LIST', sort_methods=(
             (_('reputation'), UserReputationSort(_('reputation'), '-reputation', _("sorted by reputation"))),
@@ -41,6 +48,41 @@ class UserListPaginatorContext(pagination.PaginatorContext):
             (_('name'), pagination.SimpleSort(_('by username'), 'username', _("sorted by username"))),
         ), pagesizes=pagesizes, default_pagesize=default_pagesize)
 
+class OnlineUserList(object):
+    """
+    The online users, most recently seen first. Only the users on the requested page are loaded.
+    """
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            ids = self.ids[k]
+            users = hydrate_users(User.objects.in_bulk(ids).values())
+            return [users[id] for id in ids if id in users]
+
+        return User.objects.get(id=self.ids[k])
+
+class OnlineUsersLastSeenSort(pagination.SortBase):
+    def apply(self, objects):
+        return objects
+
+class OnlineUsersReputationSort(pagination.SortBase):
+    def apply(self, objects):
+        return User.objects.filter(id__in=objects.ids).order_by('-reputation')
+
+class OnlineUsersPaginatorContext(pagination.PaginatorContext):
+    user_fields = ()
+
+    def __init__(self, pagesizes=(20, 35, 60), default_pagesize=35):
+        super (OnlineUsersPaginatorContext, self).__init__('ONLINE_USERS_LIST', sort_methods=(
+            (_('last'), OnlineUsersLastSeenSort(_('last seen'), _("most recently seen users"))),
+            (_('reputation'), OnlineUsersReputationSort(_('reputation'), _("sorted by reputation"))),
+        ), pagesizes=pagesizes, default_pagesize=default_pagesize)
+
 class SubscriptionListPaginatorContext(pagination.PaginatorContext):
     def __init__(self):
         super (SubscriptionListPaginatorContext, self).__init__('SUBSCRIPTION_LIST', pagesizes=(5, 10, 20), default_pagesize=20)
@@ -72,62 +114,15 @@ def users(request):
 @decorators.render('users/online_users.html', 'online_users', _('Online Users'), weight=200, tabbed=False)
 def online_users(request):
     suser = request.REQUEST.get('q', "")
+    ids = [user_id for user_id, last_seen in presence.online()]
 
-    sort = ""
-    if request.GET.get("sort", None):
-        try:
-            sort = int(request.GET["sort"])
-        except ValueError:
-            logging.error('Found invalid sort "%s", loading %s, refered by %s' % (
-                request.GET.get("sort", ''), request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
-            ))
-            raise Http404()
-
-    page = 0
-    if request.GET.get("page", None):
-        try:
-            page = int(request.GET["page"])
-        except ValueError:
-            logging.error('Found invalid page "%s", loading %s, refered by %s' % (
-                request.GET.get("page", ''), request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
-            ))
-            raise Http404()
-
-    pagesize = 10
-    if request.GET.get("pagesize", None):
-        try:
-            pagesize = int(request.GET["pagesize"])
-        except ValueError:
-            logging.error('Found invalid pagesize "%s", loading %s, refered by %s' % (
-                request.GET.get("pagesize", ''), request.path, request.META.get('HTTP_REFERER', 'UNKNOWN')
-            ))
-            raise Http404()
-
-
-    users = None
-    if sort == "reputation":
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.reputation)
-    elif sort == "newest" :
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.newest)
-    elif sort == "last":
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.last)
-    elif sort == "name":
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.name)
-    elif sort == "oldest":
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.oldest)
-    elif sort == "newest":
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.newest)
-    elif sort == "votes":
-        users = sorted(ONLINE_USERS.sets.keys(), key=lambda user: user.votes)
-    else:
-        users = sorted(ONLINE_USERS.iteritems(), key=lambda x: x[1])
+    if suser != "":
+        matching = set(User.objects.filter(id__in=ids, username__icontains=suser).values_list('id', flat=True))
+        ids = [id for id in ids if id in matching]
 
-    return render_to_response('users/online_users.html', {
-        "users" : users,
+    return pagination.paginated(request, ('users', OnlineUsersPaginatorContext()), {
+        "users" : OnlineUserList(ids),
         "suser" : suser,
-        "sort" : sort,
-        "page" : page,
-        "pageSize" : pagesize,
     })
 
 
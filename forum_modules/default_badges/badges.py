@@ -3,22 +3,49 @@ from django.utils.translation import ugettext as _
 from forum.badges.base import AbstractBadge
 from forum.models import Badge
 from forum.actions import *
-from forum.models import Vote, Flag
+from django.db.models import Count, F
+from forum.models import Vote, Flag, Node, User, Action
+from forum.utils import counters
 
 import settings
 
+# Read by badges below, their hooks have to be registered before the badges' own
+revisions = counters.action_count(ReviseAction)
+
+# Helpers for the candidates of the badges, see AbstractBadge.candidates
+
+def _authors_of(nodes, once):
+    for author_id, node_id in nodes.values_list('author', 'id'):
+        yield (author_id, (not once) and node_id or None, None)
+
+def _users_of(actions):
+    for user_id in actions.order_by().values_list('user', flat=True).distinct():
+        yield (user_id, None, None)
+
+def _users_reaching(counts, threshold):
+    for user_id, count in counts.items():
+        if count >= threshold:
+            yield (user_id, None, None)
+
+def _actions_of(actions):
+    for user_id, node_id, action_id in actions.values_list('user', 'node', 'id'):
+        yield (user_id, node_id, action_id)
+
 class QuestionViewBadge(AbstractBadge):
     abstract = True
-    listen_to = (QuestionViewAction,)
+    listen_to = (QuestionViewCountAction,)
 
     @property
     def description(self):
         return _('Asked a question with %s views') % str(self.nviews)
 
     def award_to(self, action):
-        if action.node.extra_count == int(self.nviews):
+        if action.previous_count < int(self.nviews) <= action.view_count:
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter(node_type="question", extra_count__gte=int(self.nviews)), False)
+
 
 class PopularQuestion(QuestionViewBadge):
     name = _('Popular Question')
@@ -44,6 +71,9 @@ class NodeScoreBadge(AbstractBadge):
         if (action.node.node_type == self.node_type) and (action.node.score == int(self.expected_score)):
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter(node_type=self.node_type, score__gte=int(self.expected_score)), False)
+
 
 class QuestionScoreBadge(NodeScoreBadge):
     abstract = True
@@ -100,9 +130,13 @@ class FavoriteQuestionBadge(AbstractBadge):
         return _('Question favorited by %s users') % str(self.expected_count)
 
     def award_to(self, action):
-        if (action.node.node_type == "question") and (action.node.favorite_count == int(self.expected_count)):
+        if (action.node.node_type == "question") and (counters.favorites.get(action.node_id) == int(self.expected_count)):
             return action.node.author
 
+    def candidates(self):
+        favorited = [node_id for node_id, count in counters.favorites.history().items() if count >= int(self.expected_count)]
+        return _authors_of(Node.objects.filter(node_type="question", id__in=favorited), False)
+
 class FavoriteQuestion(FavoriteQuestionBadge):
     type = Badge.SILVER
     name = _("Favorite Question")
@@ -123,6 +157,10 @@ class Disciplined(AbstractBadge):
         if (action.node.author == action.user) and (action.node.score >= int(settings.DISCIPLINED_MIN_SCORE)):
             return action.user
 
+    def candidates(self):
+        return _actions_of(DeleteAction.objects.filter(canceled=False, node__author=F('user'),
+                                                       node__score__gte=int(settings.DISCIPLINED_MIN_SCORE)))
+
 class PeerPressure(AbstractBadge):
     listen_to = (DeleteAction,)
     name = _("Peer Pressure")
@@ -132,10 +170,15 @@ class PeerPressure(AbstractBadge):
         if (action.node.author == action.user) and (action.node.score <= int(settings.PEER_PRESSURE_MAX_SCORE)):
             return action.user
 
+    def candidates(self):
+        return _actions_of(DeleteAction.objects.filter(canceled=False, node__author=F('user'),
+                                                       node__score__lte=int(settings.PEER_PRESSURE_MAX_SCORE)))
+
 
 class Critic(AbstractBadge):
     award_once = True
     listen_to = (VoteDownAction,)
+    recipient = 'user'
     name = _("Critic")
     description = _('First down vote')
 
@@ -143,10 +186,14 @@ class Critic(AbstractBadge):
         if (action.user.vote_down_count == 1):
             return action.user
 
+    def candidates(self):
+        return _users_of(VoteDownAction.objects.filter(canceled=False))
+
 
 class Supporter(AbstractBadge):
     award_once = True
     listen_to = (VoteUpAction,)
+    recipient = 'user'
     name = _("Supporter")
     description = _('First up vote')
 
@@ -154,14 +201,21 @@ class Supporter(AbstractBadge):
         if (action.user.vote_up_count == 1):
             return action.user
 
+    def candidates(self):
+        return _users_of(VoteUpAction.objects.filter(canceled=False))
+
 
 class FirstActionBadge(AbstractBadge):
     award_once = True
     abstract = True
+    recipient = 'user'
 
     def award_to(self, action):
-        if (self.listen_to[0].objects.filter(user=action.user).count() == 1):
-            return action.user
+        # Users that already have the badge don't get here
+        return action.user
+
+    def candidates(self):
+        return _users_of(self.listen_to[0].objects.filter(canceled=False))
 
 class CitizenPatrol(FirstActionBadge):
     listen_to = (FlagAction,)
@@ -192,6 +246,7 @@ class Cleanup(FirstActionBadge):
 class Autobiographer(AbstractBadge):
     award_once = True
     listen_to = (EditProfileAction,)
+    recipient = 'user'
     name = _("Autobiographer")
     description = _('Completed all user profile fields')
 
@@ -201,11 +256,20 @@ class Autobiographer(AbstractBadge):
                 user.date_of_birth and user.about:
             return user
 
+    def candidates(self):
+        users = User.objects.filter(date_of_birth__isnull=False)
+
+        for field in ('email', 'real_name', 'website', 'location', 'about'):
+            users = users.exclude(**{field: ''})
+
+        return [(user_id, None, None) for user_id in users.values_list('id', flat=True)]
+
 
 class CivicDuty(AbstractBadge):
     type = Badge.SILVER
     award_once = True
     listen_to = (VoteUpAction, VoteDownAction)
+    recipient = 'user'
     name = _("Civic Duty")
     description = _('Voted %s times') % settings.CIVIC_DUTY_VOTES
 
@@ -213,18 +277,26 @@ class CivicDuty(AbstractBadge):
         if (action.user.vote_up_count + action.user.vote_down_count) == int(settings.CIVIC_DUTY_VOTES):
             return action.user
 
+    def candidates(self):
+        votes = Action.objects.filter(action_type__in=(VoteUpAction.get_type(), VoteDownAction.get_type()), canceled=False)
+        return _users_reaching(dict([(row['user'], row['count']) for row in
+                                     votes.order_by().values('user').annotate(count=Count('id'))]), int(settings.CIVIC_DUTY_VOTES))
+
 
 class Pundit(AbstractBadge):
     award_once = True
     listen_to = (CommentAction,)
+    recipient = 'user'
     name = _("Pundit")
     description = _('Left %s comments') % settings.PUNDIT_COMMENT_COUNT
 
     def award_to(self, action):
-        if action.user.nodes.filter_state(deleted=False).filter(node_type="comment").count() == int(
-                settings.PUNDIT_COMMENT_COUNT):
+        if counters.comments.get(action.user_id) >= int(settings.PUNDIT_COMMENT_COUNT):
             return action.user
 
+    def candidates(self):
+        return _users_reaching(counters.comments.history(), int(settings.PUNDIT_COMMENT_COUNT))
+
 
 class SelfLearner(AbstractBadge):
     listen_to = (VoteUpAction, )
@@ -236,47 +308,62 @@ class SelfLearner(AbstractBadge):
         action.node.score == int(settings.SELF_LEARNER_UP_VOTES)):
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter(node_type="answer", author=F('parent__author'),
+                                               score__gte=int(settings.SELF_LEARNER_UP_VOTES)), False)
+
 
 class StrunkAndWhite(AbstractBadge):
     type = Badge.SILVER
     award_once = True
     listen_to = (ReviseAction,)
+    recipient = 'user'
     name = _("Strunk & White")
     description = _('Edited %s entries') % settings.STRUNK_AND_WHITE_EDITS
 
     def award_to(self, action):
-        if (ReviseAction.objects.filter(user=action.user).count() == int(settings.STRUNK_AND_WHITE_EDITS)):
+        if revisions.get(action.user_id) >= int(settings.STRUNK_AND_WHITE_EDITS):
             return action.user
 
+    def candidates(self):
+        return _users_reaching(revisions.history(), int(settings.STRUNK_AND_WHITE_EDITS))
+
 
 class Student(AbstractBadge):
     award_once = True
     listen_to = (VoteUpAction,)
+    recipient = 'author'
     name = _("Student")
     description = _('Asked first question with at least one up vote')
 
     def award_to(self, action):
-        if (action.node.node_type == "question") and (action.node.author.nodes.filter_state(deleted=False).filter(
-                node_type="question", score=1).count() == 1):
+        if (action.node.node_type == "question") and (action.node.score >= 1):
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter_state(deleted=False).filter(node_type="question", score__gte=1), True)
+
 
 class Teacher(AbstractBadge):
     award_once = True
     listen_to = (VoteUpAction,)
+    recipient = 'author'
     name = _("Teacher")
     description = _('Answered first question with at least one up vote')
 
     def award_to(self, action):
-        if (action.node.node_type == "answer") and (action.node.author.nodes.filter_state(deleted=False).filter(
-                node_type="answer", score=1).count() == 1):
+        if (action.node.node_type == "answer") and (action.node.score >= 1):
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter_state(deleted=False).filter(node_type="answer", score__gte=1), True)
+
 
 class Enlightened(AbstractBadge):
     type = Badge.SILVER
     award_once = True
     listen_to = (VoteUpAction, AcceptAnswerAction)
+    recipient = 'author'
     name = _("Enlightened")
     description = _('First answer was accepted with at least %s up votes') % settings.ENLIGHTENED_UP_VOTES
 
@@ -285,6 +372,10 @@ class Enlightened(AbstractBadge):
         action.node.score >= int(settings.ENLIGHTENED_UP_VOTES)):
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter(node_type="answer", marked=True,
+                                               score__gte=int(settings.ENLIGHTENED_UP_VOTES)), True)
+
 
 class Guru(AbstractBadge):
     type = Badge.SILVER
@@ -297,6 +388,9 @@ class Guru(AbstractBadge):
         action.node.score >= int(settings.GURU_UP_VOTES)):
             return action.node.author
 
+    def candidates(self):
+        return _authors_of(Node.objects.filter(node_type="answer", marked=True, score__gte=int(settings.GURU_UP_VOTES)), False)
+
 
 class Necromancer(AbstractBadge):
     type = Badge.SILVER
@@ -311,6 +405,14 @@ class Necromancer(AbstractBadge):
         ) and (int(action.node.score) == int(settings.NECROMANCER_UP_VOTES)):
             return action.node.author
 
+    def candidates(self):
+        later = timedelta(days=int(settings.NECROMANCER_DIF_DAYS))
+        answers = Node.objects.filter(node_type="answer", score__gte=int(settings.NECROMANCER_UP_VOTES))
+
+        for author_id, node_id, added_at, asked_at in answers.values_list('author', 'id', 'added_at', 'parent__added_at'):
+            if asked_at and added_at >= asked_at + later:
+                yield (author_id, node_id, None)
+
 class Taxonomist(AbstractBadge):
     type = Badge.SILVER
     listen_to = tuple()
@@ -326,6 +428,10 @@ class ValidatedEmail(AbstractBadge):
     name = _("Validated Email")
     description = _("User who has validated email associated to the account")
     award_once = True
+    recipient = 'user'
 
     def award_to(self, action):
-        return action.user
\ No newline at end of file
+        return action.user
+
+    def candidates(self):
+        return [(user_id, None, None) for user_id in User.objects.filter(email_isvalid=True).values_list('id', flat=True)]
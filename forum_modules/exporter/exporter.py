@@ -6,7 +6,7 @@ from django.core.cache import cache
 from django.utils.translation import ugettext as _
 from forum.models import *
 from forum.settings import APP_URL
-from forum.templatetags.extra_tags import diff_date
+from forum.utils.progress import Progress
 import xml.etree.ElementTree
 from xml.etree import ElementTree as ET
 from xml.etree.ElementTree import Comment, _encode, ProcessingInstruction, QName, _escape_attrib, _escape_cdata, _namespace_map
@@ -50,6 +50,9 @@ META_INF_SECTION = 'Meta'
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 DATE_FORMAT = "%Y-%m-%d"
 
+# Rows read from the database at a time, each chunk starts past the last id of the previous one
+EXPORT_CHUNK_SIZE = 500
+
 def Etree_pretty__write(self, file, node, encoding, namespaces,
                         level=0, identator="    "):
     tag = node.tag
@@ -159,9 +162,38 @@ def make_extra(el, v):
     else:
         value.text = unicode(v)
 
-def write_to_file(root, tmp, filename):
-    tree = ET.ElementTree(root)
-    tree.write(os.path.join(tmp, filename), encoding='UTF-8')
+class XmlFileWriter(object):
+    """
+    Writes a root element to a file one child at a time, so that only the row being exported is kept in memory.
+    The output is the same ElementTree.write gives for the whole tree.
+    """
+    def __init__(self, path, root_tag, encoding='UTF-8'):
+        self.file = open(path, 'wb')
+        self.root_tag = root_tag
+        self.encoding = encoding
+        self.empty = True
+
+        self.file.write("<?xml version='1.0' encoding='%s'?>\n" % encoding)
+
+    def write(self, el):
+        if self.empty:
+            self.file.write("<%s>" % self.root_tag)
+            self.empty = False
+
+        data = ET.tostring(el, self.encoding)
+
+        if data.startswith('<?xml'):
+            data = data[data.index('?>') + 2:].lstrip('\n')
+
+        self.file.write(data)
+
+    def close(self):
+        if self.empty:
+            self.file.write("<%s />" % self.root_tag)
+        else:
+            self.file.write("</%s>" % self.root_tag)
+
+        self.file.close()
 
 def create_targz(tmp, files, start_time, options, user, state, set_state, file_format):
     now = datetime.datetime.now()
@@ -178,7 +210,7 @@ def create_targz(tmp, files, start_time, options, user, state, set_state, file_f
         full_fname = "%s.tar.gz" % fname
 
     if file_format == 'zip':
-        t = zipfile.ZipFile(os.path.join(selfsettings.EXPORTER_BACKUP_STORAGE, full_fname), 'w')
+        t = zipfile.ZipFile(os.path.join(selfsettings.EXPORTER_BACKUP_STORAGE, full_fname), 'w', zipfile.ZIP_DEFLATED, True)
 
         def add_to_file(f, a):
             t.write(f, a)
@@ -268,45 +300,17 @@ def export(options, user):
 
     steps = [s for s in EXPORT_STEPS if not (anon_data and s['fn'].is_user_data())]
 
-    state = dict([(s['id'], {
-        'status': _('Queued'), 'count': s['fn'].count(start_time), 'parsed': 0
-    }) for s in steps] + [
-        ('overall', {
-            'status': _('Starting'), 'count': sum([s['fn'].count(start_time) for s in steps]), 'parsed': 0
-        })
-    ])
-
-    full_state = dict(running=True, state=state, time_started="")
-
-    def set_state():
-        full_state['time_started'] = diff_date(start_time)
-        cache.set(CACHE_KEY, full_state)
-
-    set_state()
-
-    def ping_state(name):
-        state[name]['parsed'] += 1
-        state['overall']['parsed'] += 1
-        set_state()
+    progress = Progress(CACHE_KEY, [(s['id'], s['fn'].count(start_time)) for s in steps])
 
     def run(fn, name):
         def ping():
-            ping_state(name)
+            progress.ping(name)
 
-        state['overall']['status'] = _('Exporting %s') % s['name']
-        state[name]['status'] = _('Exporting')
+        progress.start(name, _('Exporting'), _('Exporting %s') % s['name'])
 
-        root, fname = fn(ping, start_time, anon_data)
+        fname = fn(ping, start_time, anon_data, tmp)
 
-        state[name]['status'] = _('Writing temp file')
-        state['overall']['status'] = _('Writing %s temp file') % s['name']
-
-        set_state()
-
-        write_to_file(root, tmp, fname)
-        state[name]['status'] = _('Done')
-
-        set_state()
+        progress.done(name, _('Done'))
 
         return fname
 
@@ -316,20 +320,12 @@ def export(options, user):
         for s in steps:
             dump_files.append(run(s['fn'], s['id']))
 
-        state['overall']['status'] = _('Compressing files')
-        set_state()
-
-        fname = create_targz(tmp, dump_files, start_time, options, user, state, set_state, options['file_format'])
-        full_state['running'] = False
-        full_state['errors'] = False
-        state['overall']['status'] = _('Done')
-        state['overall']['fname'] = fname
+        progress.status('overall', _('Compressing files'))
 
-        set_state()
+        fname = create_targz(tmp, dump_files, start_time, options, user, progress.state, progress.publish, options['file_format'])
+        progress.finish(status=_('Done'), fname=fname)
     except Exception, e:
-        full_state['running'] = False
-        full_state['errors'] = "%s: %s" % (e.__class__.__name__, unicode(e))
-        set_state()
+        progress.finish("%s: %s" % (e.__class__.__name__, unicode(e)))
         
         import traceback
         logging.error("Error executing xml backup: \n %s" % (traceback.format_exc()))
@@ -346,15 +342,40 @@ def exporter_step(queryset, root_tag_name, el_tag_name, name, date_lock=None, us
                 return queryset.filter(**{"%s__lte" % date_lock: lock})
             return queryset
 
-        def decorated(ping, lock, anon_data):
-            root = ET.Element(root_tag_name)
+        def rows(lock):
+            rows = qs(lock)
+
+            # Each row is read once, don't fill the cache with them
+            if hasattr(rows, '_base_clone'):
+                rows = rows._base_clone()
+
+            last = 0
+
+            while True:
+                chunk = list(rows.filter(id__gt=last).order_by('id').select_related()[:EXPORT_CHUNK_SIZE])
+
+                if not chunk:
+                    break
+
+                for item in chunk:
+                    yield item
+
+                last = chunk[-1].id
+
+        def decorated(ping, lock, anon_data, tmp):
+            fname = "%s.xml" % root_tag_name
+            writer = XmlFileWriter(os.path.join(tmp, fname), root_tag_name)
 
-            for item in qs(lock).order_by('id').select_related():
-                el = root.add(el_tag_name)
-                fn(item, el, anon_data)
-                ping()
+            try:
+                for item in rows(lock):
+                    el = ET.Element(el_tag_name)
+                    fn(item, el, anon_data)
+                    writer.write(el)
+                    ping()
+            finally:
+                writer.close()
 
-            return root, "%s.xml" % root_tag_name
+            return fname
 
         def count(lock):
             return qs(lock).count()
@@ -364,6 +385,7 @@ def exporter_step(queryset, root_tag_name, el_tag_name, name, date_lock=None, us
 
         decorated.count = count
         decorated.is_user_data = is_user_data
+        decorated.export_row = fn
 
         EXPORT_STEPS.append(dict(id=root_tag_name, name=name, fn=decorated))
 
@@ -5,12 +5,14 @@ import os, tarfile, datetime, ConfigParser, logging
 from django.utils.translation import ugettext as _
 from django.core.cache import cache
 
+from django.db import connection
 from south.db import db
 
 from xml.sax import make_parser
 from xml.sax.handler import ContentHandler, ErrorHandler
 
-from forum.templatetags.extra_tags import diff_date
+from forum.utils.progress import Progress
+from forum.utils.bulk import BulkWriter, RowWriter
 
 from exporter import TMP_FOLDER, DATETIME_FORMAT, DATE_FORMAT, META_INF_SECTION, CACHE_KEY
 from orm import orm
@@ -20,15 +22,18 @@ NO_DEFAULT = object()
 
 import string
 
+# Every byte that isn't in string.printable, stripped from the backup files before parsing
+NON_PRINTABLE = "".join([chr(c) for c in range(256) if not chr(c) in string.printable])
+
 class SafeReader():
     def __init__(self, loc):
         self.base = open(loc)
 
     def read(self, *args):
-        return "".join(c for c in self.base.read(*args) if c in string.printable)
+        return self.base.read(*args).translate(None, NON_PRINTABLE)
 
     def readLine(self, *args):
-        return "".join(c for c in self.base.readLine(*args) if c in string.printable)
+        return self.base.readLine(*args).translate(None, NON_PRINTABLE)
 
     def close(self):
         self.base.close()
@@ -204,12 +209,16 @@ def disable_triggers():
         db.start_transaction()
         db.execute_many(commands.PG_DISABLE_TRIGGERS)
         db.commit_transaction()
+    elif db.backend_name == "mysql":
+        db.execute("SET FOREIGN_KEY_CHECKS = 0")
 
 def enable_triggers():
     if db.backend_name == "postgres":
         db.start_transaction()
         db.execute_many(commands.PG_ENABLE_TRIGGERS)
         db.commit_transaction()
+    elif db.backend_name == "mysql":
+        db.execute("SET FOREIGN_KEY_CHECKS = 1")
 
 def reset_sequences():
     if db.backend_name == "postgres":
@@ -224,52 +233,33 @@ FILE_HANDLERS = []
 
 def start_import(fname, tag_merge, user):
 
-    start_time = datetime.datetime.now()
     steps = [s for s in FILE_HANDLERS]
 
     with open(os.path.join(TMP_FOLDER, 'backup.inf'), 'r') as inffile:
         inf = ConfigParser.SafeConfigParser()
         inf.readfp(inffile)
 
-        state = dict([(s['id'], {
-            'status': _('Queued'), 'count': int(inf.get(META_INF_SECTION, s['id'])), 'parsed': 0
-        }) for s in steps] + [
-            ('overall', {
-                'status': _('Starting'), 'count': int(inf.get(META_INF_SECTION, 'overall')), 'parsed': 0
-            })
-        ])
-
-    full_state = dict(running=True, state=state, time_started="")
-
-    def set_state():
-        full_state['time_started'] = diff_date(start_time)
-        cache.set(CACHE_KEY, full_state)
-
-    set_state()
+        progress = Progress(CACHE_KEY, [(s['id'], int(inf.get(META_INF_SECTION, s['id']))) for s in steps],
+                            int(inf.get(META_INF_SECTION, 'overall')))
 
-    def ping_state(name):
-        state[name]['parsed'] += 1
-        state['overall']['parsed'] += 1
-        set_state()
+    # New rows are written in batches, with every id given out in advance, unless the batch size is 0
+    batch_size = int(settings.IMPORT_BATCH_SIZE)
 
     data = {
         'is_merge': True,
-        'tag_merge': tag_merge
+        'tag_merge': tag_merge,
+        'writer': batch_size and BulkWriter(batch_size) or RowWriter()
     }
 
     def run(fn, name):
         def ping():
-            ping_state(name)
-
-        state['overall']['status'] = _('Importing %s') % s['name']
-        state[name]['status'] = _('Importing')
+            progress.ping(name)
 
+        progress.start(name, _('Importing'), _('Importing %s') % s['name'])
 
         fn(TMP_FOLDER, user, ping, data)
 
-        state[name]['status'] = _('Done')
-
-        set_state()
+        progress.done(name, _('Done'))
 
         return fname
 
@@ -281,8 +271,8 @@ def start_import(fname, tag_merge, user):
         disable_triggers()
         db.start_transaction()
 
-        for h in FILE_HANDLERS:
-            run(h['fn'], h['id'])
+        for s in steps:
+            run(s['fn'], s['id'])
 
         db.commit_transaction()
         enable_triggers()
@@ -290,10 +280,10 @@ def start_import(fname, tag_merge, user):
         settings.MERGE_MAPPINGS.set_value(dict(merged_nodes=data['nodes_map'], merged_users=data['users_map']))
 
         reset_sequences()
+
+        progress.finish(status=_('Done'))
     except Exception, e:
-        full_state['running'] = False
-        full_state['errors'] = "%s: %s" % (e.__class__.__name__, unicode(e))
-        set_state()
+        progress.finish("%s: %s" % (e.__class__.__name__, unicode(e)))
 
         import traceback
         logging.error("Error executing xml import: \n %s" % (traceback.format_exc()))
@@ -305,9 +295,9 @@ def file_handler(file_name, root_tag, el_tag, name, args_handler=None, pre_callb
                 pre_callback(current_user, data)
 
             if (args_handler):
-                args = args_handler(current_user, data)
+                args = [data['writer']] + args_handler(current_user, data)
             else:
-                args = []
+                args = [data['writer']]
 
             parser = make_parser()
             handler = TableHandler(root_tag, el_tag, fn, args, ping)
@@ -316,6 +306,8 @@ def file_handler(file_name, root_tag, el_tag, name, args_handler=None, pre_callb
 
             parser.parse(SafeReader(os.path.join(location, file_name)))
 
+            data['writer'].flush()
+
             if post_callback:
                 post_callback()
 
@@ -323,27 +315,39 @@ def file_handler(file_name, root_tag, el_tag, name, args_handler=None, pre_callb
         return decorated
     return decorator
 
-def verify_existence(row):
-    try:
-        return orm.User.objects.get(email=row.getc('email'))
-    except:
+def verify_existence(row, writer, known):
+    id = known['emails'].get(row.getc('email'), None)
+
+    if id is None:
         for key in row.get('authKeys').get_list('key'):
             key = key=key.getc('key')
 
             if not ("google.com" in key or "yahoo.com" in key):
-                try:
-                    return orm.AuthKeyUserAssociation.objects.get(key=key).user
-                except:
-                    pass
+                id = known['keys'].get(key, None)
 
-    return None
+                if id is not None:
+                    break
+
+    if id is None:
+        return None
+
+    # The user may still be waiting to be written
+    writer.flush()
+    return orm.User.objects.get(id=id)
 
 def user_import_pre_callback(user, data):
     data['users_map'] = {}
 
-@file_handler('users.xml', 'users', 'user', _('Users'), pre_callback=user_import_pre_callback, args_handler=lambda u, d: [u, d['is_merge'], d['users_map']])
-def user_import(row, current_user, is_merge, users_map):
-    existent = is_merge and verify_existence(row) or None
+    # Looked up in memory, users and keys added by this import aren't in the database until the next flush
+    data['known_users'] = {
+        'emails': dict(orm.User.objects.values_list('email', 'id')),
+        'keys': dict(orm.AuthKeyUserAssociation.objects.values_list('key', 'user_id')),
+        'usernames': set(orm.User.objects.values_list('username', flat=True)),
+    }
+
+@file_handler('users.xml', 'users', 'user', _('Users'), pre_callback=user_import_pre_callback, args_handler=lambda u, d: [u, d['is_merge'], d['users_map'], d['known_users']])
+def user_import(row, writer, current_user, is_merge, users_map, known):
+    existent = is_merge and verify_existence(row, writer, known) or None
 
     roles = row.get('roles').get_listc('role')
     valid_email = row.get('email').get_attr('validated').as_bool()
@@ -363,7 +367,7 @@ def user_import(row, current_user, is_merge, users_map):
         if is_merge:
             username_count = 0
 
-            while orm.User.objects.filter(username=username).count():
+            while username in known['usernames']:
                 username_count += 1
                 username = "%s %s" % (row.getc('username'), username_count)
 
@@ -388,15 +392,21 @@ def user_import(row, current_user, is_merge, users_map):
                 location      = row.getc('location'),
         )
 
-    user.save()
+    if existent:
+        user.save()
+    else:
+        writer.save(user)
 
     users_map[row.get('id').as_int()] = user.id
+    known['emails'].setdefault(user.email, user.id)
+    known['usernames'].add(user.username)
 
     authKeys = row.get('authKeys')
 
     for key in authKeys.get_list('key'):
-        if (not is_merge) or orm.AuthKeyUserAssociation.objects.filter(key=key.getc('key')).count() == 0:
-            orm.AuthKeyUserAssociation(user=user, key=key.getc('key'), provider=key.getc('provider')).save()
+        if (not is_merge) or not key.getc('key') in known['keys']:
+            writer.save(orm.AuthKeyUserAssociation(user=user, key=key.getc('key'), provider=key.getc('provider')))
+            known['keys'][key.getc('key')] = user.id
 
     if not existent:
         notifications = row.get('notifications')
@@ -405,12 +415,17 @@ def user_import(row, current_user, is_merge, users_map):
         attributes.update(dict([(str(k), v.as_bool()) for k, v in notifications.get('autoSubscribe').attrs.items()]))
         attributes.update(dict([(str("notify_%s" % k), v.as_bool()) for k, v in notifications.get('notifyOnSubscribed').attrs.items()]))
 
+        # Backups from older versions carry settings that were dropped since
+        fields = orm.SubscriptionSettings._meta.get_all_field_names()
+        attributes = dict([(k, v) for k, v in attributes.items() if k in fields])
+
         ss = orm.SubscriptionSettings(user=user, enable_notifications=notifications.get_attr('enabled').as_bool(), **attributes)
 
         if current_user.id == row.get('id').as_int():
             ss.id = current_user.subscription_settings.id
-
-        ss.save()
+            ss.save()
+        else:
+            writer.save(ss)
         
 
 def pre_tag_import(user, data):
@@ -418,7 +433,7 @@ def pre_tag_import(user, data):
 
 
 @file_handler('tags.xml', 'tags', 'tag', _('Tags'), pre_callback=pre_tag_import, args_handler=lambda u, d: [d['is_merge'], d['tag_merge'], d['users_map'], d['tag_mappings']])
-def tag_import(row, is_merge, tag_merge, users_map, tag_mappings):
+def tag_import(row, writer, is_merge, tag_merge, users_map, tag_mappings):
     created_by = row.get('used').as_int()
     created_by = users_map.get(created_by, created_by)
 
@@ -428,18 +443,18 @@ def tag_import(row, is_merge, tag_merge, users_map, tag_mappings):
     if is_merge and tag_name in tag_mappings:
         tag = tag_mappings[tag_name]
         tag.used_count += row.get('used').as_int()
+        tag.save()
     else:
         tag = orm.Tag(name=tag_name, used_count=row.get('used').as_int(), created_by_id=created_by)
+        writer.save(tag)
         tag_mappings[tag.name] = tag
 
-    tag.save()
-
 def pre_node_import(user, data):
     data['nodes_map'] = {}
 
 @file_handler('nodes.xml', 'nodes', 'node', _('Nodes'), pre_callback=pre_node_import,
               args_handler=lambda u, d: [d['is_merge'], d['tag_merge'], d['tag_mappings'], d['nodes_map'], d['users_map']])
-def node_import(row, is_merge, tag_merge, tags, nodes_map, users_map):
+def node_import(row, writer, is_merge, tag_merge, tags, nodes_map, users_map):
 
     ntags = []
 
@@ -477,11 +492,11 @@ def node_import(row, is_merge, tag_merge, tags, nodes_map, users_map):
             extra         = row.get('extraData').as_pickled()
     )
 
-    node.save()
+    writer.reserve(node)
 
     nodes_map[row.get('id').as_int()] = node.id
 
-    node.tags = ntags
+    writer.relate(node, 'tags', ntags)
 
     revisions = row.get('revisions')
     active = revisions.get_attr('active').as_int()
@@ -498,7 +513,7 @@ def node_import(row, is_merge, tag_merge, tags, nodes_map, users_map):
             title = row.getc('title'),
         )
 
-        active.save()
+        writer.save(active)
     else:
         for r in revisions.get_list('revision'):
             author = row.get('author').as_int()
@@ -514,12 +529,12 @@ def node_import(row, is_merge, tag_merge, tags, nodes_map, users_map):
                 title = r.getc('title'),
             )
 
-            rev.save()
+            writer.save(rev)
             if rev.revision == active:
                 active = rev
 
     node.active_revision = active
-    node.save()
+    writer.save(node)
 
 POST_ACTION = {}
 
@@ -533,16 +548,25 @@ def post_action(*types):
 def pre_action_import_callback(user, data):
     data['actions_map'] = {}
 
+    # Votes and states can't be repeated, those already given are looked up in memory
+    data['action_rows'] = {
+        'votes': set(orm.Vote.objects.values_list('user_id', 'node_id')),
+        'states': set(orm.NodeState.objects.values_list('node_id', 'state_type')),
+    }
+
 def post_action_import_callback():
-    with_state = orm.Node.objects.filter(id__in=orm.NodeState.objects.values_list('node_id', flat=True).distinct())
+    states = {}
+
+    for node_id, state_type in orm.NodeState.objects.order_by('id').values_list('node_id', 'state_type'):
+        states[node_id] = states.get(node_id, "") + "(%s)" % state_type
 
-    for n in with_state:
-        n.state_string = "".join(["(%s)" % s for s in n.states.values_list('state_type')])
-        n.save()
+    qn = connection.ops.quote_name
+    connection.cursor().executemany("UPDATE %s SET %s = %%s WHERE %s = %%s" % (
+        qn(orm.Node._meta.db_table), qn('state_string'), qn('id')), [(s, id) for id, s in states.items()])
 
 @file_handler('actions.xml', 'actions', 'action', _('Actions'), post_callback=post_action_import_callback,
-              pre_callback=pre_action_import_callback, args_handler=lambda u, d: [d['nodes_map'], d['users_map'], d['actions_map']])
-def actions_import(row, nodes, users, actions_map):
+              pre_callback=pre_action_import_callback, args_handler=lambda u, d: [d['nodes_map'], d['users_map'], d['actions_map'], d['action_rows']])
+def actions_import(row, writer, nodes, users, actions_map, action_rows):
     node = row.get('node').as_int(None)
     user = row.get('user').as_int()
     real_user = row.get('realUser').as_int(None)
@@ -566,52 +590,52 @@ def actions_import(row, nodes, users, actions_map):
         action.canceled_at = canceled.getc('date') #.as_datetime(),
         action.canceled_ip = canceled.getc('ip')
 
-    action.save()
+    writer.save(action)
 
     actions_map[row.get('id').as_int()] = action.id
 
     for r in row.get('reputes').get_list('repute'):
         by_canceled = r.get_attr('byCanceled').as_bool()
 
-        orm.ActionRepute(
+        writer.save(orm.ActionRepute(
             action = action,
             user_id = users[r.get('user').as_int()],
             value = r.get('value').as_int(),
 
             date = by_canceled and action.canceled_at or action.action_date,
             by_canceled = by_canceled
-        ).save()
+        ))
 
     if (not action.canceled) and (action.action_type in POST_ACTION):
-        POST_ACTION[action.action_type](row, action, users, nodes, actions_map)
+        POST_ACTION[action.action_type](row, writer, action, users, nodes, actions_map, action_rows)
 
 
 
 
-# Record of all persisted votes.
-persisted_votes = []
 @post_action('voteup', 'votedown', 'voteupcomment')
-def vote_action(row, action, users, nodes, actions):
+def vote_action(row, writer, action, users, nodes, actions, action_rows):
     # Check to see if the vote has already been registered.
-    if not (action.user_id, action.node_id) in persisted_votes:
+    if not (action.user_id, action.node_id) in action_rows['votes']:
         # Persist the vote action.
-        orm.Vote(user_id=action.user_id, node_id=action.node_id, action=action,
-                 voted_at=action.action_date, value=(action.action_type != 'votedown') and 1 or -1).save()
+        writer.save(orm.Vote(user_id=action.user_id, node_id=action.node_id, action=action,
+                 voted_at=action.action_date, value=(action.action_type != 'votedown') and 1 or -1))
 
         # Record the vote action.  This will help us avoid duplicates.
-        persisted_votes.append((action.user_id, action.node_id))
+        action_rows['votes'].add((action.user_id, action.node_id))
 
 
 def state_action(state):
-    def fn(row, action, users, nodes, actions):
-        if orm.NodeState.objects.filter(state_type = state, node = action.node_id).count():
+    def fn(row, writer, action, users, nodes, actions, action_rows):
+        if (action.node_id, state) in action_rows['states']:
             return
 
-        orm.NodeState(
+        writer.save(orm.NodeState(
             state_type = state,
             node_id = action.node_id,
             action = action
-        ).save()
+        ))
+
+        action_rows['states'].add((action.node_id, state))
     return fn
 
 post_action('wikify')(state_action('wiki'))
@@ -621,16 +645,17 @@ post_action('publish')(state_action('published'))
 
 
 @post_action('flag')
-def flag_action(row, action, users, nodes, actions):
-    orm.Flag(user_id=action.user_id, node_id=action.node_id, action=action, reason=action.extra or "").save()
+def flag_action(row, writer, action, users, nodes, actions, action_rows):
+    writer.save(orm.Flag(user_id=action.user_id, node_id=action.node_id, action=action, reason=action.extra or ""))
 
 
 def award_import_args(user, data):
-    return [ dict([ (b.cls, b) for b in orm.Badge.objects.all() ]) , data['nodes_map'], data['users_map'], data['actions_map']]
+    return [ dict([ (b.cls, b) for b in orm.Badge.objects.all() ]) , data['nodes_map'], data['users_map'], data['actions_map'],
+             set(orm.Award.objects.values_list('user_id', 'badge_id', 'node_id'))]
 
 
 @file_handler('awards.xml', 'awards', 'award', _('Awards'), args_handler=award_import_args)
-def awards_import(row, badges, nodes, users, actions):
+def awards_import(row, writer, badges, nodes, users, actions, awarded):
     badge_type = badges.get(row.getc('badge'), None)
 
     if not badge_type:
@@ -641,16 +666,20 @@ def awards_import(row, badges, nodes, users, actions):
     node = row.get('node').as_int(None)
     user = row.get('user').as_int()
 
-    if orm.Award.objects.filter(badge=badges[row.getc('badge')], user=users.get(user, user), node=nodes.get(node, node)).count():
+    key = (users.get(user, user), badge_type.id, nodes.get(node, node))
+
+    if key in awarded:
         return
 
-    award = orm.Award(
+    writer.save(orm.Award(
         user_id = users.get(user, user),
         badge = badge_type,
         node_id = nodes.get(node, node),
         action_id = actions.get(action, action),
         trigger_id = actions.get(trigger, trigger)
-    ).save()
+    ))
+
+    awarded.add(key)
 
 
 #@file_handler('settings.xml', 'settings', 'setting', _('Settings'))
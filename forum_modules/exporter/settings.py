@@ -10,4 +10,8 @@ EXPORTER_BACKUP_STORAGE = Setting('EXPORTER_BACKUP_STORAGE', os.path.join(os.pat
 label = _("Backups storage"),
 help_text = _("A folder to keep your backups organized.")))
 
+IMPORT_BATCH_SIZE = Setting('IMPORT_BATCH_SIZE', 1000, EXPORTER_SET, dict(
+label = _("Import batch size"),
+help_text = _("New rows of each table written together when importing a backup, 0 saves them one at a time.")))
+
 MERGE_MAPPINGS = Setting('MERGE_MAPPINGS', {})
\ No newline at end of file
@@ -73,8 +73,26 @@ def running(request, mode):
         'steps': EXPORT_STEPS
     })
 
+def speed(step, running):
+    if not step.get('rate'):
+        return ''
+
+    speed = _('%d rows/s') % step['rate']
+
+    if running and step.get('eta') and step['parsed'] < step['count']:
+        eta = step['eta']
+        speed += ', ' + _('%s left') % ('%d:%02d:%02d' % (eta / 3600, eta / 60 % 60, eta % 60))
+
+    return speed
+
 def state(request):
-    return HttpResponse(simplejson.dumps(cache.get(CACHE_KEY)), mimetype="application/json")
+    full_state = cache.get(CACHE_KEY)
+
+    if full_state:
+        for step in full_state['state'].values():
+            step['speed'] = speed(step, full_state['running'])
+
+    return HttpResponse(simplejson.dumps(full_state), mimetype="application/json")
 
 @admin_page
 def download(request):
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 
+from __future__ import with_statement
+
 from datetime import datetime
 import time
 import re
 import os
-import gc
+import logging
+from array import array
+from collections import deque
+from multiprocessing import Pool, cpu_count
 from django.utils.translation import ugettext as _
+from django.db import connection, transaction
+from django.db.models import Count, Sum
 
 from django.utils.encoding import force_unicode
 
@@ -21,6 +28,8 @@ from zlib import compress, decompress
 from xml.sax import make_parser
 from xml.sax.handler import ContentHandler
 
+from forum.utils.bulk import BulkWriter
+
 def create_orm():
     from django.conf import settings
     from south.orm import FakeORM
@@ -173,31 +182,369 @@ class UnknownYahooUser(UnknownUser):
         return _("user-%(id)s (yahoo)") % {'id': self._id}
 
 
-class IdMapper(dict):
+class IdMap(object):
+    """
+    Ids of the dump mapped to ids in the database, held in an array indexed by the dump id where 0 stands for an id
+    that isn't mapped, so millions of them take four bytes each. Negative ids, like the one of the community user,
+    always map to the default.
+
+    The pairs set since the last sync are appended to fname when synced, the first size pairs of it are read back when
+    an import is resumed. Without a fname the map is only kept in memory.
+    """
+    def __init__(self, fname=None, default=0, size=0):
+        self.fname = fname
+        self.default = default
+        self.values = array('i')
+        self.pending = array('i')
+        self.count = 0
+        self.size = size
+
+        if fname:
+            pairs = array('i')
+
+            if size:
+                with open(fname, 'rb') as f:
+                    pairs.fromfile(f, size * 2)
+
+            for i in range(0, len(pairs), 2):
+                self._set(pairs[i], pairs[i + 1])
+
+            # Pairs past size were synced for a chunk that never made it to the database
+            with open(fname, 'ab') as f:
+                f.truncate(size * 2 * pairs.itemsize)
+
+    def _set(self, key, value):
+        if key >= len(self.values):
+            self.values.extend(array('i', [0]) * (key + 1 - len(self.values)))
+
+        if not self.values[key]:
+            self.count += 1
+
+        self.values[key] = value
+
+    def __setitem__(self, key, value):
+        key, value = int(key), int(value)
+
+        if key < 0:
+            return
+
+        self._set(key, value)
 
-    def __init__(self):
-        self.default = 1
+        if self.fname:
+            self.pending.extend((key, value))
 
     def __getitem__(self, key):
         key = int(key)
-        return super(IdMapper, self).get(key, self.default)
 
-    def __setitem__(self, key, value):
-        super(IdMapper, self).__setitem__(int(key), int(value))
+        if 0 <= key < len(self.values) and self.values[key]:
+            return self.values[key]
+
+        return self.default
+
+    def __contains__(self, key):
+        key = int(key)
+        return 0 <= key < len(self.values) and self.values[key] != 0
+
+    def __len__(self):
+        return self.count
+
+    def keys(self):
+        return array('i', [key for key, value in enumerate(self.values) if value])
+
+    def sync(self):
+        if not self.pending:
+            return
+
+        with open(self.fname, 'ab') as f:
+            self.pending.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.size += len(self.pending) / 2
+        self.pending = array('i')
+
+# Rows of a table read, transformed and written at a time, every chunk is committed on its own
+CHUNK_SIZE = 1000
+
+# Chunks handed to the workers ahead of the one being written, per worker
+CHUNKS_AHEAD = 2
+
+CHECKPOINT_FILE = 'sximport.checkpoint'
+CHECKPOINT_KEY = 'SXIMPORT_CHECKPOINT'
+
+ROW_TAG = re.compile(r'<row[\s/>]', re.I)
+
+def table_chunks(path, name, size):
+    """
+    Splits a table in (start, end) byte ranges of size rows each, found by scanning the file for row tags, so that
+    every range can be parsed on its own.
+    """
+    fname = os.path.join(path, "%s.xml" % name)
+    starts = []
+    rows = 0
+    offset = 0
+    tail = ''
+
+    with open(fname, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+
+            if not block:
+                break
+
+            data = tail + block
+
+            for m in ROW_TAG.finditer(data):
+                if rows % size == 0:
+                    starts.append(offset - len(tail) + m.start())
+
+                rows += 1
+
+            # A tag split between two blocks is found in the next one, a whole tag never fits in the tail
+            tail = data[-4:]
+            offset += len(block)
+
+        # The last row ends where the table does
+        f.seek(max(offset - 1024, 0))
+        end = f.tell() + f.read().rfind('</')
+
+    return zip(starts, starts[1:] + [end])
+
+def read_chunk(path, name, start, end):
+    rows = []
+    parser = make_parser()
+    parser.setContentHandler(SXTableHandler(name, rows.append))
+
+    with open(os.path.join(path, "%s.xml" % name), 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    parser.feed('<%s>' % name)
+    parser.feed(data)
+    parser.feed('</%s>' % name)
+    parser.close()
+
+    return rows
+
+def transform_chunk(path, name, start, end, transform, context):
+    rows = []
+
+    for sxrow in read_chunk(path, name, start, end):
+        row = transform(sxrow, context)
+
+        if row is not None:
+            rows.append(row)
+
+    return rows
+
+worker_context = None
+
+def init_worker(context):
+    global worker_context
+    worker_context = context
+
+def worker_transform_chunk(path, name, start, end, transform):
+    return transform_chunk(path, name, start, end, transform, worker_context)
+
+def load_setting(k, default=None):
+    try:
+        return orm.KeyValue.objects.get(key=k).value
+    except:
+        return default
+
+def save_setting(k, v):
+    try:
+        kv = orm.KeyValue.objects.get(key=k)
+        kv.value = v
+    except:
+        kv = orm.KeyValue(key = k, value = v)
+
+    kv.save()
+
+class DumpImport(object):
+    """
+    Imports the tables of an extracted dump, one stage after the other. Each table is split in chunks that worker
+    processes parse and turn into plain rows, with the id maps of the stages before, while this process writes the
+    rows in bulk and commits every chunk.
+
+    Before every commit a checkpoint is written next to the dump with the stages done, the chunks of the running one
+    and the size of every id map, along with the checkpoint it replaces. Its sequence number is saved in the same
+    transaction as the rows, so that running the import again on the same dump after a crash resumes from the one
+    that made it to the database.
+    """
+    def __init__(self, dump, workers=None, chunk_size=CHUNK_SIZE):
+        self.dump = dump
+        self.workers = workers is None and cpu_count() or workers
+        self.chunk_size = chunk_size
+        self.checkpoint_file = os.path.join(dump, CHECKPOINT_FILE)
+        self.fingerprint = sorted([(f, os.path.getsize(os.path.join(dump, f)))
+                                   for f in os.listdir(dump) if f.endswith('.xml')])
+        self.maps = {}
+
+        self.sequence = 0
+        self.state = dict(done=[], stage=None, chunks=0, maps={})
+
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, 'rb') as f:
+                checkpoint = loads(f.read())
+
+            committed = load_setting(CHECKPOINT_KEY, 0)
+
+            if checkpoint['dump'] != self.fingerprint:
+                logging.error("Ignoring the sximport checkpoint in %s, it belongs to another dump" % dump)
+            elif committed == checkpoint['sequence']:
+                self.sequence, self.state = committed, checkpoint['state']
+            elif committed == checkpoint['sequence'] - 1:
+                self.sequence, self.state = committed, checkpoint['previous']
+            else:
+                logging.error("Ignoring the sximport checkpoint in %s, the database doesn't match it" % dump)
+
+    def map(self, name, default=0):
+        size, default = self.state['maps'].get(name, (0, default))
+        self.maps[name] = IdMap(os.path.join(self.dump, '%s.map' % name), default, size)
+        return self.maps[name]
+
+    def chunks(self, table, transform, context, skip):
+        chunks = table_chunks(self.dump, table, self.chunk_size)[skip:]
+
+        if not self.workers:
+            for start, end in chunks:
+                yield transform_chunk(self.dump, table, start, end, transform, context)
+            return
+
+        # Forked after the maps of the stages before are complete, the workers read their own copy
+        pool = Pool(self.workers, init_worker, (context,))
+
+        try:
+            pending = deque()
+
+            for start, end in chunks:
+                pending.append(pool.apply_async(worker_transform_chunk, (self.dump, table, start, end, transform)))
+
+                if len(pending) > self.workers * CHUNKS_AHEAD:
+                    yield pending.popleft().get()
+
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def table(self, stage, table, transform, callback, context=None, start=None, after_chunk=None, finish=None):
+        """
+        Runs a stage over the rows of a table, unless it's done. transform(row, context) turns every row into what
+        callback(row, writer) saves, or drops it returning None. It runs in the workers, where context holds the id
+        maps and anything else given. start() runs before the first chunk, after_chunk() once the rows of a chunk
+        are written and finish() after the last one.
+        """
+        if stage in self.state['done']:
+            return
+
+        if start:
+            start()
+
+        chunks = self.state['stage'] == stage and self.state['chunks'] or 0
+        reader = self.chunks(table, transform, dict(self.maps, **(context or {})), chunks)
+
+        try:
+            for rows in reader:
+                writer = BulkWriter(self.chunk_size)
+
+                for row in rows:
+                    callback(row, writer)
 
-class IdIncrementer():
-    def __init__(self, initial):
-        self.value = initial
+                writer.flush()
 
-    def inc(self):
-        self.value += 1
+                if after_chunk:
+                    after_chunk()
+
+                chunks += 1
+                self.commit(stage, chunks)
+        finally:
+            reader.close()
+
+        if finish:
+            finish()
+
+        self.commit(None, 0, stage)
+
+    def step(self, stage, fn):
+        """Runs a stage that is small enough to be done in one go, unless it's done."""
+        if stage in self.state['done']:
+            return
+
+        fn()
+        self.commit(None, 0, stage)
+
+    def commit(self, stage, chunks, done=None):
+        for m in self.maps.values():
+            m.sync()
+
+        maps = dict(self.state['maps'])
+        maps.update([(name, (m.size, m.default)) for name, m in self.maps.items()])
+
+        state = dict(done=self.state['done'] + (done and [done] or []), stage=stage, chunks=chunks, maps=maps)
+        self.sequence += 1
+
+        with open(self.checkpoint_file + '.tmp', 'wb') as f:
+            f.write(dumps(dict(dump=self.fingerprint, sequence=self.sequence, state=state, previous=self.state)))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(self.checkpoint_file + '.tmp', self.checkpoint_file)
+
+        save_setting(CHECKPOINT_KEY, self.sequence)
+        transaction.commit()
+
+        self.state = state
+
+    def finish(self):
+        """Forgets the checkpoint and the id maps of a finished import."""
+        orm.KeyValue.objects.filter(key=CHECKPOINT_KEY).delete()
+        transaction.commit()
+
+        for fname in [self.checkpoint_file] + [m.fname for m in self.maps.values()]:
+            if os.path.exists(fname):
+                os.remove(fname)
 
 openidre = re.compile('^https?\:\/\/')
-def userimport(path, options):
 
-    usernames = []
+def user_row(sxu, context):
+    if sxu.get('id') == '-1':
+        return None
+
+    sxbadges = sxu.get('badgesummary', None)
+    badges = {'1':'0', '2':'0', '3':'0'}
+
+    if sxbadges:
+        badges.update(dict([b.split('=') for b in sxbadges.split()]))
+
+    return dict(
+            id            = int(sxu.get('id')),
+            name          = unicode(sxu.get('displayname',
+                                    sxu.get('displaynamecleaned', sxu.get('realname', final_username_attempt(sxu))))),
+            email         = sxu.get('email', ''),
+            usertype      = int(sxu.get('usertypeid')),
+            date_joined   = readTime(sxu.get('creationdate')),
+            last_seen     = readTime(sxu.get('lastaccessdate')),
+            about         = sxu.get('aboutme', ''),
+            date_of_birth = sxu.get('birthday', None) and readTime(sxu['birthday']) or None,
+            website       = sxu.get('websiteurl', ''),
+            reputation    = int(sxu.get('reputation')),
+            gold          = int(badges['1']),
+            silver        = int(badges['2']),
+            bronze        = int(badges['3']),
+            real_name     = sxu.get('realname', ''),
+            location      = sxu.get('location', ''),
+            openids       = [o for o in (sxu.get('openid', None), sxu.get('openidalt', None)) if o and openidre.match(o)],
+            )
+
+def userimport(engine, options):
+
+    usernames = set()
     openids = set()
-    uidmapper = IdMapper()
+    existing = set()
+    uidmapper = engine.map('users', 1)
 
     authenticated_user = options.get('authenticated_user', None)
     owneruid = options.get('owneruid', None)
@@ -207,15 +554,16 @@ def userimport(path, options):
     else:
         owneruid = int(owneruid)
 
-    def callback(sxu):
+    def start():
+        usernames.update(orm.User.objects.values_list('username', flat=True))
+        openids.update(orm.AuthKeyUserAssociation.objects.values_list('key', flat=True))
+        existing.update(orm.User.objects.values_list('id', flat=True))
+
+    def callback(sxu, writer):
         create = True
         set_mapper_defaults = False
 
-        if sxu.get('id') == '-1':
-            return
-        #print "\n".join(["%s : %s" % i for i in sxu.items()])
-
-        if (owneruid and (int(sxu.get('id')) == owneruid)) or (
+        if (owneruid and (sxu['id'] == owneruid)) or (
             (not owneruid) and len(uidmapper)):
 
             set_mapper_defaults = True
@@ -223,28 +571,13 @@ def userimport(path, options):
             if authenticated_user:
                 osqau = orm.User.objects.get(id=authenticated_user.id)
 
-                for assoc in orm.AuthKeyUserAssociation.objects.filter(user=osqau):
-                    openids.add(assoc.key)
-
-                uidmapper[owneruid] = osqau.id
+                uidmapper[sxu['id']] = osqau.id
                 create = False
 
-        sxbadges = sxu.get('badgesummary', None)
-        badges = {'1':'0', '2':'0', '3':'0'}
-
-        if sxbadges:
-            badges.update(dict([b.split('=') for b in sxbadges.split()]))
-
         if create:
-            username = unicode(sxu.get('displayname',
-                               sxu.get('displaynamecleaned', sxu.get('realname', final_username_attempt(sxu)))))[:30]
+            username = sxu['name'][:30]
 
             if username in usernames:
-            #if options.get('mergesimilar', False) and sxu.get('email', 'INVALID') == user_by_name[username].email:
-            #    osqau = user_by_name[username]
-            #    create = False
-            #    uidmapper[sxu.get('id')] = osqau.id
-            #else:
                 inc = 0
 
                 while True:
@@ -256,283 +589,285 @@ def userimport(path, options):
                         break
 
             osqau = orm.User(
-                    id           = sxu.get('id'),
+                    id           = sxu['id'],
                     username     = username,
                     password     = '!',
-                    email        = sxu.get('email', ''),
-                    is_superuser = sxu.get('usertypeid') == '5',
-                    is_staff     = sxu.get('usertypeid') == '4',
+                    email        = sxu['email'],
+                    is_superuser = sxu['usertype'] == 5,
+                    is_staff     = sxu['usertype'] == 4,
                     is_active    = True,
-                    date_joined  = readTime(sxu.get('creationdate')),
-                    last_seen    = readTime(sxu.get('lastaccessdate')),
-                    about         = sxu.get('aboutme', ''),
-                    date_of_birth = sxu.get('birthday', None) and readTime(sxu['birthday']) or None,
-                    email_isvalid = int(sxu.get('usertypeid')) > 2,
-                    website       = sxu.get('websiteurl', ''),
-                    reputation    = int(sxu.get('reputation')),
-                    gold          = int(badges['1']),
-                    silver        = int(badges['2']),
-                    bronze        = int(badges['3']),
-                    real_name     = sxu.get('realname', '')[:30],
-                    location      = sxu.get('location', ''),
+                    date_joined  = sxu['date_joined'],
+                    last_seen    = sxu['last_seen'],
+                    about         = sxu['about'],
+                    date_of_birth = sxu['date_of_birth'],
+                    email_isvalid = sxu['usertype'] > 2,
+                    website       = sxu['website'],
+                    reputation    = sxu['reputation'],
+                    gold          = sxu['gold'],
+                    silver        = sxu['silver'],
+                    bronze        = sxu['bronze'],
+                    real_name     = sxu['real_name'][:30],
+                    location      = sxu['location'],
                     )
 
-            osqau.save()
+            if osqau.id in existing:
+                # A user with the same id is overwritten, as saving it always did
+                osqau.save()
+            else:
+                writer.save(osqau)
 
             user_joins = orm.Action(
                     action_type = "userjoins",
                     action_date = osqau.date_joined,
-                    user = osqau
+                    user_id = osqau.id
                     )
-            user_joins.save()
+            writer.save(user_joins)
 
             rep = orm.ActionRepute(
                     value = 1,
-                    user = osqau,
+                    user_id = osqau.id,
                     date = osqau.date_joined,
-                    action = user_joins
+                    action_id = user_joins.id
                     )
-            rep.save()
+            writer.save(rep)
 
-            try:
-                orm.SubscriptionSettings.objects.get(user=osqau)
-            except:
-                s = orm.SubscriptionSettings(user=osqau)
-                s.save()
+            if not (osqau.id in existing and orm.SubscriptionSettings.objects.filter(user=osqau.id).exists()):
+                writer.save(orm.SubscriptionSettings(user_id=osqau.id))
 
             uidmapper[osqau.id] = osqau.id
         else:
-            new_about = sxu.get('aboutme', None)
+            new_about = sxu['about']
             if new_about and osqau.about != new_about:
                 if osqau.about:
                     osqau.about = "%s\n|\n%s" % (osqau.about, new_about)
                 else:
                     osqau.about = new_about
 
-            osqau.username = sxu.get('displayname',
-                                     sxu.get('displaynamecleaned', sxu.get('realname', final_username_attempt(sxu))))
-            osqau.email = sxu.get('email', '')
-            osqau.reputation += int(sxu.get('reputation'))
-            osqau.gold += int(badges['1'])
-            osqau.silver += int(badges['2'])
-            osqau.bronze += int(badges['3'])
+            osqau.username = sxu['name']
+            osqau.email = sxu['email']
+            osqau.reputation += sxu['reputation']
+            osqau.gold += sxu['gold']
+            osqau.silver += sxu['silver']
+            osqau.bronze += sxu['bronze']
 
-            osqau.date_joined = readTime(sxu.get('creationdate'))
-            osqau.website = sxu.get('websiteurl', '')
-            osqau.date_of_birth = sxu.get('birthday', None) and readTime(sxu['birthday']) or None
-            osqau.location = sxu.get('location', '')
-            osqau.real_name = sxu.get('realname', '')
+            osqau.date_joined = sxu['date_joined']
+            osqau.website = sxu['website']
+            osqau.date_of_birth = sxu['date_of_birth']
+            osqau.location = sxu['location']
+            osqau.real_name = sxu['real_name']
 
             #merged_users.append(osqau.id)
             osqau.save()
 
         if set_mapper_defaults:
-            uidmapper[-1] = osqau.id
             uidmapper.default = osqau.id
 
-        usernames.append(osqau.username)
+        usernames.add(osqau.username)
 
-        openid = sxu.get('openid', None)
-        if openid and openidre.match(openid) and (not openid in openids):
-            assoc = orm.AuthKeyUserAssociation(user=osqau, key=openid, provider="openidurl")
-            assoc.save()
-            openids.add(openid)
+        for openid in sxu['openids']:
+            if not openid in openids:
+                writer.save(orm.AuthKeyUserAssociation(user_id=osqau.id, key=openid, provider="openidurl"))
+                openids.add(openid)
 
-        openidalt = sxu.get('openidalt', None)
-        if openidalt and openidre.match(openidalt) and (not openidalt in openids):
-            assoc = orm.AuthKeyUserAssociation(user=osqau, key=openidalt, provider="openidurl")
-            assoc.save()
-            openids.add(openidalt)
+    engine.table('users', "Users", user_row, callback, start=start)
 
-    readTable(path, "Users", callback)
+    return uidmapper
 
-    #if uidmapper[-1] == -1:
-    #    uidmapper[-1] = 1
+def tag_row(sxtag, context):
+    return dict(
+            id = int(sxtag['id']),
+            name = sxtag['name'],
+            used_count = int(sxtag['count']),
+            created_by_id = context['users'][sxtag.get('userid', 1)],
+            )
 
-    return uidmapper
+def tagsimport(engine):
 
-def tagsimport(dump, uidmap):
+    def callback(sxtag, writer):
+        writer.save(orm.Tag(**sxtag))
 
-    tagmap = {}
+    engine.table('tags', "Tags", tag_row, callback)
 
-    def callback(sxtag):
-        otag = orm.Tag(
-                id = int(sxtag['id']),
-                name = sxtag['name'],
-                used_count = int(sxtag['count']),
-                created_by_id = uidmap[sxtag.get('userid', 1)],
-                )
-        otag.save()
+    return dict(orm.Tag.objects.values_list('name', 'id'))
 
-        tagmap[otag.name] = otag
+def add_post_state(name, post, action, writer):
+    post.state_string = "%s(%s)" % (post.state_string, name)
+    writer.save(orm.NodeState(node_id=post.id, state_type=name, action_id=action.id))
 
-    readTable(dump, "Tags", callback)
+def post_row(sxpost, context):
+    uidmap = context['users']
 
-    return tagmap
+    row = dict(
+            id = int(sxpost['id']),
+            question = sxpost.get('posttypeid') == '1',
+            added_at = readTime(sxpost['creationdate']),
+            body = sxpost['body'],
+            score = int(sxpost.get('score', 0)),
+            author_id = sxpost.get('deletiondate', None) and 1 or uidmap[sxpost.get('owneruserid', 1)],
+            last_edit = None,
+            wikified_at = None,
+            last_activity = None,
+            )
 
-def add_post_state(name, post, action):
-    if not "(%s)" % name in post.state_string:
-        post.state_string = "%s(%s)" % (post.state_string, name)
-        post.save()
+    if sxpost.get('lasteditoruserid', None):
+        row['last_edit'] = (uidmap[sxpost['lasteditoruserid']], readTime(sxpost['lasteditdate']))
 
-    try:
-        state = orm.NodeState.objects.get(node=post, state_type=name)
-        state.action = action
-        state.save()
-    except:
-        state = orm.NodeState(node=post, state_type=name, action=action)
-        state.save()
+    if sxpost.get('communityowneddate', None):
+        row['wikified_at'] = readTime(sxpost['communityowneddate'])
 
-def remove_post_state(name, post):
-    if "(%s)" % name in post.state_string:
-        try:
-            state = orm.NodeState.objects.get(state_type=name, post=post)
-            state.delete()
-        except:
-            pass
-    post.state_string = "".join("(%s)" % s for s in re.findall('\w+', post.state_string) if s != name)
+    if sxpost.get('lastactivityuserid', None):
+        row['last_activity'] = (uidmap[sxpost['lastactivityuserid']], readTime(sxpost['lastactivitydate']))
+
+    if row['question']:
+        tagnames = sxpost['tags'].replace(u'ö', '-').replace(u'é', '').replace(u'à', '')
+        tags = []
+
+        for name in [name.strip() for name in tagnames.split(u' ') if name]:
+            if name in context['tags'] and not (name, context['tags'][name]) in tags:
+                tags.append((name, context['tags'][name]))
 
-def postimport(dump, uidmap, tagmap):
-    all = {}
+        row['title'] = sxpost['title']
+        row['tags'] = tags
+        row['extra_count'] = int(sxpost.get('viewcount', 0))
+    else:
+        row['parent_id'] = int(sxpost['parentid'])
+
+    return row
 
-    def callback(sxpost):
-        nodetype = (sxpost.get('posttypeid') == '1') and "nodetype" or "answer"
+def postimport(engine, tagmap):
+    nodes = engine.map('nodes')
 
+    def callback(sxpost, writer):
         post = orm.Node(
-                node_type = nodetype,
+                node_type = sxpost['question'] and "question" or "answer",
                 id = sxpost['id'],
-                added_at = readTime(sxpost['creationdate']),
+                added_at = sxpost['added_at'],
                 body = sxpost['body'],
-                score = sxpost.get('score', 0),
-                author_id = sxpost.get('deletiondate', None) and 1 or uidmap[sxpost.get('owneruserid', 1)]
+                score = sxpost['score'],
+                author_id = sxpost['author_id'],
                 )
 
-        post.save()
-
         create_action = orm.Action(
-                action_type = (nodetype == "nodetype") and "ask" or "answer",
+                action_type = sxpost['question'] and "ask" or "answer",
                 user_id = post.author_id,
-                node = post,
+                node_id = post.id,
                 action_date = post.added_at
                 )
 
-        create_action.save()
+        writer.save(create_action)
 
-        if sxpost.get('lasteditoruserid', None):
+        if sxpost['last_edit']:
             revise_action = orm.Action(
                     action_type = "revise",
-                    user_id = uidmap[sxpost.get('lasteditoruserid')],
-                    node = post,
-                    action_date = readTime(sxpost['lasteditdate']),
+                    user_id = sxpost['last_edit'][0],
+                    node_id = post.id,
+                    action_date = sxpost['last_edit'][1],
                     )
 
-            revise_action.save()
-            post.last_edited = revise_action
+            writer.save(revise_action)
+            post.last_edited_id = revise_action.id
 
-        if sxpost.get('communityowneddate', None):
+        if sxpost['wikified_at']:
             wikify_action = orm.Action(
                     action_type = "wikify",
                     user_id = 1,
-                    node = post,
-                    action_date = readTime(sxpost['communityowneddate'])
+                    node_id = post.id,
+                    action_date = sxpost['wikified_at']
                     )
 
-            wikify_action.save()
-            add_post_state("wiki", post, wikify_action)
+            writer.save(wikify_action)
+            add_post_state("wiki", post, wikify_action, writer)
 
-        if sxpost.get('lastactivityuserid', None):
-            post.last_activity_by_id = uidmap[sxpost['lastactivityuserid']]
-            post.last_activity_at = readTime(sxpost['lastactivitydate'])
+        if sxpost['last_activity']:
+            post.last_activity_by_id, post.last_activity_at = sxpost['last_activity']
 
-        if sxpost.get('posttypeid') == '1': #question
-            post.node_type = "question"
+        if sxpost['question']:
             post.title = sxpost['title']
+            post.tagnames = " ".join([name for name, id in sxpost['tags']])
+            post.extra_count = sxpost['extra_count']
 
-            tagnames = sxpost['tags'].replace(u'ö', '-').replace(u'é', '').replace(u'à', '')
-            post.tagnames = tagnames
-
-            post.extra_count = sxpost.get('viewcount', 0)
-
-            add_tags_to_post(post, tagmap)
-            all[int(post.id)] = int(post.id)
-
+            writer.relate(post, 'tags', [orm.Tag(id=id) for name, id in sxpost['tags']])
+            nodes[post.id] = post.id
         else:
-            post.parent_id = sxpost['parentid']
-            post.abs_parent_id = sxpost['parentid']
-            all[int(post.id)] = int(sxpost['parentid'])
+            post.parent_id = sxpost['parent_id']
+            post.abs_parent_id = sxpost['parent_id']
+            nodes[post.id] = sxpost['parent_id']
 
-        post.save()
+        create_and_activate_revision(post, writer)
+        writer.save(post)
 
-        create_and_activate_revision(post)
+    engine.table('posts', "Posts", post_row, callback, context={'tags': tagmap})
 
-        del post
+    return nodes
 
-    readTable(dump, "Posts", callback)
+def comment_row(sxc, context):
+    uidmap = context['users']
+    parent_id = int(sxc.get('postid'))
 
-    return all
+    row = dict(
+            id = int(sxc['id']),
+            added_at = readTime(sxc['creationdate']),
+            author_id = uidmap[sxc.get('userid', 1)],
+            body = sxc['text'],
+            parent_id = parent_id,
+            abs_parent_id = context['nodes'][parent_id] or parent_id,
+            deleted = None,
+            )
 
-def comment_import(dump, uidmap, absparent_map):
-    posts = absparent_map.keys()
+    if sxc.get('deletiondate', None):
+        row['deleted'] = (uidmap[sxc['deletionuserid']], readTime(sxc['deletiondate']))
 
-    currid = IdIncrementer(max(posts))
-    mapping = {}
+    return row
 
-    def callback(sxc):
-        currid.inc()
+def comment_import(engine, nodes):
+    comments = engine.map('comments')
+
+    def callback(sxc, writer):
         oc = orm.Node(
-                id = currid.value,
                 node_type = "comment",
-                added_at = readTime(sxc['creationdate']),
-                author_id = uidmap[sxc.get('userid', 1)],
-                body = sxc['text'],
-                parent_id = sxc.get('postid'),
-                abs_parent_id = absparent_map.get(int(sxc.get('postid')), sxc.get('postid'))
+                added_at = sxc['added_at'],
+                author_id = sxc['author_id'],
+                body = sxc['body'],
+                parent_id = sxc['parent_id'],
+                abs_parent_id = sxc['abs_parent_id']
                 )
 
-        if sxc.get('deletiondate', None):
+        writer.reserve(oc)
+
+        if sxc['deleted']:
             delete_action = orm.Action(
                     action_type = "delete",
-                    user_id = uidmap[sxc['deletionuserid']],
-                    action_date = readTime(sxc['deletiondate'])
+                    user_id = sxc['deleted'][0],
+                    node_id = oc.id,
+                    action_date = sxc['deleted'][1]
                     )
 
-            oc.author_id = uidmap[sxc['deletionuserid']]
-            oc.save()
-
-            delete_action.node = oc
-            delete_action.save()
+            oc.author_id = sxc['deleted'][0]
 
-            add_post_state("deleted", oc, delete_action)
-        else:
-            oc.author_id = uidmap[sxc.get('userid', 1)]
-            oc.save()
+            writer.save(delete_action)
+            add_post_state("deleted", oc, delete_action, writer)
 
         create_action = orm.Action(
                 action_type = "comment",
                 user_id = oc.author_id,
-                node = oc,
+                node_id = oc.id,
                 action_date = oc.added_at
                 )
 
-        create_and_activate_revision(oc)
-
-        create_action.save()
-        oc.save()
+        writer.save(create_action)
 
-        posts.append(int(oc.id))
-        mapping[int(sxc['id'])] = int(oc.id)
+        create_and_activate_revision(oc, writer)
+        writer.save(oc)
 
-    readTable(dump, "PostComments", callback)
-    return posts, mapping
+        nodes[oc.id] = oc.abs_parent_id
+        comments[sxc['id']] = oc.id
 
+    engine.table('comments', "PostComments", comment_row, callback)
 
-def add_tags_to_post(post, tagmap):
-    tags = [tag for tag in [tagmap.get(name.strip()) for name in post.tagnames.split(u' ') if name] if tag]
-    post.tagnames = " ".join([t.name for t in tags]).strip()
-    post.tags = tags
+    return comments
 
 
-def create_and_activate_revision(post):
+def create_and_activate_revision(post, writer):
     rev = orm.NodeRevision(
             author_id = post.author_id,
             body = post.body,
@@ -544,261 +879,304 @@ def create_and_activate_revision(post):
             title = post.title,
             )
 
-    rev.save()
+    writer.save(rev)
     post.active_revision_id = rev.id
-    post.save()
 
-def post_vote_import(dump, uidmap, posts):
-    close_reasons = {}
+def vote_key(node_id, user_id):
+    return (node_id << 32) | user_id
 
-    def close_callback(r):
-        close_reasons[r['id']] = r['name']
+def apply_node_changes(changes):
+    """
+    Applies the (node id, attribute, value) changes a chunk of votes made to the nodes, once the actions they point
+    to are written. The attribute 'state' takes a (state type, action id) value, a state without action is removed.
+    """
+    nodes = orm.Node.objects.in_bulk(list(set([node_id for node_id, name, value in changes])))
+    states = dict([((s.node_id, s.state_type), s) for s in orm.NodeState.objects.filter(node__in=nodes.keys())])
+    new_states = {}
 
-    readTable(dump, "CloseReasons", close_callback)
+    for node_id, name, value in changes:
+        node = nodes.get(node_id, None)
 
-    user2vote = []
+        if node is None:
+            continue
 
-    def callback(sxv):
-        action = orm.Action(
-                user_id=uidmap[sxv['userid']],
-                action_date = readTime(sxv['creationdate']),
-                )
+        if name == 'state':
+            state_type, action_id = value
 
-        if not int(sxv['postid']) in posts: return
-        node = orm.Node.objects.get(id=sxv['postid'])
-        action.node = node
+            if action_id and not "(%s)" % state_type in node.state_string:
+                node.state_string = "%s(%s)" % (node.state_string, state_type)
+            elif not action_id:
+                node.state_string = "".join("(%s)" % s for s in re.findall('\w+', node.state_string) if s != state_type)
 
-        if sxv['votetypeid'] == '1':
-            answer = node
-            question = orm.Node.objects.get(id=answer.parent_id)
-
-            action.action_type = "acceptanswer"
-            action.save()
+            new_states[(node_id, state_type)] = action_id
+        else:
+            setattr(node, name, value)
 
-            answer.marked = True
+    writer = BulkWriter(CHUNK_SIZE)
 
-            question.extra_ref_id = answer.id
+    for key, action_id in new_states.items():
+        state = states.get(key, None)
 
-            answer.save()
-            question.save()
+        if state is None:
+            if action_id:
+                writer.save(orm.NodeState(node_id=key[0], state_type=key[1], action_id=action_id))
+        elif action_id:
+            state.action_id = action_id
+            state.save()
+        else:
+            state.delete()
 
-        elif sxv['votetypeid'] in ('2', '3'):
-            if not (action.node.id, action.user_id) in user2vote:
-                user2vote.append((action.node.id, action.user_id))
+    writer.flush()
+
+    for node in nodes.values():
+        node.save()
+
+VOTE_ACTIONS = {
+'1': "acceptanswer",
+'2': "voteup",
+'3': "votedown",
+'4': "flag",
+'5': "favorite",
+'6': "close",
+'10': "delete",
+'12': "flag",
+'13': "flag",
+}
 
-                action.action_type = (sxv['votetypeid'] == '2') and "voteup" or "votedown"
-                action.save()
+def vote_row(sxv, context):
+    node_id = int(sxv['postid'])
 
-                ov = orm.Vote(
-                        node_id = action.node.id,
-                        user_id = action.user_id,
-                        voted_at = action.action_date,
-                        value = sxv['votetypeid'] == '2' and 1 or -1,
-                        action = action
-                        )
-                ov.save()
-            else:
-                action.action_type = "unknown"
-                action.save()
+    if not node_id in context['nodes']:
+        return None
 
-        elif sxv['votetypeid'] in ('4', '12', '13'):
-            action.action_type = "flag"
-            action.save()
+    uidmap = context['users']
 
-            of = orm.Flag(
-                    node = action.node,
-                    user_id = action.user_id,
-                    flagged_at = action.action_date,
-                    reason = '',
-                    action = action
-                    )
+    row = dict(
+            type = sxv['votetypeid'],
+            node_id = node_id,
+            parent_id = context['nodes'][node_id],
+            user_id = uidmap[sxv['userid']],
+            date = readTime(sxv['creationdate']),
+            comment = sxv.get('comment', None),
+            reputes = [],
+            )
 
-            of.save()
+    if sxv.get('targetrepchange', None):
+        row['reputes'].append((uidmap[sxv['targetuserid']], int(sxv['targetrepchange'])))
 
-        elif sxv['votetypeid'] == '5':
-            action.action_type = "favorite"
-            action.save()
+    if sxv.get('voterrepchange', None):
+        row['reputes'].append((row['user_id'], int(sxv['voterrepchange'])))
 
-        elif sxv['votetypeid'] == '6':
-            action.action_type = "close"
-            action.extra = dbsafe_encode(close_reasons[sxv['comment']])
-            action.save()
+    return row
 
-            node.marked = True
-            node.save()
+def post_vote_import(engine):
+    close_reasons = {}
+    user2vote = set()
+    changes = []
 
-        elif sxv['votetypeid'] == '7':
-            action.action_type = "unknown"
-            action.save()
+    def close_callback(r):
+        close_reasons[r['id']] = r['name']
 
-            node.marked = False
-            node.save()
+    def start():
+        readTable(engine.dump, "CloseReasons", close_callback)
+        user2vote.update([vote_key(n, u) for n, u in orm.Vote.objects.values_list('node_id', 'user_id')])
 
-            remove_post_state("closed", node)
+    def callback(sxv, writer):
+        action = orm.Action(
+                action_type = VOTE_ACTIONS.get(sxv['type'], "unknown"),
+                user_id = sxv['user_id'],
+                node_id = sxv['node_id'],
+                action_date = sxv['date'],
+                )
 
-        elif sxv['votetypeid'] == '10':
-            action.action_type = "delete"
-            action.save()
+        if action.action_type in ("voteup", "votedown"):
+            if vote_key(action.node_id, action.user_id) in user2vote:
+                action.action_type = "unknown"
+            else:
+                user2vote.add(vote_key(action.node_id, action.user_id))
 
-        elif sxv['votetypeid'] == '11':
-            action.action_type = "unknown"
-            action.save()
+        if action.action_type == "close":
+            action.extra = dbsafe_encode(close_reasons[sxv['comment']])
 
-            remove_post_state("deleted", node)
+        writer.save(action)
 
-        else:
-            action.action_type = "unknown"
-            action.save()
+        if action.action_type in ("voteup", "votedown"):
+            ov = orm.Vote(
+                    node_id = action.node_id,
+                    user_id = action.user_id,
+                    voted_at = action.action_date,
+                    value = action.action_type == "voteup" and 1 or -1,
+                    action_id = action.id
+                    )
+            writer.save(ov)
 
-        if sxv.get('targetrepchange', None):
-            rep = orm.ActionRepute(
-                    action = action,
-                    date = action.action_date,
-                    user_id = uidmap[sxv['targetuserid']],
-                    value = int(sxv['targetrepchange'])
+        elif action.action_type == "flag":
+            of = orm.Flag(
+                    node_id = action.node_id,
+                    user_id = action.user_id,
+                    flagged_at = action.action_date,
+                    reason = '',
+                    action_id = action.id
                     )
+            writer.save(of)
+
+        elif action.action_type == "acceptanswer":
+            changes.append((action.node_id, 'marked', True))
+            changes.append((sxv['parent_id'], 'extra_ref_id', action.node_id))
+
+        elif action.action_type == "close":
+            changes.append((action.node_id, 'marked', True))
 
-            rep.save()
+        elif sxv['type'] == '7':
+            changes.append((action.node_id, 'marked', False))
+            changes.append((action.node_id, 'state', ("closed", None)))
 
-        if sxv.get('voterrepchange', None):
+        elif sxv['type'] == '11':
+            changes.append((action.node_id, 'state', ("deleted", None)))
+
+        for user_id, value in sxv['reputes']:
             rep = orm.ActionRepute(
-                    action = action,
+                    action_id = action.id,
                     date = action.action_date,
-                    user_id = uidmap[sxv['userid']],
-                    value = int(sxv['voterrepchange'])
+                    user_id = user_id,
+                    value = value
                     )
-
-            rep.save()
+            writer.save(rep)
 
         if action.action_type in ("acceptanswer", "delete", "close"):
             state = {"acceptanswer": "accepted", "delete": "deleted", "close": "closed"}[action.action_type]
-            add_post_state(state, node, action)
+            changes.append((action.node_id, 'state', (state, action.id)))
+
+    def after_chunk():
+        if changes:
+            apply_node_changes(changes)
+            del changes[:]
 
-    readTable(dump, "Posts2Votes", callback)
+    engine.table('post_votes', "Posts2Votes", vote_row, callback, start=start, after_chunk=after_chunk)
 
+def comment_vote_row(sxv, context):
+    if sxv['votetypeid'] != "2" or not int(sxv['postcommentid']) in context['comments']:
+        return None
 
-def comment_vote_import(dump, uidmap, comments):
-    user2vote = []
-    comments2score = {}
+    return dict(
+            node_id = context['comments'][sxv['postcommentid']],
+            user_id = context['users'][sxv['userid']],
+            date = readTime(sxv['creationdate']),
+            )
 
-    def callback(sxv):
-        if sxv['votetypeid'] == "2":
-            comment_id = comments[int(sxv['postcommentid'])]
-            user_id = uidmap[sxv['userid']]
+def comment_vote_import(engine):
+    user2vote = set()
 
-            if not (comment_id, user_id) in user2vote:
-                user2vote.append((comment_id, user_id))
+    def start():
+        user2vote.update([vote_key(n, u) for n, u in orm.Vote.objects.values_list('node_id', 'user_id')])
 
-                action = orm.Action(
-                        action_type = "voteupcomment",
-                        user_id = user_id,
-                        action_date = readTime(sxv['creationdate']),
-                        node_id = comment_id
-                        )
-                action.save()
-
-                ov = orm.Vote(
-                        node_id = comment_id,
-                        user_id = user_id,
-                        voted_at = action.action_date,
-                        value = 1,
-                        action = action
-                        )
+    def callback(sxv, writer):
+        if vote_key(sxv['node_id'], sxv['user_id']) in user2vote:
+            return
 
-                ov.save()
+        user2vote.add(vote_key(sxv['node_id'], sxv['user_id']))
 
-                if not comment_id in comments2score:
-                    comments2score[comment_id] = 1
-                else:
-                    comments2score[comment_id] += 1
+        action = orm.Action(
+                action_type = "voteupcomment",
+                user_id = sxv['user_id'],
+                action_date = sxv['date'],
+                node_id = sxv['node_id']
+                )
+        writer.save(action)
+
+        ov = orm.Vote(
+                node_id = sxv['node_id'],
+                user_id = sxv['user_id'],
+                voted_at = action.action_date,
+                value = 1,
+                action_id = action.id
+                )
+        writer.save(ov)
 
-    readTable(dump, "Comments2Votes", callback)
+    def finish():
+        scores = orm.Vote.objects.filter(node__node_type="comment").values_list('node').annotate(Sum('value'))
 
-    for cid, score in comments2score.items():
-        orm.Node.objects.filter(id=cid).update(score=score)
+        qn = connection.ops.quote_name
+        connection.cursor().executemany("UPDATE %s SET %s = %%s WHERE %s = %%s" % (
+            qn(orm.Node._meta.db_table), qn('score'), qn('id')), [(score, id) for id, score in scores])
 
+    engine.table('comment_votes', "Comments2Votes", comment_vote_row, callback, start=start, finish=finish)
 
-def badges_import(dump, uidmap, post_list):
+def award_row(sxa, context):
+    return dict(
+            badge = int(sxa['badgeid']),
+            user_id = context['users'][sxa['userid']],
+            date = readTime(sxa['date']),
+            )
 
-    sxbadges = {}
+def badges_import(engine, nodes):
+    sx_to_osqa = {}
+    user_badge_count = IdMap()
+    post_list = nodes.keys()
 
-    def sxcallback(b):
-        sxbadges[int(b['id'])] = b
+    def start():
+        sxbadges = {}
 
-    readTable(dump, "Badges", sxcallback)
+        def sxcallback(b):
+            sxbadges[int(b['id'])] = b
 
-    obadges = dict([(b.cls, b) for b in orm.Badge.objects.all()])
-    user_badge_count = {}
+        readTable(engine.dump, "Badges", sxcallback)
 
-    sx_to_osqa = {}
+        obadges = dict([(b.cls, b) for b in orm.Badge.objects.all()])
 
-    for id, sxb in sxbadges.items():
-        cls = "".join(sxb['name'].replace('&', 'And').split(' '))
+        for id, sxb in sxbadges.items():
+            cls = "".join(sxb['name'].replace('&', 'And').split(' '))
 
-        if cls in obadges:
-            sx_to_osqa[id] = obadges[cls]
-        else:
-            osqab = orm.Badge(
-                    cls = cls,
-                    awarded_count = 0,
-                    type = sxb['class']
-                    )
-            osqab.save()
-            sx_to_osqa[id] = osqab
+            if not cls in obadges:
+                osqab = orm.Badge(
+                        cls = cls,
+                        awarded_count = 0,
+                        type = sxb['class']
+                        )
+                osqab.save()
+                obadges[cls] = osqab
 
-    osqaawards = []
+            sx_to_osqa[id] = obadges[cls].id
 
-    def callback(sxa):
-        badge = sx_to_osqa[int(sxa['badgeid'])]
+        for user_id, count in orm.Award.objects.values_list('user').annotate(Count('id')):
+            user_badge_count[user_id] = count
 
-        user_id = uidmap[sxa['userid']]
-        if not user_badge_count.get(user_id, None):
-            user_badge_count[user_id] = 0
+    def callback(sxa, writer):
+        user_id = sxa['user_id']
+        position = user_badge_count[user_id]
 
         action = orm.Action(
                 action_type = "award",
                 user_id = user_id,
-                action_date = readTime(sxa['date'])
+                action_date = sxa['date']
                 )
 
-        action.save()
+        writer.save(action)
 
         osqaa = orm.Award(
-                user_id = uidmap[sxa['userid']],
-                badge = badge,
-                node_id = post_list[user_badge_count[user_id]],
+                user_id = user_id,
+                badge_id = sx_to_osqa[sxa['badge']],
+                node_id = position < len(post_list) and post_list[position] or None,
                 awarded_at = action.action_date,
-                action = action
+                action_id = action.id
                 )
 
-        osqaa.save()
-        badge.awarded_count += 1
-
-        user_badge_count[user_id] += 1
+        writer.save(osqaa)
 
-    readTable(dump, "Users2Badges", callback)
+        user_badge_count[user_id] = position + 1
 
-    for badge in obadges.values():
-        badge.save()
+    def finish():
+        for badge_id, count in orm.Award.objects.values_list('badge').annotate(Count('id')):
+            orm.Badge.objects.filter(id=badge_id).update(awarded_count=count)
 
-def save_setting(k, v):
-    try:
-        kv = orm.KeyValue.objects.get(key=k)
-        kv.value = v
-    except:
-        kv = orm.KeyValue(key = k, value = v)
+    engine.table('badges', "Users2Badges", award_row, callback, start=start, finish=finish)
 
-    kv.save()
-
-
-def pages_import(dump, currid, owner):
-    currid = IdIncrementer(currid)
+def pages_import(dump, owner):
     registry = {}
+    writer = BulkWriter(CHUNK_SIZE)
 
     def callback(sxp):
-        currid.inc()
         page = orm.Node(
-                id = currid.value,
                 node_type = "page",
                 title = sxp['name'],
                 body = b64decode(sxp['value']),
@@ -815,30 +1193,33 @@ def pages_import(dump, currid, owner):
                 author_id = owner
                 )
 
-        create_and_activate_revision(page)
+        writer.reserve(page)
+        create_and_activate_revision(page, writer)
 
-        page.save()
         registry[sxp['url'][1:]] = page.id
 
         create_action = orm.Action(
                 action_type = "newpage",
                 user_id = page.author_id,
-                node = page
+                node_id = page.id
                 )
 
-        create_action.save()
+        writer.save(create_action)
 
         if sxp['active'] == "true" and sxp['contenttype'] == "text/html":
             pub_action = orm.Action(
                     action_type = "publish",
                     user_id = page.author_id,
-                    node = page
+                    node_id = page.id
                     )
 
-            pub_action.save()
-            add_post_state("published", page, pub_action)
+            writer.save(pub_action)
+            add_post_state("published", page, pub_action, writer)
+
+        writer.save(page)
 
     readTable(dump, "FlatPages", callback)
+    writer.flush()
 
     save_setting('STATIC_PAGE_REGISTRY', dbsafe_encode(registry))
 
@@ -886,9 +1267,11 @@ def static_import(dump):
 def disable_triggers():
     from south.db import db
     if db.backend_name == "postgres":
+        db.start_transaction()
         db.execute_many(PG_DISABLE_TRIGGERS)
         db.commit_transaction()
-        db.start_transaction()
+    elif db.backend_name == "mysql":
+        db.execute("SET FOREIGN_KEY_CHECKS = 0")
 
 def enable_triggers():
     from south.db import db
@@ -896,6 +1279,8 @@ def enable_triggers():
         db.start_transaction()
         db.execute_many(PG_ENABLE_TRIGGERS)
         db.commit_transaction()
+    elif db.backend_name == "mysql":
+        db.execute("SET FOREIGN_KEY_CHECKS = 1")
 
 def reset_sequences():
     from south.db import db
@@ -919,30 +1304,29 @@ def sximport(dump, options):
     except:
         triggers_disabled = False
 
-    uidmap = userimport(dump, options)
-    tagmap = tagsimport(dump, uidmap)
-    gc.collect()
+    transaction.enter_transaction_management()
+    transaction.managed(True)
 
-    posts = postimport(dump, uidmap, tagmap)
-    gc.collect()
-
-    posts, comments = comment_import(dump, uidmap, posts)
-    gc.collect()
-
-    post_vote_import(dump, uidmap, posts)
-    gc.collect()
-
-    comment_vote_import(dump, uidmap, comments)
-    gc.collect()
+    try:
+        engine = DumpImport(dump, options.get('workers', None), options.get('chunk_size', CHUNK_SIZE))
 
-    badges_import(dump, uidmap, posts)
+        uidmap = userimport(engine, options)
+        tagmap = tagsimport(engine)
+        nodes = postimport(engine, tagmap)
+        comment_import(engine, nodes)
+        post_vote_import(engine)
+        comment_vote_import(engine)
+        badges_import(engine, nodes)
 
-    pages_import(dump, max(posts), uidmap.default)
-    static_import(dump)
-    gc.collect()
+        engine.step('pages', lambda: pages_import(dump, uidmap.default))
+        engine.step('static', lambda: static_import(dump))
 
-    from south.db import db
-    db.commit_transaction()
+        engine.finish()
+    except:
+        transaction.rollback()
+        raise
+    finally:
+        transaction.leave_transaction_management()
 
     reset_sequences()
 